@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Book, Author, Language, Genre, BookInstance
+from . import search
+from .models import Book, Author, Language, Genre, BookInstance, Hold
 
 
 admin.site.register(Language)
@@ -35,6 +36,12 @@ class BookAdmin(admin.ModelAdmin):
     autocomplete_fields = ['author', 'genre']
     inlines = [BooksInstanceInline]
 
+    def get_search_results(self, request, queryset, search_term):
+        # Use the full-text index instead of multi-join LIKE scans.
+        if not search_term:
+            return queryset, False
+        return queryset.filter(pk__in=search.search_books(search_term, limit=1000)), False
+
 
 @admin.register(BookInstance)
 class BookInstanceAdmin(admin.ModelAdmin):
@@ -49,4 +56,10 @@ class BookInstanceAdmin(admin.ModelAdmin):
     )
 
 
-
+@admin.register(Hold)
+class HoldAdmin(admin.ModelAdmin):
+    list_display = ('book', 'patron', 'status', 'priority', 'placed_at')
+    list_filter = ('status', 'priority')
+    search_fields = ['book__title', 'patron__username']
+    autocomplete_fields = ['patron']
+    raw_id_fields = ['book', 'copy']
@@ -0,0 +1,98 @@
+"""
+Read-only JSON availability data for the self-service kiosks.
+
+A batch of up to ``MAX_BATCH`` books costs two queries whatever its size:
+one for the books and their authors, one for the copy counts per book and
+status. Both read ``.values()`` rows, so no model instances are built. Copy
+changes touch ``Book.updated_at`` (see catalog.signals), so the ETag can be
+computed from the first query alone and a revalidation skips the second.
+"""
+import hashlib
+from collections import defaultdict
+
+from django.db.models import Count, Q
+
+from .models import Book, BookInstance
+
+
+MAX_BATCH = 300
+
+BOOK_FIELDS = ('id', 'title', 'isbn', 'updated_at', 'author__first_name', 'author__last_name')
+
+
+class BatchError(ValueError):
+    """Raised for a batch request the API will not serve."""
+
+
+def _split(values):
+    return [key.strip() for value in values for key in value.split(',') if key.strip()]
+
+
+def requested_keys(query):
+    """Returns ``(ids, isbns)`` from ``?id=`` and ``?isbn=`` parameters, repeated or comma separated."""
+    ids, isbns = _split(query.getlist('id')), _split(query.getlist('isbn'))
+    if not ids and not isbns:
+        raise BatchError('Pass book ids as ?id= or ISBNs as ?isbn=')
+    if len(ids) + len(isbns) > MAX_BATCH:
+        raise BatchError(f'At most {MAX_BATCH} books per request')
+    try:
+        ids = [int(pk) for pk in ids]
+    except ValueError:
+        raise BatchError('Book ids must be integers')
+    return ids, isbns
+
+
+def load_books(ids=(), isbns=()):
+    return list(Book.objects
+                .filter(Q(pk__in=ids) | Q(isbn__in=isbns))
+                .order_by('pk')
+                .values(*BOOK_FIELDS))
+
+
+def etag(books, ids=(), isbns=()):
+    parts = [f'{book["id"]}:{book["updated_at"].isoformat()}' for book in books]
+    parts += [f'id:{pk}' for pk in ids] + [f'isbn:{isbn}' for isbn in isbns]
+    return hashlib.md5('\n'.join(parts).encode()).hexdigest()
+
+
+def copy_counts(book_ids):
+    """Returns ``{book_id: {status: count}}`` from one grouped query."""
+    counts = defaultdict(dict)
+    rows = BookInstance.objects\
+        .filter(book_id__in=book_ids)\
+        .order_by()\
+        .values('book_id', 'status')\
+        .annotate(count=Count('id'))
+    for row in rows:
+        counts[row['book_id']][row['status']] = row['count']
+    return counts
+
+
+def serialize(books):
+    counts = copy_counts([book['id'] for book in books])
+    items = []
+    for book in books:
+        copies = counts.get(book['id'], {})
+        last, first = book['author__last_name'], book['author__first_name']
+        items.append({
+            'id': book['id'],
+            'title': book['title'],
+            'isbn': book['isbn'],
+            'author': f'{last}, {first}' if last is not None else None,
+            'copies': copies,
+            'available': copies.get('a', 0),
+        })
+    return items
+
+
+def batch_payload(books, ids=(), isbns=()):
+    found_ids = {book['id'] for book in books}
+    found_isbns = {book['isbn'] for book in books}
+    return {
+        'books': serialize(books),
+        'missing': {
+            'id': [pk for pk in ids if pk not in found_ids],
+            'isbn': [isbn for isbn in isbns if isbn not in found_isbns],
+        },
+        'statuses': dict(BookInstance.LOAN_STATUS),
+    }
@@ -0,0 +1,242 @@
+"""
+ASGI handler with async autocomplete and kiosk API views.
+
+locallibrary.asgi serves this handler, and the Procfile runs it under
+uvicorn workers.
+
+Django 3.0 serves ASGI but has no async views or middleware: its handler
+runs the middleware and view of each request in a thread. For the routes in
+``ASYNC_VIEWS``, ``CatalogASGIHandler`` still runs the full middleware
+stack in a thread, but the innermost call hands the view to the event loop
+as a coroutine, and the thread only waits for its response. The views do
+their blocking work (permission checks, ORM queries, rebuilding a stale
+prefix index) in one bounded pool of ``CATALOG_ASGI_THREADS`` threads; the
+autocomplete lookups themselves run on the loop from the in-process prefix
+indexes. Waiting middleware threads come from a separate pool of
+``CATALOG_ASGI_REQUEST_THREADS``, so they never hold up the ORM pool.
+The middleware that works per thread does not see the queries the views
+run in the ORM pool: QueryBudgetMiddleware and ProfilingMiddleware do not
+record them, and ReplicaRoutingMiddleware leaves them on the primary.
+
+Every other request runs through Django's handler, its middleware and view
+in the ORM pool. Django 3.0 also iterates streaming bodies and closes the
+response on the event loop. The CSV and JSON exports read their rows while
+streaming, and closing sends ``request_finished``, whose receivers close
+database connections; on the loop both raise ``SynchronousOnlyOperation``,
+so the handler runs both in the pool too.
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.core import signals
+from django.core.exceptions import RequestAborted
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.base import BaseHandler
+from django.core.paginator import Paginator
+from django.db import close_old_connections
+from django.http import HttpResponseForbidden, JsonResponse
+from django.urls import Resolver404, get_resolver, set_script_prefix
+
+from . import prefix_index, views
+
+
+_executors = {}
+_executor_lock = threading.Lock()
+
+
+def _pool(name, setting, default):
+    if name not in _executors:
+        with _executor_lock:
+            if name not in _executors:
+                _executors[name] = ThreadPoolExecutor(
+                    max_workers=getattr(settings, setting, default), thread_name_prefix=f'catalog-{name}')
+    return _executors[name]
+
+
+def get_executor():
+    """The bounded pool running all blocking work: ORM queries, sync views, streamed bodies."""
+    return _pool('orm', 'CATALOG_ASGI_THREADS', 8)
+
+
+def get_request_executor():
+    """The pool whose threads run the middleware around the async views and wait for them."""
+    return _pool('request', 'CATALOG_ASGI_REQUEST_THREADS', 64)
+
+
+def _blocking(func, *args, **kwargs):
+    # Pool threads keep their connections between calls, subject to CONN_MAX_AGE, as request threads do.
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Runs ``func`` in the bounded thread pool and awaits its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(_blocking, func, *args, **kwargs))
+
+
+def check_access(request, permission):
+    """Returns a response refusing the request, or None, with PermissionRequiredMixin's behaviour."""
+    if not request.user.is_authenticated:
+        return redirect_to_login(request.get_full_path())
+    if not request.user.has_perm(permission):
+        return HttpResponseForbidden()
+    return None
+
+
+async def autocomplete(request, index, permission, paginate_by=10):
+    """Select2 results in the format of ``dal``'s ``Select2QuerySetView``."""
+    denied = await run_blocking(check_access, request, permission)
+    if denied is not None:
+        return denied
+
+    query = request.GET.get('q', '')
+    if index.needs_build():
+        results = await run_blocking(index.search, query)
+    else:
+        results = index.search(query)
+
+    page = Paginator(results, paginate_by).get_page(request.GET.get('page'))
+    return JsonResponse({
+        'results': [{'id': str(entry.pk), 'text': str(entry), 'selected_text': str(entry)} for entry in page],
+        'pagination': {'more': page.has_next()},
+    })
+
+
+async def read_view(request, view, **kwargs):
+    """Runs a read-only sync view in the pool."""
+    return await run_blocking(view, request, **kwargs)
+
+
+# Async implementations by URL name, taking the request and the URL kwargs.
+ASYNC_VIEWS = {
+    'author-autocomplete': functools.partial(
+        autocomplete, index=prefix_index.authors, permission='catalog.can_maintain'),
+    'genre-autocomplete': functools.partial(
+        autocomplete, index=prefix_index.genres, permission='catalog.can_maintain'),
+    'user_id-autocomplete': functools.partial(
+        autocomplete, index=prefix_index.usernames, permission='catalog.can_mark_returned'),
+    'api-books': functools.partial(read_view, view=views.api_books),
+    'api-book': functools.partial(read_view, view=views.api_book),
+}
+
+
+class AsyncViewHandler(BaseHandler):
+    """Django's middleware stack whose innermost call runs the ``ASYNC_VIEWS`` view on the event loop."""
+
+    def _get_response(self, request):
+        match = request.resolver_match
+        for middleware_method in self._view_middleware:
+            response = middleware_method(request, match.func, match.args, match.kwargs)
+            if response:
+                return response
+        view = ASYNC_VIEWS[match.url_name](request, **match.kwargs)
+        # Exceptions reach the middleware's exception handling as they would from a sync view.
+        return asyncio.run_coroutine_threadsafe(view, request.event_loop).result()
+
+
+def _produce(response, loop, queue, stopped):
+    # Iterates the body in one pool thread, so a queryset read while streaming keeps its connection.
+    try:
+        for part in response:
+            if stopped.is_set():
+                break
+            asyncio.run_coroutine_threadsafe(queue.put(part), loop).result()
+    finally:
+        asyncio.run_coroutine_threadsafe(queue.put(None), loop).result()
+
+
+class CatalogASGIHandler(ASGIHandler):
+    """Django's ASGI handler, serving ``ASYNC_VIEWS`` routes with async views and the rest from the pool."""
+
+    # Parts of a streaming body read ahead of the client.
+    stream_buffer = 16
+
+    def __init__(self):
+        super().__init__()
+        self.async_view_handler = AsyncViewHandler()
+        self.async_view_handler.load_middleware()
+
+    async def __call__(self, scope, receive, send):
+        match = None
+        if scope['type'] == 'http':
+            script_name = scope.get('root_path', '')
+            path_info = scope['path'][len(script_name):] if scope['path'].startswith(script_name) else scope['path']
+            try:
+                match = get_resolver().resolve(path_info)
+            except Resolver404:
+                pass
+        if match is None or match.url_name not in ASYNC_VIEWS:
+            return await super().__call__(scope, receive, send)
+
+        try:
+            body_file = await self.read_body(receive)
+        except RequestAborted:
+            return
+        set_script_prefix(self.get_script_prefix(scope))
+        request, response = self.create_request(scope, body_file)
+        if request is not None:
+            request.resolver_match = match
+            request.event_loop = asyncio.get_running_loop()
+            response = await request.event_loop.run_in_executor(
+                get_request_executor(), functools.partial(self.get_async_view_response, scope, request))
+        await self.send_response(response, send)
+
+    def get_async_view_response(self, scope, request):
+        signals.request_started.send(sender=self.__class__, scope=scope)
+        return self.async_view_handler.get_response(request)
+
+    async def get_response(self, request):
+        return await run_blocking(super().get_response, request)
+
+    async def send_response(self, response, send):
+        """Sends the response as Django's handler does, with the streamed body and ``close()`` in the pool."""
+        headers = []
+        for header, value in response.items():
+            if isinstance(header, str):
+                header = header.encode('ascii')
+            if isinstance(value, str):
+                value = value.encode('latin1')
+            headers.append((bytes(header), bytes(value)))
+        for cookie in response.cookies.values():
+            headers.append((b'Set-Cookie', cookie.output(header='').encode('ascii').strip()))
+        try:
+            await send({'type': 'http.response.start', 'status': response.status_code, 'headers': headers})
+            if response.streaming:
+                await self.send_stream(response, send)
+            else:
+                for chunk, last in self.chunk_bytes(response.content):
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': not last})
+        finally:
+            # Sends request_finished, whose receivers close database connections.
+            await run_blocking(response.close)
+
+    async def send_stream(self, response, send):
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(self.stream_buffer)
+        stopped = threading.Event()
+        producer = asyncio.ensure_future(run_blocking(_produce, response, loop, queue, stopped))
+        part = b''
+        try:
+            while True:
+                part = await queue.get()
+                if part is None:
+                    break
+                for chunk, _ in self.chunk_bytes(part):
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        except BaseException:
+            # The client is gone: stop the producer and take its last parts, so its pool thread is released.
+            stopped.set()
+            while part is not None:
+                part = await queue.get()
+            raise
+        # An error raised while iterating surfaces here, before the body is reported complete.
+        await producer
+        await send({'type': 'http.response.body'})
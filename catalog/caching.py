@@ -0,0 +1,54 @@
+"""
+What the cache-backed catalog features expect of ``CACHES['default']``.
+
+The fragment stamps (catalog.fragment_cache), the list ETags built from
+them (catalog.conditional), the prefix-index versions
+(catalog.prefix_index), the permission cache (catalog.permissions) and
+the buffered visit counter (catalog.visits) all share state between
+processes through the default cache. With a
+per-process backend such as the default ``LocMemCache``, each worker only
+sees its own bumps and keeps serving what the others changed, so the
+fragment cache renders uncached, list pages get no ETag, and the
+permission cache and the buffered counter refuse to start, unless
+``shared`` is true. Deployments
+with more than one process must point ``DJANGO_CACHE_BACKEND`` at a shared
+backend (memcached, the database cache or Redis); ``manage.py check
+--deploy`` warns when they do not.
+
+Invalidations go through ``invalidate``, which applies them immediately
+and again when the writing transaction commits. A render in another
+process between the two still reads the old rows and may cache them under
+the first stamp; the second makes that entry unreachable.
+"""
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+
+PER_PROCESS_BACKENDS = (LocMemCache, DummyCache)
+
+
+def shared(alias='default'):
+    """Whether every process using the cache ``alias`` sees the same entries."""
+    return not isinstance(caches[alias], PER_PROCESS_BACKENDS)
+
+
+def invalidate(func, using=None):
+    """Calls ``func`` now and, inside a transaction, again once it commits."""
+    func()
+    if transaction.get_connection(using).in_atomic_block:
+        transaction.on_commit(func, using)
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    if shared():
+        return []
+    return [checks.Warning(
+        'The default cache is private to each process, so fragment caching and list ETags are off '
+        'and autocomplete indexes are not invalidated across workers.',
+        hint='Set DJANGO_CACHE_BACKEND to a shared backend such as memcached or the database cache.',
+        id='catalog.W001',
+    )]
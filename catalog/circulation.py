@@ -0,0 +1,197 @@
+"""
+Checkout, return and renewal of book copies.
+
+Each operation is one conditional UPDATE: the row changes only if the copy
+is still in the state the librarian saw, and only the circulation columns
+are written. When two librarians act on the same copy, one UPDATE matches
+no row and that librarian gets a ``CirculationConflict`` instead of silently
+overwriting the other's change. This works the same on every database, with
+no row locks held while the request renders.
+
+A copy that becomes available goes to the first patron waiting in the
+book's hold queue, in the same transaction: the copy is reserved for them
+and their hold is ready for pickup. The queue is read from the
+``catalog_hold_queue_idx`` index in serving order, so finding the next
+patron costs one index seek however many holds are open.
+
+``QuerySet.update()`` sends no signals, so after a successful UPDATE the
+copy's ``post_save`` is sent by hand with ``update_fields``. The receivers in
+catalog.signals then adjust the counters, fragment stamps and timestamps as
+for ``save()``, inside the same transaction.
+"""
+from django.db import IntegrityError, router, transaction
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+from .models import BookInstance, Hold
+
+
+class CirculationConflict(Exception):
+    """Raised when a copy changed since it was loaded, so the operation was not applied."""
+
+
+def _update(copy, expected, changes, conflict):
+    changes = dict(changes, updated_at=timezone.now())
+    using = router.db_for_write(BookInstance, instance=copy)
+    with transaction.atomic(using=using):
+        # The base manager's plain update: the post_save below adjusts the book's copy counters.
+        if not BookInstance._base_manager.using(using).filter(pk=copy.pk, **expected).update(**changes):
+            raise CirculationConflict(conflict)
+        # The receivers compare against the status the UPDATE replaced.
+        copy._loaded_status = expected['status']
+        for name, value in changes.items():
+            setattr(copy, name, value)
+        post_save.send(sender=BookInstance, instance=copy, created=False, update_fields=frozenset(changes),
+                       raw=False, using=using)
+    return copy
+
+
+def waiting_holds(book_id, using=None):
+    """The book's waiting holds in serving order."""
+    return Hold.objects.using(using).filter(book_id=book_id, status='w').order_by(*Hold.QUEUE_ORDER)
+
+
+def _claim_next_hold(copy, using):
+    while True:
+        hold = waiting_holds(copy.book_id, using).first()
+        if hold is None:
+            return None
+        # Another copy returned at the same moment may have claimed this hold first.
+        if Hold.objects.using(using).filter(pk=hold.pk, status='w')\
+                .update(status='r', copy=copy, ready_at=timezone.now()):
+            return hold
+
+
+def _available(copy, using):
+    """The changes that make a copy available, or reserve it for the next patron waiting for its book."""
+    hold = _claim_next_hold(copy, using) if copy.book_id else None
+    if hold is None:
+        return {'status': 'a', 'borrower_id': None, 'due_back': None}
+    return {'status': 'r', 'borrower_id': hold.patron_id, 'due_back': None}
+
+
+def checkout(copy, borrower, due_back, expected_status=None):
+    """Lends a copy that is still in ``expected_status``, by default its loaded status."""
+    expected_status = copy.status if expected_status is None else expected_status
+    if expected_status == 'o':
+        raise CirculationConflict('This copy is already on loan.')
+    using = router.db_for_write(BookInstance, instance=copy)
+    with transaction.atomic(using=using):
+        _update(copy, {'status': expected_status},
+                {'status': 'o', 'borrower': borrower, 'due_back': due_back},
+                'This copy was changed by someone else. Check its status and try again.')
+        if expected_status == 'r':
+            held = Hold.objects.using(using).filter(copy=copy, status='r')
+            held.filter(patron=borrower).update(status='f')
+            # Lent to someone else: the patron it was set aside for keeps their place in the queue.
+            held.update(status='w', copy=None, ready_at=None)
+    return copy
+
+
+def check_in(copy, status='a'):
+    """Ends the loaded loan, leaving the copy in ``status`` or reserved for the next patron in the queue."""
+    using = router.db_for_write(BookInstance, instance=copy)
+    with transaction.atomic(using=using):
+        if status == 'a':
+            changes = _available(copy, using)
+        else:
+            changes = {'status': status, 'borrower_id': None, 'due_back': None}
+        return _update(copy, {'status': 'o', 'borrower_id': copy.borrower_id}, changes,
+                       'This loan has already ended.')
+
+
+def renew(copy, due_back):
+    """Moves the due date of the loaded loan."""
+    return _update(copy, {'status': 'o', 'borrower_id': copy.borrower_id},
+                   {'due_back': due_back},
+                   'This copy is no longer on loan to the same borrower.')
+
+
+def set_status(copy, status, expected_status=None):
+    """Moves a copy that is not on loan between available, reserved and maintenance.
+
+    Taking a copy out of reserve cancels the hold it was set aside for, as
+    when the patron does not collect it. A copy made available goes to the
+    next patron in the queue.
+    """
+    expected_status = copy.status if expected_status is None else expected_status
+    if 'o' in (status, expected_status):
+        raise ValueError('Use checkout() and check_in() for loans')
+    using = router.db_for_write(BookInstance, instance=copy)
+    with transaction.atomic(using=using):
+        changes = {'status': status}
+        if expected_status == 'r':
+            Hold.objects.using(using).filter(copy=copy, status='r').update(status='c')
+            changes['borrower_id'] = None
+        if status == 'a':
+            changes = _available(copy, using)
+        return _update(copy, {'status': expected_status}, changes,
+                       'This copy was changed by someone else. Check its status and try again.')
+
+
+def _reserve_available_copy(book_id, using):
+    """Sets an available copy of the book aside for the first patron in its queue; returns their hold."""
+    for copy in BookInstance.objects.using(using).filter(book_id=book_id, status='a'):
+        try:
+            # A savepoint, so that the claimed hold is released if the copy was taken meanwhile.
+            with transaction.atomic(using=using):
+                changes = _available(copy, using)
+                if changes['status'] == 'a':
+                    return None
+                _update(copy, {'status': 'a'}, changes, 'This copy was changed by someone else.')
+        except CirculationConflict:
+            continue
+        return Hold.objects.using(using).get(copy=copy, status='r')
+    return None
+
+
+def place_hold(book, patron, priority=None):
+    """Adds the patron to the end of the book's queue, among holds of the same priority.
+
+    When a copy is on the shelf, it is set aside at once for the patron now
+    first in the queue, as a return would.
+    """
+    hold = Hold(book=book, patron=patron)
+    if priority is not None:
+        hold.priority = priority
+    using = router.db_for_write(Hold)
+    try:
+        with transaction.atomic(using=using):
+            hold.save(using=using)
+    except IntegrityError:
+        raise CirculationConflict('You already have a hold on this book.')
+    ready = _reserve_available_copy(book.pk, using)
+    if ready is not None and ready.pk == hold.pk:
+        hold.status, hold.copy_id, hold.ready_at = ready.status, ready.copy_id, ready.ready_at
+    return hold
+
+
+def cancel_hold(hold):
+    """Cancels a waiting or ready hold; a copy set aside for it goes to the next patron."""
+    using = router.db_for_write(Hold, instance=hold)
+    with transaction.atomic(using=using):
+        if hold.status not in ('w', 'r') or \
+                not Hold.objects.using(using).filter(pk=hold.pk, status=hold.status).update(status='c'):
+            raise CirculationConflict('This hold has already been collected or cancelled.')
+        if hold.status == 'r' and hold.copy_id:
+            copy = BookInstance.objects.using(using).get(pk=hold.copy_id)
+            _update(copy, {'status': 'r', 'borrower_id': hold.patron_id}, _available(copy, using),
+                    'This copy was changed by someone else.')
+        hold.status = 'c'
+    return hold
+
+
+def with_queue_positions(holds):
+    """Annotates ``queue_position``, 1 for the next patron served, from an indexed count of the holds ahead."""
+    ahead = Hold.objects\
+        .filter(book=OuterRef('book'), status='w')\
+        .filter(Q(priority__lt=OuterRef('priority')) |
+                Q(priority=OuterRef('priority'), placed_at__lt=OuterRef('placed_at')) |
+                Q(priority=OuterRef('priority'), placed_at=OuterRef('placed_at'), id__lt=OuterRef('id')))\
+        .order_by()\
+        .values('book')\
+        .annotate(count=Count('id'))\
+        .values('count')
+    return holds.annotate(queue_position=Coalesce(Subquery(ahead, output_field=IntegerField()), 0) + 1)
@@ -0,0 +1,113 @@
+"""
+Conditional GET for the catalog pages.
+
+Every page has a validator function returning the state the page depends on.
+Detail pages read the object's ``updated_at`` with one query; the receivers
+in catalog.signals touch a book when its copies, genres or author change and
+an author when one of their books changes, so the timestamp covers
+everything the page shows. List pages use the table version stamps of
+catalog.fragment_cache, which cost no query at all: a COUNT to notice
+deletions would defeat cursor pagination on large tables. Those stamps are
+only shared between processes through a shared cache, so with a
+per-process one list pages get no validators; see catalog.caching.
+
+``conditional_page`` turns the state into an ETag, and for detail pages into
+a Last-Modified date too, and Django's ``condition`` decorator answers a
+matching request with 304 before the view or its template runs.
+
+ETags also cover the user and the full path, because the pages show the
+username and are paginated by query string.
+"""
+import datetime
+import hashlib
+
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+
+from . import caching, fragment_cache, routers
+from .models import Author, Book
+
+
+def _detail_state(request, queryset, pk):
+    # The row is loaded in full so ValidatedObjectMixin can hand it to the view.
+    request.catalog_object = obj = queryset.filter(pk=pk).first()
+    return ((obj.updated_at,), obj.updated_at) if obj else None
+
+
+def book_detail(request, pk):
+    return _detail_state(request, Book.objects.select_related('author'), pk)
+
+
+def author_detail(request, pk):
+    return _detail_state(request, Author.objects.all(), pk)
+
+
+def _table_state(*labels):
+    # Stamps change on every save or delete, but deletions leave no timestamp behind,
+    # so lists get no Last-Modified. A replica may lag behind the stamps, and a per-process
+    # cache misses the other workers' bumps, so no ETag either.
+    if routers.reading_from_replica() or not caching.shared():
+        return None
+    return tuple(fragment_cache.stamps([fragment_cache.table_key(label) for label in labels])), None
+
+
+def book_list(request):
+    return _table_state('catalog.book', 'catalog.author', 'catalog.language')
+
+
+def author_list(request):
+    return _table_state('catalog.author')
+
+
+def borrowed_by_user(request):
+    # Copy changes bump the stamps of their books. The overdue count changes with the date alone.
+    result = _table_state('catalog.book')
+    return result and (result[0] + (datetime.date.today(),), None)
+
+
+def all_borrowed(request):
+    return _table_state('catalog.book', 'auth.user')
+
+
+def conditional_page(validators, permission=None):
+    """
+    Class decorator adding ETag and Last-Modified validation to a view.
+
+    ``validators(request, **kwargs)`` returns ``(state, last_modified)``, or
+    None when the object does not exist, which leaves the response to the
+    view. Users who are anonymous, or lack ``permission``,
+    get no validators and reach the view's own access checks.
+    """
+    def get_validators(request, *args, **kwargs):
+        if not hasattr(request, '_catalog_validators'):
+            validated = None
+            user = request.user
+            if user.is_authenticated and (permission is None or user.has_perm(permission)):
+                result = validators(request, **kwargs)
+                if result is not None:
+                    state, last_modified = result
+                    parts = [str(user.pk), request.get_full_path()] + [str(value) for value in state]
+                    etag = hashlib.md5('\n'.join(parts).encode()).hexdigest()
+                    validated = etag, last_modified
+            request._catalog_validators = validated
+        return request._catalog_validators
+
+    def etag(request, *args, **kwargs):
+        validated = get_validators(request, *args, **kwargs)
+        return validated and validated[0]
+
+    def last_modified(request, *args, **kwargs):
+        validated = get_validators(request, *args, **kwargs)
+        return validated and validated[1]
+
+    return method_decorator(condition(etag_func=etag, last_modified_func=last_modified), name='dispatch')
+
+
+class ValidatedObjectMixin:
+    """``DetailView`` mixin reusing the object loaded by the validators instead of querying it again."""
+
+    def get_object(self, queryset=None):
+        obj = getattr(self.request, 'catalog_object', None)
+        if obj is None or queryset is not None:
+            return super().get_object(queryset)
+        return obj
@@ -0,0 +1,104 @@
+"""
+Row generators and encoders for the streaming export views.
+
+Every generator walks its table in fixed-size chunks, so memory use stays
+flat however large the table is and the first rows can be sent as soon as
+the first chunk is read.
+"""
+import csv
+import json
+from collections import defaultdict
+
+from .models import Author, Book, BookInstance
+
+
+CHUNK_SIZE = 2000
+
+
+class Echo:
+    """File-like object whose ``write`` hands the value straight back, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def book_rows(chunk_size=CHUNK_SIZE):
+    yield ['id', 'title', 'isbn', 'author_id', 'author_first_name', 'author_last_name', 'summary']
+    rows = Book.objects\
+        .order_by('pk')\
+        .values_list('pk', 'title', 'isbn', 'author_id', 'author__first_name', 'author__last_name', 'summary')
+    yield from rows.iterator(chunk_size=chunk_size)
+
+
+def author_rows(chunk_size=CHUNK_SIZE):
+    yield ['id', 'first_name', 'last_name', 'date_of_birth', 'date_of_death']
+    rows = Author.objects\
+        .order_by('pk')\
+        .values_list('pk', 'first_name', 'last_name', 'date_of_birth', 'date_of_death')
+    yield from rows.iterator(chunk_size=chunk_size)
+
+
+def bookinstance_rows(chunk_size=CHUNK_SIZE, queryset=None):
+    """
+    Copies with their book, borrower and languages.
+
+    Languages are many-to-many, which ``iterator()`` cannot prefetch, so the
+    table is walked by primary key in chunks and the languages of each chunk
+    are fetched with one extra query.
+    """
+    yield ['id', 'book_id', 'book_title', 'imprint', 'status', 'due_back', 'borrower', 'languages']
+    queryset = BookInstance.objects.all() if queryset is None else queryset
+    queryset = queryset\
+        .order_by('pk')\
+        .values_list('pk', 'book_id', 'book__title', 'imprint', 'status', 'due_back', 'borrower__username')
+
+    last_pk = None
+    while True:
+        chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        chunk = list(chunk[:chunk_size])
+        if not chunk:
+            return
+
+        languages = defaultdict(list)
+        for copy_id, name in BookInstance.language.through.objects\
+                .filter(bookinstance_id__in=[row[0] for row in chunk])\
+                .order_by('language__name')\
+                .values_list('bookinstance_id', 'language__name'):
+            languages[copy_id].append(name)
+
+        for row in chunk:
+            yield row + (';'.join(languages[row[0]]),)
+        last_pk = chunk[-1][0]
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_csv(rows):
+    writer = csv.writer(Echo())
+    for row in rows:
+        yield writer.writerow([_text(value) for value in row])
+
+
+def _json(value):
+    if value is None or isinstance(value, (int, str)):
+        return value
+    return _text(value)
+
+
+def encode_jsonl(rows):
+    rows = iter(rows)
+    header = next(rows)
+    for row in rows:
+        yield json.dumps(dict(zip(header, (_json(value) for value in row)))) + '\n'
+
+
+ENCODERS = {
+    'csv': (encode_csv, 'text/csv'),
+    'jsonl': (encode_jsonl, 'application/x-ndjson'),
+}
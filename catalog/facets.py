@@ -0,0 +1,126 @@
+"""
+Faceted filtering of the book list, with counts per facet value.
+
+The filters come from the query string: ``genre``, ``language`` and
+``author`` take ids and ``status`` takes copy status codes, each repeatable.
+Values of one facet are alternatives, different facets must all match. Every
+filter is a ``pk IN (subquery)`` on the book, so a book with several matching
+genres or copies is listed once and the list keeps its keyset ordering.
+
+Each facet is counted with one grouped query over its join table, restricted
+to the books matching the other facets' filters, so selecting a genre still
+shows how many books the other genres have. The counts are cached under the
+table stamps of catalog.fragment_cache: they are computed once per change to
+the catalog and filter combination, and the book list fragment, which
+renders them, is invalidated by the same stamps.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.db.models import Count
+from django.http import QueryDict
+
+from . import fragment_cache
+from .models import Book, BookInstance
+
+
+FACETS = ('genre', 'language', 'author', 'status')
+TITLES = {'genre': 'Genre', 'language': 'Language', 'author': 'Author', 'status': 'Availability'}
+TABLES = ('catalog.book', 'catalog.author', 'catalog.language')
+STATUSES = dict(BookInstance.LOAN_STATUS)
+TOP_AUTHORS = 10
+
+
+def selected(query):
+    """The valid filter values in ``query`` per facet, sorted, leaving out empty facets."""
+    selection = {}
+    for name in FACETS:
+        if name == 'status':
+            values = {value for value in query.getlist(name) if value in STATUSES}
+        else:
+            values = {int(value) for value in query.getlist(name) if value.isdigit()}
+        if values:
+            selection[name] = sorted(values)
+    return selection
+
+
+def query_string(selection):
+    query = QueryDict(mutable=True)
+    for name, values in selection.items():
+        query.setlist(name, [str(value) for value in values])
+    return query.urlencode()
+
+
+def _book_ids(name, values):
+    if name == 'genre':
+        return Book.genre.through.objects.filter(genre_id__in=values).values('book_id')
+    if name == 'language':
+        return BookInstance.language.through.objects.filter(language_id__in=values).values('bookinstance__book_id')
+    if name == 'author':
+        return Book.objects.filter(author_id__in=values).values('pk')
+    return BookInstance.objects.filter(status__in=values).values('book_id')
+
+
+def filter_books(queryset, selection, exclude=None):
+    """Restricts ``queryset`` to the books matching every selected facet but ``exclude``."""
+    for name, values in selection.items():
+        if name != exclude:
+            queryset = queryset.filter(pk__in=_book_ids(name, values))
+    return queryset
+
+
+def _restricted(rows, field, selection, name):
+    # Without other filters the whole join table is grouped, with no join to the book.
+    if any(other != name for other in selection):
+        rows = rows.filter(**{f'{field}__in': filter_books(Book.objects.all(), selection, exclude=name).values('pk')})
+    return rows
+
+
+def _counts(name, selection):
+    """Rows of (value, label, number of books) for one facet, by descending count."""
+    if name == 'genre':
+        rows = _restricted(Book.genre.through.objects.all(), 'book_id', selection, name)\
+            .order_by().values_list('genre_id', 'genre__name').annotate(count=Count('book_id'))
+    elif name == 'language':
+        rows = _restricted(BookInstance.language.through.objects.all(), 'bookinstance__book_id', selection, name)\
+            .order_by().values_list('language_id', 'language__name')\
+            .annotate(count=Count('bookinstance__book_id', distinct=True))
+    elif name == 'author':
+        rows = _restricted(Book.objects.all(), 'pk', selection, name)\
+            .values_list('author_id', 'author__first_name', 'author__last_name')\
+            .annotate(count=Count('id')).filter(author_id__isnull=False)\
+            .order_by('-count', 'author__last_name', 'author__first_name')[:TOP_AUTHORS]
+        return [(pk, f'{last_name}, {first_name}', count) for pk, first_name, last_name, count in rows]
+    else:
+        rows = _restricted(BookInstance.objects.filter(book__isnull=False), 'book_id', selection, name)\
+            .order_by().values_list('status').annotate(count=Count('book_id', distinct=True))
+        rows = [(status, STATUSES[status], count) for status, count in rows]
+    return sorted(rows, key=lambda row: (-row[2], row[1]))
+
+
+def _toggle(selection, name, value):
+    values = set(selection.get(name, ()))
+    values ^= {value}
+    toggled = {key: current for key, current in selection.items() if key != name}
+    if values:
+        toggled[name] = sorted(values)
+    return {key: toggled[key] for key in FACETS if key in toggled}
+
+
+def facet_counts(selection):
+    """The facets for the book list: a title and the values with their counts, selection and toggle link."""
+    digest = hashlib.md5(':'.join([query_string(selection)] + fragment_cache.stamps(
+        [fragment_cache.table_key(label) for label in TABLES])).encode()).hexdigest()
+    key = f'catalog:facets:{digest}'
+    counts = cache.get(key)
+    if counts is None:
+        counts = {name: _counts(name, selection) for name in FACETS}
+        cache.set(key, counts, fragment_cache.timeout())
+    return [
+        {'name': name, 'title': TITLES[name], 'values': [
+            {'value': value, 'label': label, 'count': count, 'selected': value in selection.get(name, ()),
+             'query': query_string(_toggle(selection, name, value))}
+            for value, label, count in counts[name]
+        ]}
+        for name in FACETS if counts[name]
+    ]
@@ -31,6 +31,8 @@ class RenewBookForm(forms.Form):
 
 
 class ChangeBookStatusForm(forms.ModelForm):
+    # The status shown when the form was rendered, so a change made meanwhile is reported, not overwritten.
+    expected_status = forms.ChoiceField(choices=BookInstance.LOAN_STATUS, required=False, widget=forms.HiddenInput)
 
     def clean(self):
         cleaned_data = super(ChangeBookStatusForm, self).clean()
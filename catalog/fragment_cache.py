@@ -0,0 +1,119 @@
+"""
+Version-stamped template fragment caching.
+
+Every catalog object has a version stamp in the cache, and so has every
+catalog table. The receivers in catalog.signals bump the stamps of whatever
+a save, delete or many-to-many change can make stale. The
+``{% fragmentcache %}`` tag (catalog_cache template library) puts the
+stamps of the objects and tables a fragment depends on into its cache key,
+so a bump makes the next render miss and stale entries simply expire.
+Bumps are repeated when the writing transaction commits, and only reach
+other processes through a shared cache, so with a per-process one the tag
+renders its content uncached; see catalog.caching.
+
+Fragments must not contain per-user output, not even links shown only to
+users with a permission: such controls belong outside the fragment, and a
+page whose every row carries them is rendered uncached for those users.
+
+Hits and misses are counted per fragment name in the cache; ``hit_ratios``
+reports them, and so does the ``fragment_cache_stats`` command.
+"""
+import hashlib
+import itertools
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Model
+
+from . import caching, routers
+
+
+FRAGMENT_NAMES = ('book-list', 'author-list', 'book-detail', 'author-detail')
+
+_sequence = itertools.count()
+
+
+def _new_stamp():
+    # Unique per process and increasing, so a stamp evicted from the cache is never reissued.
+    return f'{time.time_ns():x}.{next(_sequence)}'
+
+
+def timeout():
+    if routers.reading_from_replica():
+        # The replica may not have caught up with the stamps yet; see catalog.routers.
+        return min(getattr(settings, 'CATALOG_FRAGMENT_CACHE_TIMEOUT', 3600),
+                   getattr(settings, 'CATALOG_PRIMARY_PIN_SECONDS', 5))
+    return getattr(settings, 'CATALOG_FRAGMENT_CACHE_TIMEOUT', 3600)
+
+
+def object_key(label, pk):
+    return f'catalog:version:{label}:{pk}'
+
+
+def table_key(label):
+    return f'catalog:version:{label}'
+
+
+def bump(label, pks=()):
+    """Invalidates fragments depending on the given objects, and on the table ``label`` itself."""
+    keys = [object_key(label, pk) for pk in pks if pk is not None] + [table_key(label)]
+
+    def set_stamps():
+        stamp = _new_stamp()
+        cache.set_many(dict.fromkeys(keys, stamp), None)
+
+    caching.invalidate(set_stamps)
+
+
+def bump_instance(instance):
+    bump(instance._meta.label_lower, [instance.pk])
+
+
+def stamps(keys):
+    """Returns the current stamps for ``keys``, issuing new ones for keys not in the cache."""
+    found = cache.get_many(keys)
+    missing = {key: _new_stamp() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+def fragment_key(name, vary_on, tables=()):
+    """Builds the cache key from the fragment name, vary-on values and dependency stamps."""
+    version_keys = [table_key(label) for label in tables]
+    parts = []
+    for value in vary_on:
+        if isinstance(value, Model):
+            version_keys.append(object_key(value._meta.label_lower, value.pk))
+        else:
+            parts.append(str(value))
+    parts.extend(stamps(version_keys))
+    parts.append('replica' if routers.reading_from_replica() else 'primary')
+    digest = hashlib.md5(':'.join(parts).encode()).hexdigest()
+    return f'catalog:fragment:{name}:{digest}'
+
+
+def record(name, hit):
+    counter = f'catalog:fragment-stats:{name}:{"hits" if hit else "misses"}'
+    try:
+        cache.incr(counter)
+    except ValueError:
+        cache.add(counter, 1, None)
+
+
+def hit_ratios(names=FRAGMENT_NAMES):
+    """Returns ``{name: (hits, misses, ratio)}`` for the given fragment names."""
+    keys = [f'catalog:fragment-stats:{name}:{kind}' for name in names for kind in ('hits', 'misses')]
+    counts = cache.get_many(keys)
+    ratios = {}
+    for name in names:
+        hits = counts.get(f'catalog:fragment-stats:{name}:hits', 0)
+        misses = counts.get(f'catalog:fragment-stats:{name}:misses', 0)
+        ratios[name] = (hits, misses, hits / (hits + misses) if hits + misses else None)
+    return ratios
+
+
+def reset_stats(names=FRAGMENT_NAMES):
+    cache.delete_many([f'catalog:fragment-stats:{name}:{kind}' for name in names for kind in ('hits', 'misses')])
@@ -0,0 +1,223 @@
+"""
+Query-count and query-time budgets for the catalog views.
+
+``QueryBudgetMiddleware`` wraps every request, and the sending of a streamed
+body, in a ``QueryRecorder`` (installed with ``connection.execute_wrapper``),
+aggregates the results per
+URL name in ``stats`` and logs a warning when a view exceeds its entry in
+``QUERY_BUDGETS``. Tests use ``QueryBudgetTestMixin.assertWithinBudget`` to
+turn the same budgets into failures.
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger('catalog.queries')
+
+# Per-view budgets keyed by URL name: maximum queries per request and total
+# database time in milliseconds. Counts include the session, user and
+# permission lookups done by the auth middleware and sidebar. Form views
+# nest a separate budget for their submissions under 'POST', measured for a
+# valid submission: the write, its signal receivers and the redirect.
+# Export budgets cover the whole streamed body of an export that fits in
+# one chunk (catalog.exports.CHUNK_SIZE rows).
+QUERY_BUDGETS = {
+    'index': {'queries': 8, 'time_ms': 20},
+    'books': {'queries': 11, 'time_ms': 50},
+    'search': {'queries': 7, 'time_ms': 50},
+    'book-detail': {'queries': 9, 'time_ms': 50},
+    'authors': {'queries': 7, 'time_ms': 50},
+    'author-detail': {'queries': 8, 'time_ms': 50},
+    'my-borrowed': {'queries': 8, 'time_ms': 50},
+    'all-borrowed': {'queries': 7, 'time_ms': 50},
+    'my-holds': {'queries': 7, 'time_ms': 50},
+    'place-hold': {'queries': 2, 'time_ms': 20, 'POST': {'queries': 20, 'time_ms': 100}},
+    'cancel-hold': {'queries': 2, 'time_ms': 20, 'POST': {'queries': 16, 'time_ms': 100}},
+    'renew-book-librarian': {'queries': 8, 'time_ms': 50, 'POST': {'queries': 11, 'time_ms': 100}},
+    'manage-book-librarian': {'queries': 8, 'time_ms': 50, 'POST': {'queries': 17, 'time_ms': 100}},
+    'author_create': {'queries': 6, 'time_ms': 50},
+    'author_update': {'queries': 6, 'time_ms': 50},
+    'author_delete': {'queries': 6, 'time_ms': 50},
+    'book_create': {'queries': 8, 'time_ms': 50, 'POST': {'queries': 24, 'time_ms': 100}},
+    'book_update': {'queries': 8, 'time_ms': 50, 'POST': {'queries': 16, 'time_ms': 100}},
+    'book_delete': {'queries': 6, 'time_ms': 50},
+    'export-books': {'queries': 5, 'time_ms': 50},
+    'export-authors': {'queries': 5, 'time_ms': 50},
+    'export-circulation': {'queries': 7, 'time_ms': 50},
+    'api-books': {'queries': 4, 'time_ms': 20},
+    'api-book': {'queries': 4, 'time_ms': 20},
+    'author-autocomplete': {'queries': 5, 'time_ms': 20},
+    'genre-autocomplete': {'queries': 5, 'time_ms': 20},
+    'user_id-autocomplete': {'queries': 5, 'time_ms': 20},
+}
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+
+
+def fingerprint(sql):
+    """Collapses variable-length ``IN (%s, ...)`` lists so equivalent queries compare equal."""
+    return _IN_LIST.sub('IN (...)', sql)
+
+
+def get_budget(url_name, method='GET'):
+    budgets = getattr(settings, 'CATALOG_QUERY_BUDGETS', QUERY_BUDGETS)
+    budget = budgets.get(url_name)
+    if budget and method in budget:
+        return budget[method]
+    return budget
+
+
+class QueryRecorder:
+    """``execute_wrapper`` callable recording the SQL and duration of every query."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((fingerprint(sql), time.perf_counter() - start))
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def time_ms(self):
+        return sum(duration for _, duration in self.queries) * 1000
+
+    def duplicates(self):
+        """Returns ``{fingerprint: times run}`` for queries issued more than once."""
+        counts = Counter(sql for sql, _ in self.queries)
+        return {sql: count for sql, count in counts.items() if count > 1}
+
+    def violations(self, budget):
+        """Returns human readable descriptions of how the recording exceeds ``budget``."""
+        if not budget:
+            return []
+        problems = []
+        if 'queries' in budget and self.count > budget['queries']:
+            problems.append(f'{self.count} queries (budget {budget["queries"]})')
+        if 'time_ms' in budget and self.time_ms > budget['time_ms']:
+            problems.append(f'{self.time_ms:.1f} ms in the database (budget {budget["time_ms"]} ms)')
+        return problems
+
+
+@contextmanager
+def record_queries(using=None, recorder=None):
+    """
+    Records the queries run on ``using`` (default: every configured database)
+    inside the block, into ``recorder`` if given, else into a new one.
+    """
+    recorder = recorder or QueryRecorder()
+    aliases = [using] if using else list(connections)
+    with ExitStack() as stack:
+        for alias in aliases:
+            stack.enter_context(connections[alias].execute_wrapper(recorder))
+        yield recorder
+
+
+class ViewStats:
+    """Per-URL-name totals accumulated by the middleware in this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = defaultdict(Counter)
+
+    def add(self, url_name, recorder, over_budget):
+        with self._lock:
+            totals = self._totals[url_name]
+            totals['requests'] += 1
+            totals['queries'] += recorder.count
+            totals['time_ms'] += recorder.time_ms
+            totals['duplicate_queries'] += sum(count - 1 for count in recorder.duplicates().values())
+            totals['over_budget'] += int(over_budget)
+
+    def snapshot(self):
+        with self._lock:
+            return {url_name: dict(totals) for url_name, totals in self._totals.items()}
+
+    def reset(self):
+        with self._lock:
+            self._totals.clear()
+
+
+stats = ViewStats()
+
+
+class QueryBudgetMiddleware:
+    """Records queries per request and warns when a view exceeds its budget."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with record_queries() as recorder:
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        url_name = match.url_name if match else None
+        if url_name is None:
+            return response
+
+        response.query_recorder = recorder
+        if response.streaming:
+            # The body runs its queries while it is sent, so the budget is checked once it has been.
+            response.streaming_content = self.record_stream(
+                response.streaming_content, recorder, lambda: self.check(request, url_name, recorder))
+            return response
+
+        self.check(request, url_name, recorder)
+        if settings.DEBUG:
+            response['Server-Timing'] = f'db;desc="{recorder.count} queries";dur={recorder.time_ms:.1f}'
+        return response
+
+    @staticmethod
+    def record_stream(content, recorder, finished):
+        # Each chunk is recorded on its own, as the server may pull them from different threads.
+        chunks = iter(content)
+        try:
+            while True:
+                with record_queries(recorder=recorder):
+                    chunk = next(chunks, None)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            finished()
+
+    def check(self, request, url_name, recorder):
+        problems = recorder.violations(get_budget(url_name, request.method))
+        stats.add(url_name, recorder, bool(problems))
+        if problems:
+            duplicates = recorder.duplicates()
+            worst = max(duplicates.items(), key=lambda item: item[1]) if duplicates else None
+            logger.warning(
+                'Query budget exceeded for %s (%s): %s%s', url_name, request.path, '; '.join(problems),
+                f'; most repeated query ran {worst[1]} times: {worst[0][:200]}' if worst else '',
+            )
+
+
+class QueryBudgetTestMixin:
+    """``TestCase`` mixin asserting that responses stay within their view's budget."""
+
+    def assertWithinBudget(self, response, check_time=False):
+        recorder = getattr(response, 'query_recorder', None)
+        self.assertIsNotNone(recorder, 'Response was not recorded by QueryBudgetMiddleware')
+        url_name = response.resolver_match.url_name
+        budget = get_budget(url_name, response.request['REQUEST_METHOD'])
+        self.assertIsNotNone(budget, f'No query budget declared for {url_name}')
+        if not check_time:
+            budget = {key: value for key, value in budget.items() if key != 'time_ms'}
+        problems = recorder.violations(budget)
+        self.assertFalse(problems, f'{url_name} over budget: {"; ".join(problems)}; '
+                                   f'repeated queries: {recorder.duplicates()}')
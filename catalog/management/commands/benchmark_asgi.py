@@ -0,0 +1,125 @@
+import asyncio
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import RequestFactory
+from django.urls import reverse
+
+from catalog import asgi
+
+
+class Command(BaseCommand):
+    # In-process load test: a sync worker, as run by gunicorn's default worker
+    # class, serves one request at a time; the ASGI worker serves many at
+    # once from a single event loop and a bounded thread pool.
+    help = 'Compares concurrent autocomplete requests served by one sync worker and one ASGI worker'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='A user with the catalog.can_maintain permission')
+        parser.add_argument('--requests', type=int, default=400)
+        parser.add_argument('--concurrency', type=int, default=50, help='Clients sending requests at once')
+        parser.add_argument('--query-delay-ms', type=float, default=5,
+                            help='Latency added to every query, as a database on another host would add')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f'No user named {options["username"]}')
+        if not user.has_perm('catalog.can_maintain'):
+            raise CommandError(f'{user} lacks catalog.can_maintain')
+
+        cookie = f'{settings.SESSION_COOKIE_NAME}={self.login(user)}'
+        paths = [(reverse('author-autocomplete'), f'q={prefix}') for prefix in 'abcdefghijklmnopqrstuvwxyz']
+        self.install_delay(options['query_delay_ms'] / 1000)
+
+        sync = self.run_sync(cookie, paths, options['requests'])
+        concurrent = asyncio.run(self.run_asgi(cookie, paths, options['requests'], options['concurrency']))
+        for name, (throughput, in_flight, errors) in (('sync', sync), ('asgi', concurrent)):
+            self.stdout.write(f'{name:>5}: {throughput:7.0f} requests/s   '
+                              f'{in_flight:4d} requests in flight at most   {errors} errors')
+        self.stdout.write(f'ASGI speed-up x{concurrent[0] / sync[0]:.1f} with '
+                          f'{settings.CATALOG_ASGI_THREADS} pool threads')
+
+    @staticmethod
+    def login(user):
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0] \
+            if getattr(settings, 'AUTHENTICATION_BACKENDS', None) else 'django.contrib.auth.backends.ModelBackend'
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+        return session.session_key
+
+    @staticmethod
+    def install_delay(delay):
+        if not delay:
+            return
+
+        def slow(execute, sql, params, many, context):
+            time.sleep(delay)
+            return execute(sql, params, many, context)
+
+        def add_wrapper(sender, connection, **kwargs):
+            # Reconnecting reuses the thread's DatabaseWrapper and its wrappers.
+            if slow not in connection.execute_wrappers:
+                connection.execute_wrappers.append(slow)
+
+        connection_created.connect(add_wrapper, weak=False)
+        add_wrapper(None, connection)
+
+    @staticmethod
+    def run_sync(cookie, paths, requests):
+        handler = WSGIHandler()
+        factory = RequestFactory()
+        errors = 0
+        start = time.perf_counter()
+        for number in range(requests):
+            path, query = paths[number % len(paths)]
+            environ = factory.get(path, HTTP_COOKIE=cookie, QUERY_STRING=query, SERVER_NAME='localhost').environ
+            statuses = []
+            response = handler(environ, lambda status, headers: statuses.append(status))
+            response.close()
+            errors += not statuses[0].startswith('200')
+        return requests / (time.perf_counter() - start), 1, errors
+
+    @staticmethod
+    async def run_asgi(cookie, paths, requests, concurrency):
+        application = asgi.CatalogASGIHandler()
+        semaphore = asyncio.Semaphore(concurrency)
+        in_flight = peak = errors = 0
+
+        async def one(number):
+            nonlocal in_flight, peak, errors
+            path, query = paths[number % len(paths)]
+            scope = {
+                'type': 'http', 'method': 'GET', 'path': path, 'root_path': '', 'scheme': 'http',
+                'query_string': query.encode(), 'server': ('localhost', 80), 'client': ('127.0.0.1', 5000),
+                'headers': [(b'host', b'localhost'), (b'cookie', cookie.encode())],
+            }
+            statuses = []
+
+            async def receive():
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses.append(message['status'])
+
+            async with semaphore:
+                in_flight += 1
+                peak = max(peak, in_flight)
+                await application(scope, receive, send)
+                in_flight -= 1
+            errors += statuses != [200]
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(number) for number in range(requests)))
+        return requests / (time.perf_counter() - start), peak, errors
@@ -0,0 +1,59 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management import BaseCommand
+from django.db.models import Q
+
+from catalog import prefix_index
+from catalog.models import Author, Genre
+
+
+def _author_queryset(q):
+    # The lookup AuthorAutoComplete used before the prefix index.
+    if ' ' not in q:
+        return Author.objects.filter(Q(first_name__istartswith=q) | Q(last_name__istartswith=q))
+    names = q.split(' ')
+    return Author.objects.filter(Q(first_name__istartswith=names[0]) | Q(last_name__istartswith=names[1]))
+
+
+class Command(BaseCommand):
+    help = 'Compares autocomplete lookups through the prefix indexes with the equivalent querysets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=200, help='Lookups per prefix')
+
+    def keystrokes(self, names):
+        """Every prefix of the first few names, as typed one key at a time."""
+        return [name[:length] for name in names[:5] for length in range(1, len(name) + 1)]
+
+    def time_lookups(self, lookup, queries, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for q in queries:
+                lookup(q)
+        return (time.perf_counter() - start) / (repeat * len(queries)) * 1e6
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        cases = [
+            ('author', prefix_index.authors, lambda q: list(_author_queryset(q)[:10]),
+             [str(a.last_name) for a in Author.objects.all()[:5]]),
+            ('genre', prefix_index.genres, lambda q: list(Genre.objects.filter(name__istartswith=q)[:10]),
+             list(Genre.objects.values_list('name', flat=True)[:5])),
+            ('user', prefix_index.usernames, lambda q: list(User.objects.filter(username__istartswith=q)[:10]),
+             list(User.objects.values_list('username', flat=True)[:5])),
+        ]
+
+        for name, index, queryset_lookup, names in cases:
+            queries = self.keystrokes(names)
+            if not queries:
+                self.stdout.write(f'{name:>8}: no rows to benchmark')
+                continue
+
+            index.search('')  # build outside the timed loop
+            index_us = self.time_lookups(lambda q: index.search(q)[:10], queries, repeat)
+            queryset_us = self.time_lookups(queryset_lookup, queries, repeat)
+            self.stdout.write(
+                f'{name:>8}: index {index_us:9.1f} us/lookup   queryset {queryset_us:9.1f} us/lookup   '
+                f'speed-up x{queryset_us / index_us:.1f}'
+            )
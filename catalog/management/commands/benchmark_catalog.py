@@ -0,0 +1,280 @@
+import datetime
+import json
+import os
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+from io import StringIO
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.core.management import BaseCommand, CommandError, call_command
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog import circulation, sqlite, urls
+from catalog.models import Author, Book, BookInstance, Hold
+
+
+USERS = ('anonymous', 'patron', 'librarian')
+GENRES = ('Fantasy', 'Science Fiction', 'Mystery', 'Romance', 'Horror', 'Poetry', 'History', 'Biography',
+          'Travel', 'Cooking', 'Philosophy', 'Drama', 'Children', 'Crime', 'Essays', 'Humour')
+LANGUAGES = ('English', 'French', 'German', 'Spanish', 'Italian', 'Japanese')
+STATUS_WEIGHTS = (('a', 50), ('o', 35), ('m', 10), ('r', 5))
+SURNAMES = ('Smith', 'Jones', 'Taylor', 'Brown', 'Williams', 'Wilson', 'Johnson', 'Davies', 'Robinson', 'Wright',
+            'Thompson', 'Evans', 'Walker', 'White', 'Roberts', 'Green', 'Hall', 'Wood', 'Jackson', 'Clarke')
+FORENAMES = ('Ann', 'Ben', 'Cara', 'Dan', 'Eve', 'Finn', 'Gail', 'Hugo', 'Iris', 'Jon', 'Kim', 'Leo')
+PASSWORD = 'benchmark'
+
+
+def percentile(ordered, share):
+    """Nearest-rank percentile of a sorted list."""
+    return ordered[min(len(ordered) - 1, max(0, round(share * len(ordered)) - 1))]
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=settings.BASE_DIR, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    # Builds a deterministic catalog in a throwaway SQLite file, never the
+    # configured database, then requests every named catalog URL through the
+    # full middleware stack as each kind of user. The first --warmup requests
+    # of each case fill the fragment caches and are not measured.
+    help = 'Measures latency percentiles, queries and throughput of every catalog URL on a generated catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--copies', type=int, default=10000,
+                            help='BookInstances to generate, e.g. 10000, 100000 or 1000000')
+        parser.add_argument('--patrons', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--requests', type=int, default=20, help='Measured requests per URL and user')
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--routes', nargs='+', metavar='NAME', help='Only these URL names')
+        parser.add_argument('--users', nargs='+', choices=USERS, default=list(USERS))
+        parser.add_argument('--output', help='JSON results file, by default benchmark-COPIES.json')
+        parser.add_argument('--compare', metavar='PATH', help='Earlier results to report regressions against')
+        parser.add_argument('--threshold', type=float, default=1.25,
+                            help='p95 ratio over the earlier results that counts as a regression')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('The configured database is not SQLite')
+        cases = self.cases()
+        self.check_cases(cases)
+        names = options['routes'] or list(cases)
+        unknown = set(names) - set(cases)
+        if unknown:
+            raise CommandError(f'Unknown URL names: {", ".join(sorted(unknown))}')
+
+        # A private cache keeps the fragment stamps apart from those of the configured database, and plain
+        # static files storage renders without a collectstatic manifest. The permission cache refuses
+        # a per-process cache, so permissions are read as the default settings do.
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                                   'LOCATION': 'catalog-benchmark'}},
+                               AUTHENTICATION_BACKENDS=['django.contrib.auth.backends.ModelBackend'],
+                               ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+                               STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage'), \
+                sqlite.scratch_database('catalog'):
+            start = time.perf_counter()
+            self.seed(options)
+            self.stdout.write(f'Generated {BookInstance.objects.count()} copies of {Book.objects.count()} books '
+                              f'in {time.perf_counter() - start:.1f}s')
+            results = [self.measure(name, cases[name], user, options) for name in names for user in options['users']]
+
+        output = options['output'] or f'benchmark-{options["copies"]}.json'
+        with open(output, 'w') as stream:
+            json.dump({'meta': self.meta(options), 'results': results}, stream, indent=2)
+        self.stdout.write(f'Results written to {output}')
+        if options['compare']:
+            self.compare(results, options['compare'], options['threshold'])
+
+    @staticmethod
+    def meta(options):
+        return {
+            'commit': git_commit(),
+            'created': timezone.now().isoformat(),
+            'copies': options['copies'],
+            'patrons': options['patrons'],
+            'seed': options['seed'],
+            'requests': options['requests'],
+            'database': connection.vendor,
+            'django': django.get_version(),
+        }
+
+    def seed(self, options):
+        """Imports a generated feed, then adds users, loans and holds; the same seed gives the same catalog."""
+        rng = random.Random(options['seed'])
+        authors = [(rng.choice(FORENAMES), f'{rng.choice(SURNAMES)}{number}')
+                   for number in range(max(1, options['copies'] // 40))]
+        statuses, weights = zip(*STATUS_WEIGHTS)
+        with tempfile.TemporaryDirectory() as directory:
+            feed = os.path.join(directory, 'catalog.jsonl')
+            with open(feed, 'w') as stream:
+                copies = number = 0
+                while copies < options['copies']:
+                    first, last = rng.choice(authors)
+                    count = min(rng.randint(1, 7), options['copies'] - copies)
+                    stream.write(json.dumps({
+                        'title': f'{rng.choice(GENRES)} Book {number}', 'summary': f'Summary of book {number}',
+                        'isbn': f'{number:013d}', 'author_first_name': first, 'author_last_name': last,
+                        'genres': rng.sample(GENRES, rng.randint(1, 3)),
+                        'languages': [rng.choice(LANGUAGES)], 'copies': count, 'imprint': f'Imprint {number}',
+                        'status': rng.choices(statuses, weights)[0],
+                    }) + '\n')
+                    copies += count
+                    number += 1
+            call_command('import_catalog', feed, stdout=StringIO())
+
+        call_command('groups', stdout=StringIO())
+        password = make_password(PASSWORD)
+        User.objects.bulk_create([User(username=f'patron{number}', password=password)
+                                  for number in range(options['patrons'])])
+        librarian = User.objects.create(username='librarian', password=password, is_staff=True)
+        librarian.groups.add(Group.objects.get(name='Librarian'))
+
+        # Copies on loan or reserved go to the patrons in turn, so every patron has some.
+        patrons = list(User.objects.filter(username__startswith='patron').order_by('pk').values_list('pk', flat=True))
+        due = datetime.date.today() + datetime.timedelta(weeks=3)
+        for status, due_back in (('o', due), ('r', None)):
+            ids = list(BookInstance.objects.filter(status=status).order_by('pk').values_list('pk', flat=True))
+            for offset, patron_id in enumerate(patrons):
+                BookInstance.objects.filter(pk__in=ids[offset::len(patrons)]).update(
+                    borrower_id=patron_id, due_back=due_back)
+
+        on_loan = list(Book.objects.filter(on_loan_count__gt=0).order_by('pk').values_list('pk', flat=True))
+        now = timezone.now()
+        Hold.objects.bulk_create([
+            Hold(book_id=book_id, patron_id=rng.choice(patrons), placed_at=now - datetime.timedelta(minutes=number))
+            for number, book_id in enumerate(rng.sample(on_loan, min(len(on_loan), len(patrons))))
+        ])
+
+    def sample(self, name, queryset, size=1):
+        """Rows from the middle of a table, so lookups are not served from its first pages; chosen once per run."""
+        if name not in self.samples:
+            middle = queryset.count() // 2
+            self.samples[name] = list(queryset.order_by('pk')[middle:middle + size])
+        return self.samples[name] if size > 1 else self.samples[name][0]
+
+    def cases(self):
+        """Per URL name: the method and a function of the requesting user returning the URL to request."""
+        self.samples = {}
+        book = lambda user: self.sample('book', Book.objects.all())
+        author = lambda user: self.sample('author', Author.objects.all())
+        copy = lambda status: lambda user: self.sample(status, BookInstance.objects.filter(status=status))
+        batch = lambda user: ','.join(str(chosen.pk) for chosen in self.sample('batch', Book.objects.all(), 20))
+
+        def held_book(user):
+            # Cancels the user's open hold on the book, so that every request places a new one.
+            chosen = book(user)
+            if user:
+                Hold.objects.filter(book=chosen, patron=user, status__in=('w', 'r')).update(status='c')
+            return chosen
+
+        def own_hold(user):
+            # Anonymous users are redirected before the lookup, so any id will do.
+            return circulation.place_hold(held_book(user), user) if user else Hold.objects.first()
+
+        return {
+            'index': ('get', lambda user: reverse('index')),
+            'books': ('get', lambda user: reverse('books')),
+            'search': ('get', lambda user: reverse('search') + '?q=fantasy'),
+            'book-detail': ('get', lambda user: book(user).get_absolute_url()),
+            'authors': ('get', lambda user: reverse('authors')),
+            'author-detail': ('get', lambda user: author(user).get_absolute_url()),
+            'my-borrowed': ('get', lambda user: reverse('my-borrowed')),
+            'all-borrowed': ('get', lambda user: reverse('all-borrowed')),
+            'my-holds': ('get', lambda user: reverse('my-holds')),
+            'place-hold': ('post', lambda user: reverse('place-hold', args=[held_book(user).pk])),
+            'cancel-hold': ('post', lambda user: reverse('cancel-hold', args=[own_hold(user).pk])),
+            'renew-book-librarian': ('get', lambda user: reverse('renew-book-librarian', args=[copy('o')(user).pk])),
+            'author_create': ('get', lambda user: reverse('author_create')),
+            'author_update': ('get', lambda user: reverse('author_update', args=[author(user).pk])),
+            'author_delete': ('get', lambda user: reverse('author_delete', args=[author(user).pk])),
+            'book_create': ('get', lambda user: reverse('book_create')),
+            'book_update': ('get', lambda user: reverse('book_update', args=[book(user).pk])),
+            'book_delete': ('get', lambda user: reverse('book_delete', args=[book(user).pk])),
+            'manage-book-librarian': ('get', lambda user: reverse('manage-book-librarian',
+                                                                  args=[copy('a')(user).pk])),
+            'export-books': ('get', lambda user: reverse('export-books')),
+            'export-authors': ('get', lambda user: reverse('export-authors')),
+            'export-circulation': ('get', lambda user: reverse('export-circulation')),
+            'api-books': ('get', lambda user: reverse('api-books') + '?id=' + batch(user)),
+            'api-book': ('get', lambda user: reverse('api-book', args=[book(user).pk])),
+            'author-autocomplete': ('get', lambda user: reverse('author-autocomplete') + '?q=smi'),
+            'genre-autocomplete': ('get', lambda user: reverse('genre-autocomplete') + '?q=fa'),
+            'user_id-autocomplete': ('get', lambda user: reverse('user_id-autocomplete') + '?q=patron1'),
+        }
+
+    @staticmethod
+    def check_cases(cases):
+        missing = {pattern.name for pattern in urls.urlpatterns} - set(cases)
+        if missing:
+            raise CommandError(f'No benchmark case for: {", ".join(sorted(missing))}')
+
+    def measure(self, name, case, user_name, options):
+        method, build_url = case
+        client = Client()
+        user = None
+        if user_name != 'anonymous':
+            user = User.objects.get(username='patron0' if user_name == 'patron' else 'librarian')
+            client.force_login(user)
+
+        timings, queries, statuses = [], 0, set()
+        for number in range(options['warmup'] + options['requests']):
+            url = build_url(user)
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = getattr(client, method)(url)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                elapsed = time.perf_counter() - start
+            if number >= options['warmup']:
+                timings.append(elapsed)
+                queries += len(captured)
+                statuses.add(response.status_code)
+
+        timings.sort()
+        result = {
+            'route': name, 'user': user_name, 'method': method.upper(), 'statuses': sorted(statuses),
+            'requests': len(timings),
+            'p50_ms': round(percentile(timings, 0.50) * 1000, 3),
+            'p95_ms': round(percentile(timings, 0.95) * 1000, 3),
+            'p99_ms': round(percentile(timings, 0.99) * 1000, 3),
+            'mean_ms': round(statistics.mean(timings) * 1000, 3),
+            'queries': round(queries / len(timings), 2),
+            'requests_per_second': round(len(timings) / sum(timings), 1),
+        }
+        self.stdout.write(f'{name:>22} {user_name:>9}: p50 {result["p50_ms"]:8.2f} ms  p95 {result["p95_ms"]:8.2f} ms  '
+                          f'p99 {result["p99_ms"]:8.2f} ms  {result["queries"]:6.1f} queries  '
+                          f'{result["requests_per_second"]:7.1f} req/s  {"/".join(map(str, result["statuses"]))}')
+        return result
+
+    def compare(self, results, path, threshold):
+        with open(path) as stream:
+            earlier = {(row['route'], row['user']): row for row in json.load(stream)['results']}
+        regressions = 0
+        for row in results:
+            before = earlier.get((row['route'], row['user']))
+            if before is None:
+                continue
+            ratio = row['p95_ms'] / before['p95_ms'] if before['p95_ms'] else 1
+            if ratio > threshold or row['queries'] > before['queries']:
+                regressions += 1
+                self.stdout.write(self.style.WARNING(
+                    f'{row["route"]} as {row["user"]}: p95 {before["p95_ms"]:.2f} -> {row["p95_ms"]:.2f} ms, '
+                    f'queries {before["queries"]} -> {row["queries"]}'))
+        if regressions:
+            raise CommandError(f'{regressions} regressions against {path}')
+        self.stdout.write('No regressions against ' + path)
@@ -0,0 +1,99 @@
+import datetime
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from catalog import circulation, sqlite
+from catalog.models import Author, Book, BookInstance, Hold
+
+
+DUE = datetime.date.today() + datetime.timedelta(weeks=3)
+
+
+class Command(BaseCommand):
+    # Runs against a throwaway SQLite file, never the configured database.
+    help = 'Times next-patron assignment and queue positions with many open holds'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--holds', type=int, default=100000)
+        parser.add_argument('--books', type=int, default=2000)
+        parser.add_argument('--hot-share', type=float, default=0.2,
+                            help='Share of the holds queued for one popular book')
+        parser.add_argument('--returns', type=int, default=200)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('The configured database is not SQLite')
+        with sqlite.scratch_database('holds'):
+            hot_book, patrons = self.seed(options)
+            self.stdout.write(f'{Hold.objects.filter(status="w").count()} open holds, '
+                              f'{Hold.objects.filter(book=hot_book, status="w").count()} for the popular book')
+            self.explain('next patron', circulation.waiting_holds(hot_book.pk)[:1])
+            self.explain('queue position', circulation.with_queue_positions(Hold.objects.filter(patron_id=patrons[0])))
+            self.time_returns(hot_book, options['returns'])
+            self.time_positions(hot_book, patrons)
+
+    def seed(self, options):
+        rng = random.Random(0)
+        author = Author.objects.create(first_name='Benchmark', last_name='Author')
+        Book.objects.bulk_create([Book(title=f'Book {number}', author=author, summary='', isbn=f'{number:013d}')
+                                  for number in range(options['books'])])
+        book_ids = list(Book.objects.values_list('pk', flat=True))
+        hot_count = int(options['holds'] * options['hot_share'])
+        patron_count = max(hot_count, options['holds'] // 20)
+        User.objects.bulk_create([User(username=f'patron{number}') for number in range(patron_count)])
+        patrons = list(User.objects.values_list('pk', flat=True))
+        BookInstance.objects.bulk_create([
+            BookInstance(book_id=pk, imprint='Copy', status='o', borrower_id=patrons[0], due_back=DUE)
+            for pk in book_ids
+        ])
+
+        hot_book, other_books = book_ids[0], book_ids[1:]
+        pairs = {(hot_book, patron) for patron in patrons[:hot_count]}
+        while len(pairs) < options['holds']:
+            pairs.add((rng.choice(other_books), rng.choice(patrons)))
+        start = timezone.now() - datetime.timedelta(days=30)
+        holds = [Hold(book_id=book_id, patron_id=patron_id, priority=rng.choice((1, 5, 5, 5)),
+                      placed_at=start + datetime.timedelta(seconds=number))
+                 for number, (book_id, patron_id) in enumerate(sorted(pairs, key=lambda pair: rng.random()))]
+        Hold.objects.bulk_create(holds)
+        return Book.objects.get(pk=hot_book), patrons
+
+    def explain(self, name, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = '; '.join(row[-1] for row in cursor.fetchall())
+        self.stdout.write(f'{name} plan: {plan}')
+
+    def time_returns(self, book, returns):
+        timings, queries = [], 0
+        for _ in range(returns):
+            copy = BookInstance.objects.get(book=book)
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                circulation.check_in(copy)
+                timings.append(time.perf_counter() - start)
+            queries += len(captured)
+            # The patron collects the copy, which starts the next loan.
+            circulation.checkout(copy, User(pk=copy.borrower_id), DUE)
+        self.stdout.write(f'return with assignment: {statistics.mean(timings) * 1000:.2f} ms mean, '
+                          f'{sorted(timings)[int(len(timings) * 0.95)] * 1000:.2f} ms p95, '
+                          f'{queries / returns:.1f} queries')
+
+    def time_positions(self, book, patrons):
+        # The patron at the back of the popular book's queue, and others spread over the rest.
+        last = circulation.waiting_holds(book.pk).reverse()[:1].get().patron_id
+        for name, patron_id in (('back of popular queue', last), ('typical patron', patrons[-1])):
+            holds = circulation.with_queue_positions(Hold.objects.filter(patron_id=patron_id, status='w'))
+            start = time.perf_counter()
+            positions = [hold.queue_position for hold in holds]
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f'my holds for {name}: {len(positions)} holds at positions {positions[:5]} '
+                              f'in {elapsed * 1000:.2f} ms')
@@ -0,0 +1,45 @@
+import time
+
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.management import BaseCommand
+from django.test import RequestFactory, override_settings
+
+from catalog import caching, views, visits
+from catalog.instrumentation import record_queries
+
+
+class Command(BaseCommand):
+    help = 'Measures home page throughput with the session and the buffered visit counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+
+    def run(self, requests):
+        handler = SessionMiddleware(AuthenticationMiddleware(views.index))
+        factory = RequestFactory()
+        cookies = {}
+
+        with record_queries() as recorder:
+            start = time.perf_counter()
+            for _ in range(requests):
+                request = factory.get('/catalog/')
+                request.COOKIES.update(cookies)
+                response = handler(request)
+                cookies.update((name, morsel.value) for name, morsel in response.cookies.items())
+            elapsed = time.perf_counter() - start
+            visits.buffered_counter.flush()
+
+        writes = sum(1 for sql, _ in recorder.queries if sql.lstrip().upper().startswith(('INSERT', 'UPDATE')))
+        return requests / elapsed, recorder.count / requests, writes / requests
+
+    def handle(self, *args, **options):
+        # Runs against the configured database and leaves its session and visit rows behind.
+        for mode in ('session', 'buffered'):
+            if mode == 'buffered' and not caching.shared():
+                self.stdout.write(f'{mode:>9}: skipped, needs a shared cache (DJANGO_CACHE_BACKEND)')
+                continue
+            with override_settings(CATALOG_VISIT_COUNTER=mode):
+                throughput, queries, writes = self.run(options['requests'])
+            self.stdout.write(f'{mode:>9}: {throughput:7.0f} requests/s   '
+                              f'{queries:.2f} queries/request   {writes:.3f} writes/request')
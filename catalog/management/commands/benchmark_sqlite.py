@@ -0,0 +1,95 @@
+import datetime
+import multiprocessing
+import random
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections, transaction
+
+from catalog import sqlite
+from catalog.models import Author, Book, BookInstance
+
+
+PROFILES = ('default', 'production')
+
+
+def _worker(profile, seconds, write_ratio, book_ids, seed, results):
+    # Each process opens its own connections, configured by the connection_created receiver.
+    settings.CATALOG_SQLITE_PROFILE = profile
+    connections.close_all()
+    rng = random.Random(seed)
+    reads = writes = locked = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        book_id = rng.choice(book_ids)
+        try:
+            if rng.random() < write_ratio:
+                with transaction.atomic():
+                    # Read, then write, as a checkout does.
+                    copy = BookInstance.objects.filter(book_id=book_id).order_by('status').first()
+                    if copy.status == 'a':
+                        copy.status, copy.due_back = 'o', datetime.date.today() + datetime.timedelta(weeks=3)
+                    else:
+                        copy.status, copy.due_back = 'a', None
+                    copy.save()
+                writes += 1
+            else:
+                Book.objects.select_related('author').get(pk=book_id)
+                list(BookInstance.objects.filter(book_id=book_id).values_list('status', flat=True))
+                reads += 1
+        except OperationalError as exc:
+            if 'locked' not in str(exc):
+                raise
+            locked += 1
+    connections.close_all()
+    results.put((reads, writes, locked))
+
+
+class Command(BaseCommand):
+    # Runs against throwaway SQLite files, never the configured database.
+    help = 'Compares concurrent reads and checkouts on SQLite with the default and production profiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=8)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--write-ratio', type=float, default=0.2, help='Share of operations that are checkouts')
+        parser.add_argument('--books', type=int, default=500)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('The configured database is not SQLite')
+        for profile in PROFILES:
+            with sqlite.scratch_database(profile):
+                book_ids = self.seed(options['books'])
+                connections.close_all()
+                reads, writes, locked = self.run(profile, book_ids, options)
+            self.stdout.write(f'{profile:>10}: {reads / options["seconds"]:8.0f} reads/s  '
+                              f'{writes / options["seconds"]:7.0f} writes/s  '
+                              f'{locked:6d} "database is locked" errors')
+
+    @staticmethod
+    def seed(books):
+        author = Author.objects.create(first_name='Benchmark', last_name='Author')
+        Book.objects.bulk_create(
+            [Book(title=f'Book {number}', author=author, summary='', isbn=f'{number:013d}') for number in range(books)])
+        book_ids = list(Book.objects.values_list('pk', flat=True))
+        BookInstance.objects.bulk_create(
+            [BookInstance(book_id=pk, imprint=f'Copy {copy}', status='a') for pk in book_ids for copy in range(3)])
+        return book_ids
+
+    @staticmethod
+    def run(profile, book_ids, options):
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        processes = [
+            context.Process(target=_worker, args=(profile, options['seconds'], options['write_ratio'],
+                                                  book_ids, number, results))
+            for number in range(options['processes'])
+        ]
+        for process in processes:
+            process.start()
+        totals = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        return [sum(column) for column in zip(*totals)]
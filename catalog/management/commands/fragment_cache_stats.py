@@ -0,0 +1,17 @@
+from django.core.management import BaseCommand
+
+from catalog import fragment_cache
+
+
+class Command(BaseCommand):
+    help = 'Reports the hit ratio of each cached template fragment'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Zero the counters after reporting')
+
+    def handle(self, *args, **options):
+        for name, (hits, misses, ratio) in fragment_cache.hit_ratios().items():
+            ratio = '-' if ratio is None else f'{ratio:.1%}'
+            self.stdout.write(f'{name:<15} {hits:>8} hits {misses:>8} misses {ratio:>7}')
+        if options['reset']:
+            fragment_cache.reset_stats()
@@ -0,0 +1,231 @@
+import contextlib
+import csv
+import json
+import os
+import time
+import uuid
+from itertools import islice
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from catalog import fragment_cache, prefix_index, search, sqlite
+from catalog.models import Author, Book, BookInstance, CatalogStats, Genre, ImportCheckpoint, Language
+
+
+STATUSES = {code for code, _ in BookInstance.LOAN_STATUS}
+
+
+def read_records(path, fmt):
+    """Yields one dict per record without reading the whole file into memory."""
+    with open(path, newline='', encoding='utf-8') as stream:
+        if fmt == 'csv':
+            yield from csv.DictReader(stream)
+        else:
+            for line in stream:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def insert_rows(model, columns, rows, batch_size=500):
+    """Inserts tuples of column values into the model's table with plain executemany."""
+    if not rows:
+        return
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(model._meta.db_table), ', '.join(quote(column) for column in columns), ', '.join(['%s'] * len(columns)))
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            cursor.executemany(sql, rows[start:start + batch_size])
+
+
+def split_names(value):
+    if isinstance(value, list):
+        return [name.strip() for name in value if name and name.strip()]
+    return [name.strip() for name in (value or '').split(';') if name.strip()]
+
+
+class Command(BaseCommand):
+    # Each record has the fields title, summary, isbn, author_first_name,
+    # author_last_name, genres and languages (";"-separated in CSV, lists in
+    # JSONL), copies (number of BookInstances to create), imprint and status.
+    help = 'Streams books, authors and copies from a CSV or JSON Lines feed into the catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--resume', action='store_true',
+                            help='Skip the records committed by a previous run, as recorded in its checkpoint')
+        parser.add_argument('--checkpoint', help='Name the checkpoint is stored under; defaults to the absolute PATH')
+        parser.add_argument('--no-search-index', action='store_true',
+                            help='Leave the search index to a later rebuild_search_index')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+        checkpoint = options['checkpoint'] or os.path.abspath(path)
+        batch_size = options['batch_size']
+        self.index_search = not options['no_search_index']
+
+        if not os.path.exists(path):
+            raise CommandError(f'{path} does not exist')
+
+        done = self.read_checkpoint(checkpoint) if options['resume'] else 0
+        records = islice(read_records(path, fmt), done, None)
+
+        self.load_lookups()
+        start = time.perf_counter()
+        imported = 0
+
+        while True:
+            batch = list(islice(records, batch_size))
+            if not batch:
+                break
+            # The checkpoint commits with the batch, so a resumed run never imports a record twice.
+            with self.write_lock(), transaction.atomic():
+                self.import_batch(batch, first_row=done + imported + 1)
+                self.write_checkpoint(checkpoint, done + imported + len(batch))
+            imported += len(batch)
+
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f'{done + imported} records imported ({imported / elapsed:.0f} rows/s)')
+
+        CatalogStats.rebuild()
+        prefix_index.authors.invalidate()
+        prefix_index.genres.invalidate()
+
+        elapsed = time.perf_counter() - start
+        rate = imported / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} records in {elapsed:.1f}s ({rate:.0f} rows/s)'))
+
+    @staticmethod
+    def write_lock():
+        """Holds SQLite's write lock for a whole batch, so no other writer takes the ids ``insert`` numbers from ``Max('pk')``."""
+        if connection.features.can_return_rows_from_bulk_insert or connection.vendor != 'sqlite':
+            return contextlib.nullcontext()
+        return sqlite.immediate(connection)
+
+    @staticmethod
+    def read_checkpoint(checkpoint):
+        return ImportCheckpoint.objects.filter(feed=checkpoint).values_list('rows', flat=True).first() or 0
+
+    @staticmethod
+    def write_checkpoint(checkpoint, rows):
+        ImportCheckpoint.objects.update_or_create(feed=checkpoint, defaults={'rows': rows})
+
+    def load_lookups(self):
+        self.authors = {(first.casefold(), last.casefold()): pk
+                        for pk, first, last in Author.objects.values_list('pk', 'first_name', 'last_name').iterator()}
+        self.genres = {name.casefold(): pk for pk, name in Genre.objects.values_list('pk', 'name')}
+        self.languages = {name.casefold(): pk for pk, name in Language.objects.values_list('pk', 'name')}
+
+    def insert(self, model, objects):
+        """bulk_create that leaves primary keys set on every object, whatever the backend."""
+        if not objects:
+            return objects
+        if not connection.features.can_return_rows_from_bulk_insert:
+            # Safe because each batch holds the write lock from BEGIN on (see write_lock).
+            next_id = (model.objects.aggregate(max_id=Max('pk'))['max_id'] or 0) + 1
+            for offset, obj in enumerate(objects):
+                obj.pk = next_id + offset
+        return model.objects.bulk_create(objects)
+
+    def insert_books(self, rows):
+        """Inserts ``(title, summary, isbn, author_id, *copy counters)`` rows and returns their new ids in order."""
+        if connection.features.can_return_rows_from_bulk_insert:
+            books = Book.objects.bulk_create(
+                Book(title=title, summary=summary, isbn=isbn, author_id=author_id,
+                     **dict(zip(Book.COPY_COUNTERS, counters)))
+                for title, summary, isbn, author_id, *counters in rows
+            )
+            return [book.pk for book in books]
+
+        next_id = (Book.objects.aggregate(max_id=Max('pk'))['max_id'] or 0) + 1
+        ids = list(range(next_id, next_id + len(rows)))
+        now = self.now()
+        insert_rows(Book, ['id', 'title', 'summary', 'isbn', 'author_id', *Book.COPY_COUNTERS, 'updated_at'],
+                    [(book_id,) + row + (now,) for book_id, row in zip(ids, rows)])
+        return ids
+
+    @staticmethod
+    def now():
+        """The current time as the database adapter expects it in a raw insert."""
+        return BookInstance._meta.get_field('updated_at').get_db_prep_value(timezone.now(), connection)
+
+    def resolve(self, lookup, model, keys, build):
+        """Returns pks for ``keys``, bulk creating the ones not seen yet."""
+        missing = {key: build(key) for key in keys if key not in lookup}
+        for key, obj in zip(missing, self.insert(model, list(missing.values()))):
+            lookup[key] = obj.pk
+        return [lookup[key] for key in keys]
+
+    def import_batch(self, batch, first_row):
+        authors, genres, languages = set(), set(), set()
+        cleaned = []
+        for row_number, record in enumerate(batch, start=first_row):
+            title = (record.get('title') or '').strip()
+            if not title:
+                raise CommandError(f'Record {row_number}: missing title')
+            status = (record.get('status') or 'a').strip()
+            if status not in STATUSES:
+                raise CommandError(f'Record {row_number}: unknown status {status!r}')
+
+            first = (record.get('author_first_name') or '').strip()
+            last = (record.get('author_last_name') or '').strip()
+            author = (first, last) if last else None
+            genre_names = split_names(record.get('genres'))
+            language_names = split_names(record.get('languages'))
+
+            if author:
+                authors.add(author)
+            genres.update(genre_names)
+            languages.update(language_names)
+            num_copies = int(record.get('copies') or 0)
+            cleaned.append((record, title, status, author, genre_names, language_names, num_copies))
+
+        author_keys = {(first.casefold(), last.casefold()): (first, last) for first, last in authors}
+        self.resolve(self.authors, Author, list(author_keys),
+                     lambda key: Author(first_name=author_keys[key][0], last_name=author_keys[key][1]))
+        genre_keys = {name.casefold(): name for name in genres}
+        self.resolve(self.genres, Genre, list(genre_keys), lambda key: Genre(name=genre_keys[key]))
+        language_keys = {name.casefold(): name for name in languages}
+        self.resolve(self.languages, Language, list(language_keys), lambda key: Language(name=language_keys[key]))
+
+        # The copies are inserted raw, so the books start with their copy counters filled in.
+        book_rows = [
+            (title, record.get('summary') or '', (record.get('isbn') or '').strip(),
+             self.authors[(author[0].casefold(), author[1].casefold())] if author else None,
+             num_copies, num_copies if status == 'a' else 0, num_copies if status == 'o' else 0)
+            for record, title, status, author, genre_names, language_names, num_copies in cleaned
+        ]
+        book_ids = self.insert_books(book_rows)
+
+        # Copies and many-to-many rows go in as plain tuples; building model
+        # instances for them costs more than the inserts themselves.
+        uuid_field = BookInstance._meta.pk
+        now = self.now()
+        book_genres, copies, copy_languages = [], [], []
+        for book_id, (record, title, status, author, genre_names, language_names, num_copies) in zip(book_ids, cleaned):
+            book_genres.extend((book_id, genre_id) for genre_id in {self.genres[name.casefold()] for name in genre_names})
+            language_ids = {self.languages[name.casefold()] for name in language_names}
+            for _ in range(num_copies):
+                copy_id = uuid_field.get_db_prep_value(uuid.uuid4(), connection)
+                copies.append((copy_id, record.get('imprint') or '', book_id, status, now))
+                copy_languages.extend((copy_id, language_id) for language_id in language_ids)
+
+        insert_rows(Book.genre.through, ['book_id', 'genre_id'], book_genres)
+        insert_rows(BookInstance, ['id', 'imprint', 'book_id', 'status', 'updated_at'], copies)
+        insert_rows(BookInstance.language.through, ['bookinstance_id', 'language_id'], copy_languages)
+
+        if self.index_search:
+            search.index_books(book_ids)
+        # Raw inserts send no signals: existing authors may have gained books.
+        author_ids = {book_row[3] for book_row in book_rows} - {None}
+        fragment_cache.bump('catalog.book')
+        fragment_cache.bump('catalog.author', author_ids)
+        Author.objects.filter(pk__in=author_ids).update(updated_at=timezone.now())
@@ -0,0 +1,76 @@
+import pstats
+from collections import Counter
+
+from django.core.management import BaseCommand, CommandError
+
+from catalog import profiling
+
+
+class Command(BaseCommand):
+    # Times are averaged over the profiles of each URL name. Sampled profiles
+    # report the share of samples a function was running in ("own") or on
+    # the stack ("total").
+    help = 'Reports the top functions by time in the stored request profiles, per URL name'
+
+    def add_arguments(self, parser):
+        parser.add_argument('url_name', nargs='?', help='Only this URL name')
+        parser.add_argument('--top', type=int, default=15)
+        parser.add_argument('--sort', choices=('cumulative', 'own'), default='cumulative')
+        parser.add_argument('--folded', metavar='PATH',
+                            help='Also write the merged sampled stacks to PATH, for flamegraph.pl or speedscope')
+
+    def handle(self, *args, **options):
+        stored = profiling.stored_profiles(options['url_name'])
+        if not stored:
+            raise CommandError(f'No profiles stored in {profiling.profile_dir()}')
+        merged = Counter()
+        for url_name, paths in stored.items():
+            pstats_paths = [path for path in paths if path.endswith('.pstats')]
+            folded_paths = [path for path in paths if path.endswith('.folded')]
+            if pstats_paths:
+                self.report_pstats(url_name, pstats_paths, options)
+            if folded_paths:
+                stacks = self.read_folded(folded_paths)
+                merged.update({f'{url_name};{stack}': count for stack, count in stacks.items()})
+                self.report_folded(url_name, len(folded_paths), stacks, options)
+        if options['folded']:
+            with open(options['folded'], 'w') as stream:
+                for stack, count in merged.most_common():
+                    stream.write(f'{stack} {count}\n')
+            self.stdout.write(f'Merged stacks written to {options["folded"]}')
+
+    def report_pstats(self, url_name, paths, options):
+        stats = pstats.Stats(*paths)
+        per_profile = 1000 / len(paths)
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][3 if options['sort'] == 'cumulative' else 2],
+                      reverse=True)
+        self.stdout.write(self.style.MIGRATE_HEADING(f'{url_name}: {len(paths)} cProfile profiles, '
+                                                     f'{stats.total_tt * per_profile:.1f} ms per request'))
+        for (filename, line, function), (_, calls, own, cumulative, _) in rows[:options['top']]:
+            self.stdout.write(f'{cumulative * per_profile:9.2f} ms total {own * per_profile:9.2f} ms own '
+                              f'{calls / len(paths):9.1f} calls  {function} ({filename}:{line})')
+
+    @staticmethod
+    def read_folded(paths):
+        stacks = Counter()
+        for path in paths:
+            with open(path) as stream:
+                for line in stream:
+                    stack, _, count = line.rstrip('\n').rpartition(' ')
+                    if stack:
+                        stacks[stack] += int(count)
+        return stacks
+
+    def report_folded(self, url_name, profiles, stacks, options):
+        samples = sum(stacks.values())
+        own, total = Counter(), Counter()
+        for stack, count in stacks.items():
+            frames = stack.split(';')
+            own[frames[-1]] += count
+            # A recursive function counts once per sample.
+            for frame in set(frames):
+                total[frame] += count
+        ranked = (own if options['sort'] == 'own' else total).most_common(options['top'])
+        self.stdout.write(self.style.MIGRATE_HEADING(f'{url_name}: {profiles} sampled profiles, {samples} samples'))
+        for frame, _ in ranked:
+            self.stdout.write(f'{total[frame] / samples:8.1%} total {own[frame] / samples:8.1%} own  {frame}')
@@ -0,0 +1,114 @@
+import csv
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.core.management import BaseCommand, CommandError, call_command
+from django.db import transaction
+
+from catalog import permissions, prefix_index
+
+
+PROFILE_FIELDS = ('email', 'first_name', 'last_name')
+
+
+def read_users(path):
+    """Yields one dict per CSV row without reading the whole file into memory."""
+    with open(path, newline='', encoding='utf-8') as stream:
+        yield from csv.DictReader(stream)
+
+
+def hash_password(password):
+    # make_password(None) gives an unusable password: the user must reset it before logging in.
+    return make_password(password or None)
+
+
+class Command(BaseCommand):
+    # The CSV has a header row with the columns username, password, email,
+    # first_name and last_name; only username is required. Usernames that
+    # already exist are skipped. Hashing runs in a pool of worker processes,
+    # one batch at a time, while this process does the inserts.
+    help = 'Creates users from a CSV file in bulk and adds them to a group'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--group', default='Patron',
+                            help='Group the new users join, created if missing; Librarian gets its permissions')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--processes', type=int, default=os.cpu_count(),
+                            help='Password hashing processes; 1 hashes in this process')
+
+    def handle(self, *args, **options):
+        if not os.path.exists(options['path']):
+            raise CommandError(f'{options["path"]} does not exist')
+        if options['group'] == 'Librarian':
+            call_command('groups', stdout=self.stdout)
+        group, _ = Group.objects.get_or_create(name=options['group'])
+
+        records = read_users(options['path'])
+        created = skipped = 0
+        start = time.perf_counter()
+        pool = None
+        if options['processes'] > 1:
+            # Forked workers only hash; they never touch the database connection they inherit.
+            pool = ProcessPoolExecutor(options['processes'], mp_context=multiprocessing.get_context('fork'))
+        try:
+            row_number = 1
+            while True:
+                batch = list(islice(records, options['batch_size']))
+                if not batch:
+                    break
+                new, skipped_here = self.provision(batch, row_number + 1, group, pool, options['processes'])
+                created += new
+                skipped += skipped_here
+                row_number += len(batch)
+                elapsed = time.perf_counter() - start
+                self.stdout.write(f'{created} users created, {skipped} skipped ({created / elapsed:.0f} users/s)')
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        prefix_index.usernames.invalidate()
+        elapsed = time.perf_counter() - start
+        rate = created / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {created} users in {group.name} in {elapsed:.1f}s ({rate:.0f} users/s, '
+            f'{options["processes"]} processes); skipped {skipped} existing or repeated usernames'))
+
+    def provision(self, batch, first_row, group, pool, processes):
+        """Creates the batch's new users and their memberships; returns the numbers created and skipped."""
+        rows = {}
+        for row_number, record in enumerate(batch, start=first_row):
+            username = (record.get('username') or '').strip()
+            if not username:
+                raise CommandError(f'Row {row_number}: missing username')
+            if len(username) > User._meta.get_field('username').max_length:
+                raise CommandError(f'Row {row_number}: username {username!r} is too long')
+            rows.setdefault(username, record)
+        existing = set(User.objects.filter(username__in=rows).values_list('username', flat=True))
+        new = [(username, record) for username, record in rows.items() if username not in existing]
+
+        passwords = [record.get('password') or '' for _, record in new]
+        if pool is None:
+            hashes = [hash_password(password) for password in passwords]
+        else:
+            hashes = list(pool.map(hash_password, passwords, chunksize=max(1, len(passwords) // (processes * 4))))
+
+        with transaction.atomic():
+            User.objects.bulk_create([
+                User(username=username, password=password_hash,
+                     **{field: (record.get(field) or '').strip() for field in PROFILE_FIELDS})
+                for (username, record), password_hash in zip(new, hashes)
+            ])
+            # Primary keys are read back, as not every backend returns them from a bulk insert.
+            pks = list(User.objects.filter(username__in=[username for username, _ in new])
+                       .values_list('pk', flat=True))
+            User.groups.through.objects.bulk_create(
+                [User.groups.through(user_id=pk, group_id=group.pk) for pk in pks])
+        # Bulk inserts send no signals; a deleted user's id may have been reused.
+        permissions.invalidate_users(pks)
+        return len(new), len(batch) - len(new)
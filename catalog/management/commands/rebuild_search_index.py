@@ -0,0 +1,14 @@
+from django.core.management import BaseCommand
+
+from catalog import search
+
+
+class Command(BaseCommand):
+    help = 'Recreates the full-text search index over books, authors and genres'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=search.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        total = search.rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {total} books'))
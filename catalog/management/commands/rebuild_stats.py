@@ -0,0 +1,11 @@
+from django.core.management import BaseCommand
+
+from catalog.models import CatalogStats
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the home page catalog statistics from scratch'
+
+    def handle(self, *args, **options):
+        stats = CatalogStats.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {stats}'))
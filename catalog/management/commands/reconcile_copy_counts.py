@@ -0,0 +1,33 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from catalog.models import Book
+
+
+class Command(BaseCommand):
+    help = "Checks every book's copy counters against its copies and repairs the ones that drifted"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Books checked per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without repairing it')
+
+    def handle(self, *args, **options):
+        checked = 0
+        drifted = []
+        last_pk = 0
+        while True:
+            # Walk the books by primary key, so each batch is an index range and no offset is scanned.
+            pks = list(Book.objects.filter(pk__gt=last_pk).order_by('pk')
+                       .values_list('pk', flat=True)[:options['batch_size']])
+            if not pks:
+                break
+            with transaction.atomic():
+                drifted += Book.recount_copies(pks, repair=not options['dry_run'])
+            checked += len(pks)
+            last_pk = pks[-1]
+
+        for book in drifted[:20]:
+            self.stdout.write(f'  book {book.pk}: ' + ', '.join(
+                f'{name} {getattr(book, name)}' for name in Book.COPY_COUNTERS))
+        verb = 'would repair' if options['dry_run'] else 'repaired'
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} books, {verb} {len(drifted)}'))
@@ -0,0 +1,36 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.db import connections
+
+
+def _is_sqlite(database):
+    return database['ENGINE'] == 'django.db.backends.sqlite3'
+
+
+class Command(BaseCommand):
+    # Real replicas are fed by the database server's own replication; this
+    # stands in for it when the primary and replicas are local SQLite files.
+    help = 'Copies the primary SQLite database onto every SQLite replica in CATALOG_REPLICAS'
+
+    def handle(self, *args, **options):
+        primary = settings.DATABASES['default']
+        if not _is_sqlite(primary):
+            raise CommandError('The primary database is not SQLite; use its own replication')
+        if not settings.CATALOG_REPLICAS:
+            raise CommandError('No replicas configured; set CATALOG_REPLICA_URLS')
+
+        for alias in settings.CATALOG_REPLICAS:
+            replica = settings.DATABASES[alias]
+            if not _is_sqlite(replica):
+                self.stdout.write(f'{alias}: not SQLite, skipped')
+                continue
+            connections[alias].close()
+            source, target = sqlite3.connect(primary['NAME']), sqlite3.connect(replica['NAME'])
+            try:
+                source.backup(target)
+            finally:
+                source.close()
+                target.close()
+            self.stdout.write(self.style.SUCCESS(f'{alias}: copied {primary["NAME"]} to {replica["NAME"]}'))
@@ -0,0 +1,107 @@
+import datetime
+import time
+from itertools import groupby, islice
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.core.management import BaseCommand
+from django.db import IntegrityError, transaction
+
+from catalog.models import BookInstance, OverdueNotice
+
+
+SUBJECT = 'Overdue library books'
+
+
+def overdue_loans(today):
+    """Overdue loans of borrowers not yet reminded today, ordered by borrower, filtered in the database."""
+    notified = OverdueNotice.objects.filter(sent_on=today).values('borrower_id')
+    return BookInstance.objects\
+        .filter(status__exact='o', due_back__lt=today, borrower__isnull=False)\
+        .exclude(borrower_id__in=notified)\
+        .order_by('borrower_id', 'due_back')\
+        .values_list('borrower_id', 'borrower__username', 'borrower__email', 'book__title', 'due_back')
+
+
+def compose(username, loans, today):
+    lines = [f'Dear {username},', '', 'The following books are overdue:', '']
+    lines += [f'  - {title} (due {due_back:%Y-%m-%d}, {(today - due_back).days} days ago)' for title, due_back in loans]
+    lines += ['', 'Please return or renew them at your earliest convenience.']
+    return '\n'.join(lines)
+
+
+class Command(BaseCommand):
+    help = 'Emails every borrower with overdue loans once a day, over a single SMTP connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='Borrowers recorded, then mailed in one send')
+        parser.add_argument('--dry-run', action='store_true', help='Report who would be mailed without sending')
+
+    def notices(self, today):
+        """Yields ``(borrower_id, message tuple, number of loans)`` per borrower with an email address."""
+        rows = overdue_loans(today).iterator(chunk_size=2000)
+        for (borrower_id, username, email), loans in groupby(rows, key=lambda row: row[:3]):
+            loans = [(title, due_back) for *_, title, due_back in loans]
+            if email:
+                message = (SUBJECT, compose(username, loans, today), settings.DEFAULT_FROM_EMAIL, [email])
+                yield borrower_id, message, len(loans)
+
+    @staticmethod
+    def claim(batch, today):
+        """Records today's notices for a batch; returns ``(borrower_id, message)`` for the rows this run created.
+
+        Recording first means a crash after sending cannot lead to a second mail today. The
+        batch commits in one transaction before any mail is sent, so no write lock is held
+        while talking to SMTP, and borrowers already recorded by a concurrent run are left to it.
+        """
+        while True:
+            try:
+                with transaction.atomic():
+                    recorded = set(OverdueNotice.objects
+                                   .filter(sent_on=today, borrower_id__in=[notice[0] for notice in batch])
+                                   .values_list('borrower_id', flat=True))
+                    claimed = [notice for notice in batch if notice[0] not in recorded]
+                    OverdueNotice.objects.bulk_create(
+                        OverdueNotice(borrower_id=borrower_id, sent_on=today, num_loans=num_loans)
+                        for borrower_id, _, num_loans in claimed)
+            except IntegrityError:
+                continue  # A concurrent run recorded some of them since; read again which.
+            return [(borrower_id, message) for borrower_id, message, _ in claimed]
+
+    def handle(self, *args, **options):
+        today = datetime.date.today()
+        start = time.perf_counter()
+        # Materialise the work list first: sending while a server-side cursor is open would hold it for minutes.
+        notices = list(self.notices(today))
+
+        if options['dry_run']:
+            self.stdout.write(f'{len(notices)} borrowers would be notified')
+            return
+
+        sent = 0
+        connection = get_connection()
+        connection.open()
+        try:
+            batches = iter(notices)
+            while True:
+                batch = list(islice(batches, options['batch_size']))
+                if not batch:
+                    break
+                claimed = self.claim(batch, today)
+                if not claimed:
+                    continue
+                try:
+                    sent += connection.send_messages(
+                        [EmailMessage(*message, connection=connection) for _, message in claimed])
+                except Exception:
+                    # Which of the batch went out is unknown, so the whole batch is sent again on the next run.
+                    OverdueNotice.objects.filter(
+                        borrower_id__in=[borrower_id for borrower_id, _ in claimed], sent_on=today).delete()
+                    raise
+        finally:
+            connection.close()
+
+        elapsed = time.perf_counter() - start
+        rate = sent / elapsed * 60 if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Sent {sent} overdue notices in {elapsed:.1f}s ({rate:.0f} borrowers/min)'))
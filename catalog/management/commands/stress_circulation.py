@@ -0,0 +1,128 @@
+import datetime
+import multiprocessing
+import random
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+
+from catalog import circulation, sqlite
+from catalog.models import Author, Book, BookInstance, CatalogStats
+
+
+DUE = datetime.date.today() + datetime.timedelta(weeks=3)
+
+
+def _service(copy, borrower_id):
+    """Checks a copy out, in or renews it; returns the change in loans, or None on a conflict."""
+    try:
+        if copy.status == 'o':
+            if random.random() < 0.7:
+                circulation.check_in(copy)
+            else:
+                circulation.renew(copy, DUE)
+            return -1 if copy.status != 'o' else 0
+        circulation.checkout(copy, User(pk=borrower_id), DUE)
+        return 1
+    except circulation.CirculationConflict:
+        return None
+
+
+def _save(copy, borrower_id):
+    """The same operations as a load-mutate-save, as the views did before the service."""
+    if copy.status == 'o':
+        copy.status, copy.borrower_id, copy.due_back = 'a', None, None
+        copy.save()
+        return -1
+    copy.status, copy.borrower_id, copy.due_back = 'o', borrower_id, DUE
+    copy.save()
+    return 1
+
+
+def _worker(mode, seconds, copy_ids, borrower_ids, seed, results):
+    settings.CATALOG_SQLITE_PROFILE = 'production'
+    connections.close_all()
+    random.seed(seed)
+    operate = _service if mode == 'service' else _save
+    ledger, operations, conflicts = Counter(), 0, 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        pk = random.choice(copy_ids)
+        try:
+            change = operate(BookInstance.objects.get(pk=pk), random.choice(borrower_ids))
+        except OperationalError as exc:
+            if 'locked' not in str(exc):
+                raise
+            continue
+        operations += 1
+        if change is None:
+            conflicts += 1
+        else:
+            ledger[pk] += change
+    connections.close_all()
+    results.put((ledger, operations, conflicts))
+
+
+class Command(BaseCommand):
+    # Every worker keeps a ledger of the loans it started and ended. Without
+    # lost updates, each copy's net count of loans matches its final status.
+    help = 'Races circulation operations on a few copies from several processes and checks for lost updates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=8)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--copies', type=int, default=20, help='Fewer copies means more contention')
+        parser.add_argument('--mode', choices=('service', 'save'), default='service')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('The configured database is not SQLite')
+        with sqlite.scratch_database('circulation'):
+            copy_ids, borrower_ids = self.seed(options['copies'])
+            connections.close_all()
+            ledger, operations, conflicts = self.run(copy_ids, borrower_ids, options)
+            self.report(ledger, operations, conflicts, options['seconds'])
+
+    @staticmethod
+    def seed(copies):
+        author = Author.objects.create(first_name='Stress', last_name='Author')
+        book = Book.objects.create(title='Stress Test', author=author, summary='', isbn='0000000000000')
+        for number in range(copies):
+            BookInstance.objects.create(book=book, imprint=f'Copy {number}', status='a')
+        User.objects.bulk_create([User(username=f'patron{number}') for number in range(50)])
+        CatalogStats.rebuild()
+        return (list(BookInstance.objects.values_list('pk', flat=True)),
+                list(User.objects.values_list('pk', flat=True)))
+
+    @staticmethod
+    def run(copy_ids, borrower_ids, options):
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        processes = [
+            context.Process(target=_worker, args=(options['mode'], options['seconds'], copy_ids, borrower_ids,
+                                                  number, results))
+            for number in range(options['processes'])
+        ]
+        for process in processes:
+            process.start()
+        totals = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        ledger = Counter()
+        for result in totals:
+            # update() keeps the negative counts that Counter addition would drop.
+            ledger.update(result[0])
+        return ledger, sum(result[1] for result in totals), sum(result[2] for result in totals)
+
+    def report(self, ledger, operations, conflicts, seconds):
+        statuses = dict(BookInstance.objects.values_list('pk', 'status'))
+        lost = sum(ledger[pk] != (statuses[pk] == 'o') for pk in statuses)
+        stats = CatalogStats.current().num_instances_available
+        self.stdout.write(f'{operations / seconds:.0f} operations/s, {conflicts} conflicts reported')
+        self.stdout.write(f'{lost} copies with lost updates; available counter '
+                          f'{stats} (actual {CatalogStats.compute()["num_instances_available"]})')
+        if lost:
+            raise CommandError('Lost updates detected')
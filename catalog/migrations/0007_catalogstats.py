@@ -0,0 +1,28 @@
+# Generated by Django 3.0 on 2026-10-18 11:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0006_auto_20191206_1817'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('num_books', models.PositiveIntegerField(default=0)),
+                ('num_instances', models.PositiveIntegerField(default=0)),
+                ('num_instances_available', models.PositiveIntegerField(default=0)),
+                ('num_authors', models.PositiveIntegerField(default=0)),
+                ('num_languages', models.PositiveIntegerField(default=0)),
+                ('num_novels', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'catalog stats',
+            },
+        ),
+    ]
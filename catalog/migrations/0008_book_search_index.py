@@ -0,0 +1,71 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE catalog_book_fts USING fts5("
+            "title, summary, isbn, authors, genres, tokenize='unicode61', prefix='2 3')"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE TABLE catalog_book_search ('
+            'book_id integer PRIMARY KEY REFERENCES catalog_book (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+            'document tsvector NOT NULL)'
+        )
+        schema_editor.execute('CREATE INDEX catalog_book_search_document ON catalog_book_search USING GIN (document)')
+
+
+INDEX_BOOKS_SQLITE = """
+INSERT INTO catalog_book_fts (rowid, title, summary, isbn, authors, genres)
+SELECT book.id, book.title, book.summary, book.isbn,
+       COALESCE(TRIM(author.first_name || ' ' || author.last_name), ''),
+       COALESCE((SELECT GROUP_CONCAT(genre.name, ' ')
+                 FROM catalog_book_genre book_genre JOIN catalog_genre genre ON genre.id = book_genre.genre_id
+                 WHERE book_genre.book_id = book.id), '')
+FROM catalog_book book LEFT JOIN catalog_author author ON author.id = book.author_id
+"""
+
+INDEX_BOOKS_POSTGRES = """
+INSERT INTO catalog_book_search (book_id, document)
+SELECT book.id,
+       setweight(to_tsvector('simple', book.title), 'A') ||
+       setweight(to_tsvector('simple', book.summary), 'D') ||
+       setweight(to_tsvector('simple', book.isbn), 'B') ||
+       setweight(to_tsvector('simple', CONCAT_WS(' ', NULLIF(author.first_name, ''), author.last_name)), 'B') ||
+       setweight(to_tsvector('simple', COALESCE((
+           SELECT STRING_AGG(genre.name, ' ')
+           FROM catalog_book_genre book_genre JOIN catalog_genre genre ON genre.id = book_genre.genre_id
+           WHERE book_genre.book_id = book.id), '')), 'C')
+FROM catalog_book book LEFT JOIN catalog_author author ON author.id = book.author_id
+"""
+
+
+def index_existing_books(apps, schema_editor):
+    # The same documents as catalog.search.documents(), built in one statement.
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(INDEX_BOOKS_SQLITE)
+    elif vendor == 'postgresql':
+        schema_editor.execute(INDEX_BOOKS_POSTGRES)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS catalog_book_fts')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP TABLE IF EXISTS catalog_book_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0007_catalogstats'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(index_existing_books, migrations.RunPython.noop),
+    ]
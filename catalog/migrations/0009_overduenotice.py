@@ -0,0 +1,38 @@
+# Generated by Django 3.0 on 2026-10-18 11:41
+
+import datetime
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('catalog', '0008_book_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OverdueNotice',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sent_on', models.DateField(default=datetime.date.today)),
+                ('num_loans', models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='bookinstance',
+            index=models.Index(fields=['status', 'due_back'], name='catalog_copy_status_due_idx'),
+        ),
+        migrations.AddField(
+            model_name='overduenotice',
+            name='borrower',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterUniqueTogether(
+            name='overduenotice',
+            unique_together={('borrower', 'sent_on')},
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.0 on 2026-10-18 12:13
+
+from django.db import migrations, models
+
+
+COUNT_COPIES = '''
+UPDATE catalog_book SET
+    total_copies = (SELECT COUNT(*) FROM catalog_bookinstance WHERE book_id = catalog_book.id),
+    available_count = (SELECT COUNT(*) FROM catalog_bookinstance WHERE book_id = catalog_book.id AND status = 'a'),
+    on_loan_count = (SELECT COUNT(*) FROM catalog_bookinstance WHERE book_id = catalog_book.id AND status = 'o')
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0012_hold'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='available_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='on_loan_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='total_copies',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunSQL(COUNT_COPIES, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations
+
+
+def create_stats_row(apps, schema_editor):
+    # Mirrors CatalogStats.compute() with the historical models.
+    Author = apps.get_model('catalog', 'Author')
+    Book = apps.get_model('catalog', 'Book')
+    BookInstance = apps.get_model('catalog', 'BookInstance')
+    CatalogStats = apps.get_model('catalog', 'CatalogStats')
+    Language = apps.get_model('catalog', 'Language')
+    CatalogStats.objects.update_or_create(pk=1, defaults={
+        'num_books': Book.objects.count(),
+        'num_instances': BookInstance.objects.count(),
+        'num_instances_available': BookInstance.objects.filter(status__exact='a').count(),
+        'num_authors': Author.objects.count(),
+        'num_languages': Language.objects.count(),
+        'num_novels': Book.objects.filter(genre__name__iexact='novel').count(),
+    })
+
+
+def delete_stats_row(apps, schema_editor):
+    apps.get_model('catalog', 'CatalogStats').objects.filter(pk=1).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0013_book_copy_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_stats_row, delete_stats_row),
+    ]
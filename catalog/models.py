@@ -1,8 +1,10 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, Q
 from django.urls import reverse
 import uuid
 from django.contrib.auth.models import User
 from datetime import date
+from django.utils import timezone
 
 
 class Book(models.Model):
@@ -11,10 +13,31 @@ class Book(models.Model):
     summary = models.TextField(max_length=1000)
     isbn = models.CharField('ISBN', max_length=13, help_text='13 character ISBN')
     genre = models.ManyToManyField('Genre')
+    # Also touched when the book's copies, genres or author change; see catalog.signals.
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # Counts of the book's copies, kept by catalog.signals and BookInstanceQuerySet and
+    # checked by the reconcile_copy_counts command.
+    total_copies = models.PositiveIntegerField(default=0, editable=False)
+    available_count = models.PositiveIntegerField(default=0, editable=False)
+    on_loan_count = models.PositiveIntegerField(default=0, editable=False)
+
+    COPY_COUNTERS = ('total_copies', 'available_count', 'on_loan_count')
+    RECOUNT_BATCH_SIZE = 500
 
     def __str__(self):
         return self.title
 
+    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
+        # The counters change through UPDATEs while an instance is held, as in an edit form; writing
+        # back the values it loaded would undo them. Only adjust_copy_counts and recounts set them.
+        if update_fields is None and not force_insert and not self._state.adding:
+            deferred = self.get_deferred_fields()
+            update_fields = [field.name for field in self._meta.concrete_fields
+                             if not field.primary_key and field.name not in self.COPY_COUNTERS
+                             and field.attname not in deferred]
+        super().save(force_insert=force_insert, force_update=force_update, using=using,
+                     update_fields=update_fields)
+
     def get_absolute_url(self):
         """Returns the url to access a detail record for this book."""
         return reverse('book-detail', args=[str(self.id)])
@@ -24,12 +47,55 @@ class Book(models.Model):
 
     display_genre.short_description = 'Genre'
 
+    @classmethod
+    def adjust_copy_counts(cls, pk, **deltas):
+        """Atomically adds the given deltas to one book's copy counters."""
+        deltas = {name: models.F(name) + delta for name, delta in deltas.items() if delta}
+        if deltas:
+            cls.objects.filter(pk=pk).update(**deltas)
+
+    @classmethod
+    def count_copies(cls, pks):
+        """Returns ``{pk: {counter: value}}`` for the given books, computed with one grouped query."""
+        counts = {pk: dict.fromkeys(cls.COPY_COUNTERS, 0) for pk in pks}
+        rows = BookInstance.objects\
+            .filter(book_id__in=counts)\
+            .order_by()\
+            .values('book_id')\
+            .annotate(total_copies=Count('id'),
+                      available_count=Count('id', filter=Q(status__exact='a')),
+                      on_loan_count=Count('id', filter=Q(status__exact='o')))
+        for row in rows:
+            counts[row.pop('book_id')] = row
+        return counts
+
+    @classmethod
+    def recount_copies(cls, pks, repair=True):
+        """Compares the stored counters of the given books with their copies; returns the books that drifted.
+
+        With ``repair``, the drifted books are given the computed counts.
+        """
+        pks = sorted({pk for pk in pks if pk is not None})
+        drifted = []
+        for start in range(0, len(pks), cls.RECOUNT_BATCH_SIZE):
+            counts = cls.count_copies(pks[start:start + cls.RECOUNT_BATCH_SIZE])
+            for book in cls.objects.filter(pk__in=counts).only(*cls.COPY_COUNTERS):
+                if any(getattr(book, name) != value for name, value in counts[book.pk].items()):
+                    for name, value in counts[book.pk].items():
+                        setattr(book, name, value)
+                    drifted.append(book)
+        if repair and drifted:
+            cls.objects.bulk_update(drifted, cls.COPY_COUNTERS)
+        return drifted
+
 
 class Author(models.Model):
     first_name = models.CharField(max_length=100, blank=True)
     last_name = models.CharField(max_length=100)
     date_of_birth = models.DateField(null=True, blank=True)
     date_of_death = models.DateField('died', null=True, blank=True)
+    # Also touched when one of the author's books or copies changes.
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ['last_name', 'first_name']
@@ -56,6 +122,40 @@ class Language(models.Model):
         return self.name
 
 
+class BookInstanceQuerySet(models.QuerySet):
+    """Recounts the books' copy counters after bulk changes, which send no signals."""
+
+    COUNTED_FIELDS = {'book', 'book_id', 'status'}
+
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic(using=self.db, savepoint=False):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            Book.recount_copies({obj.book_id for obj in objs})
+        return objs
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        objs = list(objs)
+        if not self.COUNTED_FIELDS.intersection(fields):
+            return super().bulk_update(objs, fields, batch_size=batch_size)
+        with transaction.atomic(using=self.db, savepoint=False):
+            # The books the copies leave, as stored rather than as loaded.
+            book_ids = set(self.filter(pk__in=[obj.pk for obj in objs]).values_list('book_id', flat=True))
+            super().bulk_update(objs, fields, batch_size=batch_size)
+            Book.recount_copies(book_ids | {obj.book_id for obj in objs})
+
+    def update(self, **kwargs):
+        if not self.COUNTED_FIELDS.intersection(kwargs):
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db, savepoint=False):
+            book_ids = set(self.order_by().values_list('book_id', flat=True).distinct())
+            updated = super().update(**kwargs)
+            # A book given as an expression is not followed; reconcile_copy_counts repairs its counters.
+            new_book = kwargs.get('book', kwargs.get('book_id'))
+            book_ids.add(new_book.pk if isinstance(new_book, models.Model) else new_book)
+            Book.recount_copies(book_id for book_id in book_ids if isinstance(book_id, int))
+        return updated
+
+
 class BookInstance(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, help_text='Unique ID for this book')
     imprint = models.CharField(max_length=200, help_text='book imprint')
@@ -80,8 +180,15 @@ class BookInstance(models.Model):
 
     borrower = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
 
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = BookInstanceQuerySet.as_manager()
+
     class Meta:
         ordering = ['due_back']
+        indexes = [
+            models.Index(fields=['status', 'due_back'], name='catalog_copy_status_due_idx'),
+        ]
 
     def __str__(self):
         return f'{self.id} ({self.book.title})'
@@ -91,3 +198,123 @@ class BookInstance(models.Model):
         return self.due_back and date.today() > self.due_back
 
 
+class Hold(models.Model):
+    """A patron waiting for any copy of a book, served by priority and then in order placed."""
+    book = models.ForeignKey('Book', on_delete=models.CASCADE)
+    patron = models.ForeignKey(User, on_delete=models.CASCADE)
+    priority = models.PositiveSmallIntegerField(default=5, help_text='Lower numbers are served first')
+    placed_at = models.DateTimeField(default=timezone.now)
+
+    HOLD_STATUS = (
+        ('w', 'Waiting'),
+        ('r', 'Ready for pickup'),
+        ('f', 'Fulfilled'),
+        ('c', 'Cancelled'),
+    )
+
+    status = models.CharField(max_length=1, choices=HOLD_STATUS, default='w')
+    copy = models.ForeignKey('BookInstance', on_delete=models.SET_NULL, null=True, blank=True,
+                             help_text='The copy set aside for the patron')
+    ready_at = models.DateTimeField(null=True, blank=True)
+
+    QUEUE_ORDER = ('priority', 'placed_at', 'id')
+
+    class Meta:
+        ordering = ['placed_at']
+        indexes = [
+            # The queue of each book, in serving order: the next patron is the first entry.
+            models.Index(fields=['book', 'status', 'priority', 'placed_at', 'id'], name='catalog_hold_queue_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'patron'], condition=Q(status__in=['w', 'r']),
+                                    name='catalog_hold_one_open_per_patron'),
+        ]
+
+    def __str__(self):
+        return f'{self.patron} ({self.book.title})'
+
+
+class OverdueNotice(models.Model):
+    """Records that a borrower was sent the overdue reminder on a given day."""
+    borrower = models.ForeignKey(User, on_delete=models.CASCADE)
+    sent_on = models.DateField(default=date.today)
+    num_loans = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = [['borrower', 'sent_on']]
+
+    def __str__(self):
+        return f'{self.borrower} ({self.sent_on})'
+
+
+class VisitCount(models.Model):
+    """Durable home page visit total per visitor, written in batches by catalog.visits."""
+    key = models.CharField(max_length=64, unique=True)
+    count = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.key}: {self.count}'
+
+
+class ImportCheckpoint(models.Model):
+    """Records committed by ``import_catalog`` per feed, saved in the same transaction as each batch."""
+    feed = models.CharField(max_length=255, unique=True)
+    rows = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.feed}: {self.rows}'
+
+
+class CatalogStats(models.Model):
+    """Single-row snapshot of the record counts shown on the home page.
+
+    Created by migration 0014, kept up to date incrementally by the
+    receivers in catalog.signals and rebuilt from scratch by the
+    ``rebuild_stats`` management command.
+    """
+    SINGLETON_ID = 1
+
+    num_books = models.PositiveIntegerField(default=0)
+    num_instances = models.PositiveIntegerField(default=0)
+    num_instances_available = models.PositiveIntegerField(default=0)
+    num_authors = models.PositiveIntegerField(default=0)
+    num_languages = models.PositiveIntegerField(default=0)
+    num_novels = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'catalog stats'
+
+    def __str__(self):
+        return f'Catalog stats ({self.num_books} books, {self.num_instances} copies)'
+
+    @classmethod
+    def compute(cls):
+        """Returns the counts as a dict, computed with full COUNT queries."""
+        return {
+            'num_books': Book.objects.count(),
+            'num_instances': BookInstance.objects.count(),
+            'num_instances_available': BookInstance.objects.filter(status__exact='a').count(),
+            'num_authors': Author.objects.count(),
+            'num_languages': Language.objects.count(),
+            'num_novels': Book.objects.filter(genre__name__iexact='novel').count(),
+        }
+
+    @classmethod
+    def rebuild(cls):
+        stats, _ = cls.objects.update_or_create(pk=cls.SINGLETON_ID, defaults=cls.compute())
+        return stats
+
+    @classmethod
+    def current(cls):
+        """Returns the stats row, rebuilding it only if a ``flush`` has deleted it."""
+        stats = cls.objects.filter(pk=cls.SINGLETON_ID).first()
+        if stats is None:
+            stats = cls.rebuild()
+        return stats
+
+    @classmethod
+    def adjust(cls, **deltas):
+        """Atomically adds the given deltas to the stored counters."""
+        deltas = {name: models.F(name) + delta for name, delta in deltas.items() if delta}
+        if deltas:
+            cls.objects.filter(pk=cls.SINGLETON_ID).update(**deltas)
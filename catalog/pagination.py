@@ -0,0 +1,166 @@
+"""
+Keyset (cursor) pagination for the catalog list views.
+
+Instead of ``OFFSET n`` plus a ``COUNT(*)`` on every page, a cursor page
+filters on the sort key of the last row it showed, so every page costs one
+index range scan however deep it is. The total number of pages is unknown.
+"""
+from django.conf import settings
+from django.core import signing
+from django.db.models import F, Q
+
+
+def _serialize(value):
+    """Turns a key value into something JSON can carry and a lookup accepts back."""
+    if value is None or isinstance(value, (int, str)):
+        return value
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+class CursorPage:
+    """Page of results exposing the subset of ``django.core.paginator.Page``
+    that the templates use, plus opaque ``next_cursor``/``previous_cursor``."""
+
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<Cursor page of {len(self.object_list)} items>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Paginates a queryset by ascending keyset over ``ordering``.
+
+    ``ordering`` lists field names and must end with a unique field (usually
+    ``'id'``) so that every row has a distinct key. Nullable fields are
+    sorted with NULLs last on every backend.
+    """
+    salt = 'catalog.pagination.cursor'
+
+    def __init__(self, queryset, per_page, ordering):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = list(ordering)
+        self.nullable = {
+            name for name in self.ordering if queryset.model._meta.get_field(name).null
+        }
+
+    def encode(self, direction, obj):
+        values = [_serialize(getattr(obj, name)) for name in self.ordering]
+        return signing.dumps([direction, values], salt=self.salt, compress=True)
+
+    def decode(self, cursor):
+        """Returns ``(direction, key values)`` or ``None`` for a missing or tampered cursor."""
+        if not cursor:
+            return None
+        try:
+            direction, values = signing.loads(cursor, salt=self.salt)
+        except (signing.BadSignature, TypeError, ValueError):
+            return None
+        if direction not in ('n', 'p') or len(values) != len(self.ordering):
+            return None
+        return direction, values
+
+    def _order_by(self, backwards):
+        if backwards:
+            return [F(name).desc(nulls_first=True) for name in self.ordering]
+        return [F(name).asc(nulls_last=True) for name in self.ordering]
+
+    def _beyond(self, values, backwards, position=0):
+        """Builds the filter selecting rows strictly after (or before) the key."""
+        name, value = self.ordering[position], values[position]
+        last = position == len(self.ordering) - 1
+        rest = None if last else self._beyond(values, backwards, position + 1)
+        nullable = name in self.nullable
+
+        if value is None:
+            # NULLs sort last, so going forwards only other NULLs can follow.
+            condition = Q(**{f'{name}__isnull': False}) if backwards else None
+            tie = Q(**{f'{name}__isnull': True})
+        else:
+            condition = Q(**{f'{name}__lt' if backwards else f'{name}__gt': value})
+            if nullable and not backwards:
+                condition |= Q(**{f'{name}__isnull': True})
+            tie = Q(**{name: value})
+
+        if rest is not None:
+            tie_break = tie & rest
+            condition = tie_break if condition is None else condition | tie_break
+        return condition if condition is not None else Q(pk__in=[])
+
+    def get_page(self, cursor=None):
+        decoded = self.decode(cursor)
+        backwards = decoded is not None and decoded[0] == 'p'
+
+        qs = self.queryset.order_by(*self._order_by(backwards))
+        if decoded is not None:
+            qs = qs.filter(self._beyond(decoded[1], backwards))
+
+        rows = list(qs[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+
+        if not rows:
+            return CursorPage(rows, self)
+
+        has_next = has_more if not backwards else True
+        has_previous = decoded is not None if not backwards else has_more
+        return CursorPage(
+            rows, self,
+            next_cursor=self.encode('n', rows[-1]) if has_next else None,
+            previous_cursor=self.encode('p', rows[0]) if has_previous else None,
+        )
+
+
+class CursorPaginationMixin:
+    """
+    Opt-in keyset pagination for ``ListView`` subclasses.
+
+    Enabled by ``CATALOG_CURSOR_PAGINATION = True`` in the settings or by
+    setting ``cursor_pagination`` on the view; otherwise the view keeps
+    Django's numbered pages.
+    """
+    cursor_ordering = ('id',)
+    cursor_pagination = None
+    cursor_kwarg = 'cursor'
+
+    def use_cursor_pagination(self):
+        if self.cursor_pagination is not None:
+            return self.cursor_pagination
+        return getattr(settings, 'CATALOG_CURSOR_PAGINATION', False)
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.use_cursor_pagination():
+            return super().paginate_queryset(queryset, page_size)
+
+        paginator = CursorPaginator(queryset, page_size, self.cursor_ordering)
+        page = paginator.get_page(self.request.GET.get(self.cursor_kwarg))
+        return paginator, page, page.object_list, page.has_other_pages()
@@ -0,0 +1,84 @@
+"""
+Authentication backend caching each user's permissions in the shared cache.
+
+``ModelBackend`` loads a user's own and group permissions with two queries
+the first time a request checks a permission, which every librarian view
+and the sidebar's ``perms`` checks do. ``CachedPermissionBackend`` keeps the
+resulting set of "app_label.codename" strings in the cache, so authenticated
+page views run no permission queries once it is filled.
+
+Each entry is stored with the generation it was computed in. The receivers
+in catalog.signals delete a user's entry when their own permissions, groups
+or superuser and active flags change, and start a new generation, which
+outdates every entry at once, when a group's permissions or a permission
+itself changes, both when the change is made and again when it commits
+(see catalog.caching). Entries also expire after
+``CATALOG_PERMISSION_CACHE_TIMEOUT`` seconds.
+
+A per-process cache would keep serving a revoked permission from every
+worker but the one that revoked it, so the backend refuses to start
+without a shared cache; settings only enable it when
+``DJANGO_CACHE_BACKEND`` is set.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+
+from . import caching
+
+
+GENERATION_KEY = 'catalog:permissions-generation'
+
+
+def user_key(pk):
+    return f'catalog:permissions:{pk}'
+
+
+def timeout():
+    return getattr(settings, 'CATALOG_PERMISSION_CACHE_TIMEOUT', 300)
+
+
+def invalidate_users(pks):
+    keys = [user_key(pk) for pk in pks if pk is not None]
+    caching.invalidate(lambda: cache.delete_many(keys))
+
+
+def invalidate_all():
+    caching.invalidate(lambda: cache.set(GENERATION_KEY, f'{time.time_ns():x}', None))
+
+
+def cached_permissions(pk, compute):
+    """Returns the cached permission set of user ``pk``, computing and storing it when missing or outdated."""
+    found = cache.get_many([user_key(pk), GENERATION_KEY])
+    generation = found.get(GENERATION_KEY)
+    if generation is None:
+        # Another process may start the generation first; theirs wins.
+        cache.add(GENERATION_KEY, f'{time.time_ns():x}', None)
+        generation = cache.get(GENERATION_KEY)
+    entry = found.get(user_key(pk))
+    if entry is not None and entry[0] == generation:
+        return entry[1]
+    permissions = compute()
+    cache.set(user_key(pk), (generation, permissions), timeout())
+    return permissions
+
+
+class CachedPermissionBackend(ModelBackend):
+    """``ModelBackend`` reading ``get_all_permissions`` through the shared cache."""
+
+    def __init__(self):
+        if not caching.shared():
+            raise ImproperlyConfigured(
+                'CachedPermissionBackend needs a cache shared by all processes; '
+                'set DJANGO_CACHE_BACKEND or use ModelBackend.')
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if not hasattr(user_obj, '_perm_cache'):
+            user_obj._perm_cache = cached_permissions(
+                user_obj.pk, lambda: super(CachedPermissionBackend, self).get_all_permissions(user_obj))
+        return user_obj._perm_cache
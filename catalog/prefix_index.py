@@ -0,0 +1,149 @@
+"""
+In-process prefix indexes backing the autocomplete views.
+
+Each index is a sorted list of ``(normalized key, entry)`` pairs, so a prefix
+lookup is a binary search followed by a short scan and never touches the
+database. Indexes are built lazily on first use, rebuilt after ``max_age``
+seconds, and invalidated by the receivers in catalog.signals. Invalidation
+also bumps a version number in the cache so that other processes sharing
+the cache rebuild on their next lookup; see catalog.caching.
+"""
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+
+from . import caching
+from .models import Author, Genre
+
+
+def normalize(text):
+    """Lower-cases text and reduces it to space-separated words, dropping punctuation."""
+    return ' '.join(re.findall(r'\w+', text.casefold()))
+
+
+class Entry:
+    """Lightweight stand-in for a model instance in autocomplete results."""
+    __slots__ = ('pk', 'label')
+
+    def __init__(self, pk, label):
+        self.pk = pk
+        self.label = label
+
+    def __str__(self):
+        return self.label
+
+    def __repr__(self):
+        return f'<Entry {self.pk}: {self.label}>'
+
+
+class PrefixIndex:
+    """
+    Prefix index over the rows yielded by ``load``.
+
+    ``load`` returns an iterable of ``(pk, label, keys)`` where ``keys`` are
+    the strings a query may be a prefix of.
+    """
+    max_age = 300
+    max_results = 100
+
+    def __init__(self, name, load):
+        self.name = name
+        self.load = load
+        self._lock = threading.Lock()
+        self._keys = []
+        self._entries = []
+        self._built_at = None
+        self._version = None
+
+    @property
+    def version_key(self):
+        return f'catalog:prefix-index:{self.name}:version'
+
+    def invalidate(self):
+        caching.invalidate(self._bump_version)
+
+    def _bump_version(self):
+        self._built_at = None
+        try:
+            cache.incr(self.version_key)
+        except ValueError:
+            cache.set(self.version_key, 1, None)
+
+    def _is_stale(self, version):
+        return (self._built_at is None
+                or version != self._version
+                or time.monotonic() - self._built_at > self.max_age)
+
+    def build(self):
+        """Returns the sorted ``(key, entry)`` pairs and all entries sorted by label."""
+        keys, entries = [], []
+        for pk, label, row_keys in self.load():
+            entry = Entry(pk, label)
+            entries.append(entry)
+            keys.extend((key, pk, entry) for key in {normalize(key) for key in row_keys} if key)
+        keys.sort(key=lambda item: item[:2])
+        entries.sort(key=lambda entry: (entry.label.casefold(), entry.pk))
+        return [item[0::2] for item in keys], entries
+
+    def needs_build(self):
+        """Whether the next search has to load the index from the database."""
+        return self._is_stale(cache.get(self.version_key))
+
+    def _ensure_built(self):
+        version = cache.get(self.version_key)
+        if not self._is_stale(version):
+            return
+        with self._lock:
+            if self._is_stale(version):
+                self._keys, self._entries = self.build()
+                self._version = version
+                self._built_at = time.monotonic()
+
+    def search(self, query):
+        """
+        Returns up to ``max_results`` entries with a key starting with
+        ``query``, in key order; an empty query returns entries by label.
+        """
+        self._ensure_built()
+        keys, entries = self._keys, self._entries
+        prefix = normalize(query)
+
+        if not prefix:
+            return entries[:self.max_results]
+
+        found, seen = [], set()
+        position = bisect_left(keys, (prefix,))
+        while position < len(keys) and len(found) < self.max_results:
+            key, entry = keys[position]
+            if not key.startswith(prefix):
+                break
+            if entry.pk not in seen:
+                seen.add(entry.pk)
+                found.append(entry)
+            position += 1
+        return found
+
+
+def _load_authors():
+    rows = Author.objects.values_list('pk', 'first_name', 'last_name').iterator()
+    for pk, first_name, last_name in rows:
+        yield pk, f'{last_name}, {first_name}', (f'{first_name} {last_name}', f'{last_name} {first_name}')
+
+
+def _load_genres():
+    for pk, name in Genre.objects.values_list('pk', 'name').iterator():
+        yield pk, name, (name,)
+
+
+def _load_usernames():
+    for pk, username in User.objects.values_list('pk', 'username').iterator():
+        yield pk, username, (username,)
+
+
+authors = PrefixIndex('authors', _load_authors)
+genres = PrefixIndex('genres', _load_genres)
+usernames = PrefixIndex('usernames', _load_usernames)
@@ -0,0 +1,176 @@
+"""
+On-demand profiling of catalog requests.
+
+``ProfilingMiddleware`` profiles a random ``CATALOG_PROFILE_RATE`` share of
+requests, and every request from a staff user that carries an
+``X-Profile`` header. The profile covers the view, its template rendering
+and everything they call; a streaming response is profiled up to its first
+byte only.
+
+Two profilers are available through ``CATALOG_PROFILER``:
+
+``cprofile``
+    Deterministic, exact call counts, but it slows the profiled request
+    down noticeably. Saved as ``.pstats`` files for ``pstats``, snakeviz or
+    flameprof.
+``sampling``
+    A thread reads the request thread's stack every
+    ``CATALOG_PROFILE_INTERVAL`` seconds. Much cheaper, approximate, and
+    saved as ``.folded`` collapsed stacks ("frame;frame;frame count" lines)
+    as read by flamegraph.pl and speedscope.
+
+Profiles are stored under ``CATALOG_PROFILE_DIR`` in one directory per URL
+name, which keeps the newest ``CATALOG_PROFILE_KEEP`` files and deletes the
+older ones. The ``profile_report`` command aggregates them into hotspots.
+"""
+import cProfile
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+
+logger = logging.getLogger('catalog.profiling')
+
+HEADER = 'HTTP_X_PROFILE'
+EXTENSIONS = {'cprofile': '.pstats', 'sampling': '.folded'}
+
+
+def profile_dir():
+    # Outside the source tree, so stored profiles are never picked up by version control.
+    return getattr(settings, 'CATALOG_PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'catalog-profiles'))
+
+
+def frame_name(frame):
+    return f'{frame.f_globals.get("__name__", "?")}.{frame.f_code.co_name}'
+
+
+class StackSampler:
+    """Counts the stacks of one thread, sampled from a background thread."""
+
+    def __init__(self, interval, thread_id=None):
+        self.interval = interval
+        self.thread_id = threading.get_ident() if thread_id is None else thread_id
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame_name(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def dump(self, path):
+        with open(path, 'w') as stream:
+            for stack, count in self.stacks.most_common():
+                stream.write(f'{stack} {count}\n')
+
+
+class CProfiler:
+    """``cProfile`` behind the same start, stop and dump interface as ``StackSampler``."""
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def dump(self, path):
+        self.profile.dump_stats(path)
+
+
+def new_profiler():
+    if getattr(settings, 'CATALOG_PROFILER', 'cprofile') == 'sampling':
+        return StackSampler(getattr(settings, 'CATALOG_PROFILE_INTERVAL', 0.005))
+    return CProfiler()
+
+
+def save(profiler, url_name):
+    """Writes the profile to the URL name's directory and drops the oldest beyond the limit; returns its path."""
+    kind = 'sampling' if isinstance(profiler, StackSampler) else 'cprofile'
+    directory = os.path.join(profile_dir(), url_name)
+    os.makedirs(directory, exist_ok=True)
+    # Sortable by age, and unique across processes.
+    path = os.path.join(directory, f'{time.time_ns():020d}-{os.getpid()}{EXTENSIONS[kind]}')
+    profiler.dump(path)
+    stored = sorted(name for name in os.listdir(directory) if name.endswith(tuple(EXTENSIONS.values())))
+    for name in stored[:-getattr(settings, 'CATALOG_PROFILE_KEEP', 20)]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass  # Removed by another process trimming the same ring.
+    return path
+
+
+def stored_profiles(url_name=None):
+    """Returns ``{url name: [paths, oldest first]}`` for the stored profiles."""
+    root = profile_dir()
+    if not os.path.isdir(root):
+        return {}
+    names = [url_name] if url_name else sorted(os.listdir(root))
+    profiles = {}
+    for name in names:
+        directory = os.path.join(root, name)
+        if os.path.isdir(directory):
+            paths = sorted(os.path.join(directory, file) for file in os.listdir(directory)
+                           if file.endswith(tuple(EXTENSIONS.values())))
+            if paths:
+                profiles[name] = paths
+    return profiles
+
+
+class ProfilingMiddleware:
+    """Profiles sampled requests and staff requests asking for it; see the module docstring."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def wanted(self, request):
+        requested = HEADER in request.META and request.user.is_staff
+        return requested, requested or random.random() < getattr(settings, 'CATALOG_PROFILE_RATE', 0)
+
+    def __call__(self, request):
+        requested, wanted = self.wanted(request)
+        if not wanted:
+            return self.get_response(request)
+
+        profiler = new_profiler()
+        profiler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.stop()
+
+        match = getattr(request, 'resolver_match', None)
+        if match is None or match.url_name is None:
+            return response
+        try:
+            path = save(profiler, match.url_name)
+        except OSError:
+            # A full or read-only disk must not break the request being profiled.
+            logger.exception('Could not store the profile of %s', request.path)
+            return response
+        if requested:
+            response['X-Profile'] = os.path.relpath(path, profile_dir())
+        return response
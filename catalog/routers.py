@@ -0,0 +1,149 @@
+"""
+Primary/replica database routing for the catalog.
+
+``ReplicaRoutingMiddleware`` lets the catalog models read from the replicas
+in ``CATALOG_REPLICAS`` only for GET and HEAD requests. Everything else reads
+from the primary: other requests, management commands, and the auth and
+session tables, whose rows must be current right after a login.
+
+After a request writes a catalog model, its remaining reads go to the
+primary. The response also sets a cookie that keeps that client's reads on
+the primary for ``CATALOG_PRIMARY_PIN_SECONDS``, so a librarian sees a
+renewal or status change at once instead of the replica's stale copy.
+
+Replicas are checked with ``SELECT 1`` at most every
+``CATALOG_REPLICA_CHECK_INTERVAL`` seconds per process. A replica that fails
+the check is skipped until its next check, and with none healthy reads fall
+back to the primary.
+
+A replica can lag behind the version stamps that writers bump in the shared
+cache. Fragments rendered from a replica are therefore cached apart from
+primary ones and only for ``CATALOG_PRIMARY_PIN_SECONDS``, and list pages
+get no ETag while reading from one; see catalog.fragment_cache and
+catalog.conditional.
+"""
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+PIN_COOKIE = 'catalog_primary_until'
+
+_state = threading.local()
+
+
+def _replica_aliases():
+    return getattr(settings, 'CATALOG_REPLICAS', [])
+
+
+class ReplicaHealth:
+    """Remembers per process which replicas answered their last check."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checked = {}
+
+    def check(self, alias):
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SELECT 1')
+            return True
+        except Exception:
+            try:
+                connections[alias].close()
+            except Exception:
+                pass
+            return False
+
+    def is_healthy(self, alias):
+        interval = getattr(settings, 'CATALOG_REPLICA_CHECK_INTERVAL', 10)
+        now = time.monotonic()
+        with self._lock:
+            checked = self._checked.get(alias)
+            if checked is not None and now - checked[0] < interval:
+                return checked[1]
+        healthy = self.check(alias)
+        with self._lock:
+            self._checked[alias] = (now, healthy)
+        return healthy
+
+    def healthy_replicas(self):
+        return [alias for alias in _replica_aliases() if self.is_healthy(alias)]
+
+    def reset(self):
+        with self._lock:
+            self._checked.clear()
+
+
+health = ReplicaHealth()
+
+
+def use_replicas(allowed):
+    """Sets whether catalog reads on this thread may go to a replica."""
+    _state.replicas_allowed = allowed
+    _state.wrote = False
+
+
+def wrote():
+    return getattr(_state, 'wrote', False)
+
+
+def reading_from_replica():
+    """Whether catalog reads on this thread may currently come from a replica."""
+    return getattr(_state, 'replicas_allowed', False) and bool(_replica_aliases())
+
+
+class PrimaryReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != 'catalog':
+            return None
+        if not getattr(_state, 'replicas_allowed', False):
+            return DEFAULT_DB_ALIAS
+        replicas = health.healthy_replicas()
+        return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label == 'catalog':
+            # Read your own writes for the rest of the request.
+            _state.replicas_allowed = False
+            _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *_replica_aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive their schema with the data they copy from the primary.
+        return False if db in _replica_aliases() else None
+
+
+class ReplicaRoutingMiddleware:
+    """Enables replica reads for safe requests from clients not pinned to the primary."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def is_pinned(self, request):
+        try:
+            return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def __call__(self, request):
+        use_replicas(request.method in ('GET', 'HEAD') and not self.is_pinned(request))
+        try:
+            response = self.get_response(request)
+            if wrote():
+                pin = getattr(settings, 'CATALOG_PRIMARY_PIN_SECONDS', 5)
+                response.set_cookie(PIN_COOKIE, str(time.time() + pin), max_age=pin, httponly=True,
+                                    samesite='Lax')
+        finally:
+            use_replicas(False)
+        return response
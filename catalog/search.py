@@ -0,0 +1,193 @@
+"""
+Full-text search over the catalog.
+
+Each book is indexed as one document made of its title, summary, ISBN,
+author name and genre names. The inverted index lives in the database:
+an FTS5 virtual table on SQLite and a tsvector column with a GIN index on
+PostgreSQL (both created by migration 0008). Other backends fall back to
+unindexed ``icontains`` filtering.
+
+The receivers in catalog.signals keep the index in step with saves; the
+``rebuild_search_index`` management command recreates it from scratch.
+"""
+import re
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Book
+
+
+SQLITE_TABLE = 'catalog_book_fts'
+POSTGRES_TABLE = 'catalog_book_search'
+
+MAX_TERMS = 8
+BATCH_SIZE = 500
+
+
+def terms(query):
+    """Splits a user query into lower-case word tokens safe to embed in a match expression."""
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+def _batches(ids, size=BATCH_SIZE):
+    ids = list(ids)
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def documents(book_ids):
+    """Yields ``(id, title, summary, isbn, authors, genres)`` for the given books in two queries."""
+    genres = defaultdict(list)
+    for book_id, name in Book.genre.through.objects\
+            .filter(book_id__in=book_ids)\
+            .values_list('book_id', 'genre__name'):
+        genres[book_id].append(name)
+
+    books = Book.objects\
+        .filter(pk__in=book_ids)\
+        .values_list('id', 'title', 'summary', 'isbn', 'author__first_name', 'author__last_name')
+    for book_id, title, summary, isbn, first_name, last_name in books:
+        authors = ' '.join(name for name in (first_name, last_name) if name)
+        yield book_id, title, summary, isbn, authors, ' '.join(genres[book_id])
+
+
+class SQLiteBackend:
+    # Column weights for bm25(): title, summary, isbn, authors, genres.
+    weights = (10.0, 1.0, 5.0, 5.0, 3.0)
+
+    def index(self, cursor, book_ids, rows):
+        self.remove(cursor, book_ids)
+        cursor.executemany(
+            f'INSERT INTO {SQLITE_TABLE} (rowid, title, summary, isbn, authors, genres) '
+            'VALUES (%s, %s, %s, %s, %s, %s)',
+            rows,
+        )
+
+    def remove(self, cursor, book_ids):
+        placeholders = ', '.join(['%s'] * len(book_ids))
+        cursor.execute(f'DELETE FROM {SQLITE_TABLE} WHERE rowid IN ({placeholders})', book_ids)
+
+    def clear(self, cursor):
+        cursor.execute(f'DELETE FROM {SQLITE_TABLE}')
+
+    def search(self, cursor, words, limit, offset):
+        match = ' '.join(f'"{word}"*' for word in words)
+        weights = ', '.join(str(weight) for weight in self.weights)
+        # bm25() is lower for better matches.
+        cursor.execute(
+            f'SELECT rowid FROM {SQLITE_TABLE} WHERE {SQLITE_TABLE} MATCH %s '
+            f'ORDER BY bm25({SQLITE_TABLE}, {weights}), rowid LIMIT %s OFFSET %s',
+            [match, limit, offset],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresBackend:
+    document = (
+        "setweight(to_tsvector('simple', %s), 'A') || "
+        "setweight(to_tsvector('simple', %s), 'D') || "
+        "setweight(to_tsvector('simple', %s), 'B') || "
+        "setweight(to_tsvector('simple', %s), 'B') || "
+        "setweight(to_tsvector('simple', %s), 'C')"
+    )
+
+    def index(self, cursor, book_ids, rows):
+        cursor.executemany(
+            f'INSERT INTO {POSTGRES_TABLE} (book_id, document) VALUES (%s, {self.document}) '
+            'ON CONFLICT (book_id) DO UPDATE SET document = EXCLUDED.document',
+            rows,
+        )
+        indexed = {row[0] for row in rows}
+        missing = [book_id for book_id in book_ids if book_id not in indexed]
+        if missing:
+            self.remove(cursor, missing)
+
+    def remove(self, cursor, book_ids):
+        cursor.execute(f'DELETE FROM {POSTGRES_TABLE} WHERE book_id = ANY(%s)', [list(book_ids)])
+
+    def clear(self, cursor):
+        cursor.execute(f'TRUNCATE {POSTGRES_TABLE}')
+
+    def search(self, cursor, words, limit, offset):
+        query = ' & '.join(f'{word}:*' for word in words)
+        cursor.execute(
+            f'SELECT book_id FROM {POSTGRES_TABLE}, to_tsquery(\'simple\', %s) query '
+            'WHERE document @@ query ORDER BY ts_rank_cd(document, query) DESC, book_id '
+            'LIMIT %s OFFSET %s',
+            [query, limit, offset],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+class FallbackBackend:
+    """Unindexed search for databases without a supported full-text engine."""
+
+    def index(self, cursor, book_ids, rows):
+        pass
+
+    def remove(self, cursor, book_ids):
+        pass
+
+    def clear(self, cursor):
+        pass
+
+    def search(self, cursor, words, limit, offset):
+        condition = Q()
+        for word in words:
+            condition &= (Q(title__icontains=word) | Q(summary__icontains=word) | Q(isbn__icontains=word)
+                          | Q(author__first_name__icontains=word) | Q(author__last_name__icontains=word)
+                          | Q(genre__name__icontains=word))
+        ids = Book.objects.filter(condition).order_by('id').values_list('id', flat=True).distinct()
+        return list(ids[offset:offset + limit])
+
+
+def get_backend():
+    if connection.vendor == 'sqlite':
+        return SQLiteBackend()
+    if connection.vendor == 'postgresql':
+        return PostgresBackend()
+    return FallbackBackend()
+
+
+def search_books(query, limit=50, offset=0):
+    """Returns the ids of books matching every word of ``query`` (as prefixes), best match first."""
+    words = terms(query)
+    if not words:
+        return []
+    with connection.cursor() as cursor:
+        return get_backend().search(cursor, words, limit, offset)
+
+
+def index_books(book_ids):
+    """Re-indexes the given books; ids of books that no longer exist are dropped from the index."""
+    backend = get_backend()
+    with connection.cursor() as cursor:
+        for batch in _batches(set(book_ids)):
+            backend.index(cursor, batch, list(documents(batch)))
+
+
+def remove_books(book_ids):
+    backend = get_backend()
+    with connection.cursor() as cursor:
+        for batch in _batches(set(book_ids)):
+            backend.remove(cursor, batch)
+
+
+def rebuild_index(batch_size=BATCH_SIZE):
+    """Recreates the whole index, returning the number of books indexed."""
+    backend = get_backend()
+    total = 0
+    with connection.cursor() as cursor:
+        backend.clear(cursor)
+        last_id = 0
+        while True:
+            batch = list(Book.objects.filter(pk__gt=last_id).order_by('pk')
+                         .values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                break
+            backend.index(cursor, batch, list(documents(batch)))
+            total += len(batch)
+            last_id = batch[-1]
+    return total
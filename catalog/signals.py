@@ -0,0 +1,402 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, m2m_changed
+from django.contrib.auth.models import Group, Permission, User
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import fragment_cache, permissions, prefix_index, search, sqlite
+from .models import Author, Book, BookInstance, CatalogStats, Genre, Language
+
+
+NOVEL = 'novel'
+
+
+def _is_novel(genre):
+    return genre.name.lower() == NOVEL
+
+
+def _count_novel_genres(pks):
+    return Genre.objects.filter(pk__in=pks, name__iexact=NOVEL).count()
+
+
+@receiver(post_save, sender=Book)
+def book_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        CatalogStats.adjust(num_books=1)
+
+
+@receiver(pre_delete, sender=Book)
+def book_deleting(sender, instance, **kwargs):
+    # The genre rows are removed by the delete cascade without an m2m_changed signal.
+    instance._deleted_novels = instance.genre.filter(name__iexact=NOVEL).count()
+
+
+@receiver(post_delete, sender=Book)
+def book_deleted(sender, instance, **kwargs):
+    CatalogStats.adjust(num_books=-1, num_novels=-getattr(instance, '_deleted_novels', 0))
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def book_genre_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keeps the novel count in step with additions to and removals from Book.genre."""
+    if action == 'pre_clear':
+        # pk_set is not provided on clear, so remember what is about to go.
+        if reverse:
+            instance._cleared_novels = instance.book_set.count() if _is_novel(instance) else 0
+        else:
+            instance._cleared_novels = instance.genre.filter(name__iexact=NOVEL).count()
+        return
+
+    if action == 'post_clear':
+        CatalogStats.adjust(num_novels=-getattr(instance, '_cleared_novels', 0))
+        return
+
+    if action not in ('post_add', 'post_remove') or not pk_set:
+        return
+
+    if reverse:
+        novels = len(pk_set) if _is_novel(instance) else 0
+    else:
+        novels = _count_novel_genres(pk_set)
+
+    CatalogStats.adjust(num_novels=novels if action == 'post_add' else -novels)
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+def genre_changed(sender, instance, **kwargs):
+    # Renaming or deleting a genre can change which books count as novels.
+    if kwargs.get('raw'):
+        return
+    CatalogStats.objects.filter(pk=CatalogStats.SINGLETON_ID)\
+        .update(num_novels=Book.objects.filter(genre__name__iexact=NOVEL).count())
+
+
+@receiver(post_init, sender=BookInstance)
+def bookinstance_loaded(sender, instance, **kwargs):
+    # Remember the loaded status so post_save can tell whether availability changed,
+    # and the loaded book so a copy moved to another book invalidates both.
+    instance._loaded_status = instance.__dict__.get('status')
+    instance._loaded_book_id = instance.__dict__.get('book_id')
+
+
+@receiver(post_save, sender=BookInstance)
+def bookinstance_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+
+    was_available = not created and instance._loaded_status == 'a'
+    is_available = instance.status == 'a'
+
+    CatalogStats.adjust(
+        num_instances=1 if created else 0,
+        num_instances_available=int(is_available) - int(was_available),
+    )
+
+
+@receiver(post_delete, sender=BookInstance)
+def bookinstance_deleted(sender, instance, **kwargs):
+    CatalogStats.adjust(
+        num_instances=-1,
+        num_instances_available=-1 if instance._loaded_status == 'a' else 0,
+    )
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Language)
+def counted_model_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        field = 'num_authors' if sender is Author else 'num_languages'
+        CatalogStats.adjust(**{field: 1})
+
+
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Language)
+def counted_model_deleted(sender, instance, **kwargs):
+    field = 'num_authors' if sender is Author else 'num_languages'
+    CatalogStats.adjust(**{field: -1})
+
+
+# Full-text search index
+
+@receiver(post_save, sender=Book)
+def book_saved_index(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_books([instance.pk])
+
+
+@receiver(post_delete, sender=Book)
+def book_deleted_index(sender, instance, **kwargs):
+    search.remove_books([instance.pk])
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def book_genre_changed_index(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._cleared_book_ids = list(instance.book_set.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        search.index_books(getattr(instance, '_cleared_book_ids', []) if reverse else [instance.pk])
+    elif action in ('post_add', 'post_remove') and pk_set:
+        search.index_books(pk_set if reverse else [instance.pk])
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Genre)
+def book_relation_saved_index(sender, instance, created, raw=False, **kwargs):
+    # A new author or genre has no books yet; a renamed one changes its books' documents.
+    if not created and not raw:
+        search.index_books(instance.book_set.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Author)
+@receiver(pre_delete, sender=Genre)
+def book_relation_deleting_index(sender, instance, **kwargs):
+    instance._indexed_book_ids = list(instance.book_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Genre)
+def book_relation_deleted_index(sender, instance, **kwargs):
+    search.index_books(getattr(instance, '_indexed_book_ids', []))
+
+
+# Autocomplete prefix indexes
+
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+def author_changed_prefix_index(sender, **kwargs):
+    prefix_index.authors.invalidate()
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+def genre_changed_prefix_index(sender, **kwargs):
+    prefix_index.genres.invalidate()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed_prefix_index(sender, update_fields=None, **kwargs):
+    # Logging in saves last_login only; that must not throw the index away.
+    if update_fields is not None and 'username' not in update_fields:
+        return
+    prefix_index.usernames.invalidate()
+
+
+# Template fragment cache
+
+@receiver(post_init, sender=Book)
+def book_loaded(sender, instance, **kwargs):
+    instance._loaded_author_id = instance.__dict__.get('author_id')
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def book_changed_fragments(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    fragment_cache.bump_instance(instance)
+    fragment_cache.bump('catalog.author', {instance._loaded_author_id, instance.author_id})
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def book_genre_changed_fragments(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._cleared_fragment_book_ids = list(instance.book_set.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        fragment_cache.bump('catalog.book', getattr(instance, '_cleared_fragment_book_ids', []) if reverse else [instance.pk])
+    elif action in ('post_add', 'post_remove') and pk_set:
+        fragment_cache.bump('catalog.book', pk_set if reverse else [instance.pk])
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+def author_changed_fragments(sender, instance, raw=False, **kwargs):
+    # Book pages show the author by name and vary on the author's stamp, so bumping it covers them too.
+    if not raw:
+        fragment_cache.bump_instance(instance)
+
+
+@receiver(post_save, sender=Genre)
+def genre_saved_fragments(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        fragment_cache.bump('catalog.book', instance.book_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Genre)
+def genre_deleted_fragments(sender, instance, **kwargs):
+    # The book ids were collected by book_relation_deleting_index before the delete.
+    fragment_cache.bump('catalog.book', getattr(instance, '_indexed_book_ids', []))
+
+
+@receiver(post_save, sender=Language)
+@receiver(post_delete, sender=Language)
+@receiver(m2m_changed, sender=BookInstance.language.through)
+def language_changed_fragments(sender, action='post_save', raw=False, **kwargs):
+    # Only the book list's language facet shows languages.
+    if action.startswith('post_') and not raw:
+        fragment_cache.bump('catalog.language')
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed_fragments(sender, update_fields=None, **kwargs):
+    # The librarian's loan list shows borrowers by username.
+    if update_fields is None or 'username' in update_fields:
+        fragment_cache.bump('auth.user')
+
+
+@receiver(post_save, sender=BookInstance)
+@receiver(post_delete, sender=BookInstance)
+def bookinstance_changed_fragments(sender, instance, raw=False, **kwargs):
+    # Book pages list their copies and author pages show availability per book.
+    if raw:
+        return
+    book_ids = {instance._loaded_book_id, instance.book_id} - {None}
+    fragment_cache.bump('catalog.book', book_ids)
+    fragment_cache.bump('catalog.author', Book.objects.filter(pk__in=book_ids).values_list('author_id', flat=True))
+
+
+# Modification timestamps for conditional GET
+#
+# The touches below go through QuerySet.update(), which sends no signals,
+# so they cannot cascade into each other.
+
+def _touch(model, **filters):
+    model.objects.filter(**filters).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def book_changed_touch(sender, instance, raw=False, **kwargs):
+    # Author pages list their books; the old author loses one when the book moves.
+    if not raw:
+        _touch(Author, pk__in={instance._loaded_author_id, instance.author_id} - {None})
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def book_genre_changed_touch(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._cleared_touch_book_ids = list(instance.book_set.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        _touch(Book, pk__in=getattr(instance, '_cleared_touch_book_ids', []) if reverse else [instance.pk])
+    elif action in ('post_add', 'post_remove') and pk_set:
+        _touch(Book, pk__in=pk_set if reverse else [instance.pk])
+
+
+@receiver(post_save, sender=Author)
+def author_saved_touch(sender, instance, created, raw=False, **kwargs):
+    # Book pages and the book list show the author's name.
+    if not created and not raw:
+        _touch(Book, author=instance)
+
+
+@receiver(post_save, sender=Genre)
+def genre_saved_touch(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        _touch(Book, genre=instance)
+
+
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Genre)
+def book_relation_deleted_touch(sender, instance, **kwargs):
+    # The book ids were collected by book_relation_deleting_index before the delete.
+    _touch(Book, pk__in=getattr(instance, '_indexed_book_ids', []))
+
+
+@receiver(post_save, sender=BookInstance)
+@receiver(post_delete, sender=BookInstance)
+def bookinstance_changed_touch(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    book_ids = {instance._loaded_book_id, instance.book_id} - {None}
+    _touch(Book, pk__in=book_ids)
+    _touch(Author, book__pk__in=book_ids)
+
+
+# Per-book copy counters
+#
+# Bulk changes, which send no signals, are recounted by BookInstanceQuerySet.
+
+def _copy_deltas(status, sign):
+    return {'total_copies': sign, 'available_count': sign * (status == 'a'), 'on_loan_count': sign * (status == 'o')}
+
+
+@receiver(post_save, sender=BookInstance)
+def bookinstance_saved_counts(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    deltas = {}
+    if not created and instance._loaded_book_id is not None:
+        deltas[instance._loaded_book_id] = _copy_deltas(instance._loaded_status, -1)
+    if instance.book_id is not None:
+        added = _copy_deltas(instance.status, 1)
+        removed = deltas.get(instance.book_id, dict.fromkeys(added, 0))
+        deltas[instance.book_id] = {name: removed[name] + added[name] for name in added}
+    for book_id, book_deltas in deltas.items():
+        Book.adjust_copy_counts(book_id, **book_deltas)
+
+
+@receiver(post_delete, sender=BookInstance)
+def bookinstance_deleted_counts(sender, instance, **kwargs):
+    if instance._loaded_book_id is not None:
+        Book.adjust_copy_counts(instance._loaded_book_id, **_copy_deltas(instance._loaded_status, -1))
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=BookInstance)
+def reset_loaded_relations(sender, instance, **kwargs):
+    # Connected after every receiver that compares against the loaded book, author or status.
+    if sender is Book:
+        instance._loaded_author_id = instance.author_id
+    else:
+        instance._loaded_book_id = instance.book_id
+        instance._loaded_status = instance.status
+
+
+# Cached permissions
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed_permissions(sender, instance, update_fields=None, **kwargs):
+    # Logins save last_login alone; new users may reuse the id of a deleted one.
+    if update_fields is None or {'is_active', 'is_superuser'} & set(update_fields):
+        permissions.invalidate_users([instance.pk])
+
+
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=User.groups.through)
+def user_relations_changed_permissions(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        permissions.invalidate_users([instance.pk])
+    elif pk_set:
+        permissions.invalidate_users(pk_set)
+    elif action == 'post_clear':
+        # A permission or group lost all its users, whose ids the signal does not carry.
+        permissions.invalidate_all()
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def group_permissions_changed(sender, action, **kwargs):
+    # Affects every member of the groups involved, however many there are.
+    if action.startswith('post_'):
+        permissions.invalidate_all()
+
+
+@receiver(post_save, sender=Permission)
+@receiver(post_delete, sender=Permission)
+@receiver(post_delete, sender=Group)
+def permission_or_group_changed(sender, raw=False, **kwargs):
+    # Deletes cascade to the user and group relations without m2m_changed signals.
+    if not raw:
+        permissions.invalidate_all()
+
+
+# SQLite production profile
+
+@receiver(connection_created)
+def sqlite_connection_created(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite' and sqlite.enabled():
+        sqlite.configure(connection)
@@ -0,0 +1,92 @@
+"""
+Production profile for SQLite.
+
+With ``CATALOG_SQLITE_PROFILE = 'production'``, the ``connection_created``
+receiver in catalog.signals calls ``configure`` on every new SQLite
+connection. ``configure`` applies the pragmas below:
+
+- WAL lets readers run while a writer commits.
+- ``synchronous=NORMAL`` skips the fsync per commit, which WAL makes safe
+  against corruption.
+- ``busy_timeout`` makes a writer wait for the lock instead of failing with
+  "database is locked".
+
+``configure`` also makes ``atomic()`` open its transactions with
+``BEGIN IMMEDIATE``, which takes the write lock at the start. With a
+deferred BEGIN, two transactions that both read before writing can
+deadlock on the lock upgrade, and SQLite then fails one of them at once
+without waiting for ``busy_timeout``. Writes should therefore stay in short
+``atomic()`` blocks.
+
+``benchmark_sqlite`` compares this profile with the untuned default.
+"""
+import contextlib
+import os
+import tempfile
+import types
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, connections
+
+
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -20000,  # KiB, so 20 MB per connection
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,  # ms
+}
+
+
+def enabled():
+    return getattr(settings, 'CATALOG_SQLITE_PROFILE', 'default') == 'production'
+
+
+def _begin_immediate(connection):
+    connection.cursor().execute('BEGIN IMMEDIATE')
+
+
+def configure(connection):
+    """Applies the production pragmas and immediate transactions to a new SQLite connection."""
+    pragmas = dict(PRAGMAS, **getattr(settings, 'CATALOG_SQLITE_PRAGMAS', {}))
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+    # Replaces the deferred BEGIN that atomic() issues on SQLite, for this connection only.
+    connection._start_transaction_under_autocommit = types.MethodType(_begin_immediate, connection)
+
+
+@contextlib.contextmanager
+def immediate(connection):
+    """Makes the transactions that atomic() begins on ``connection`` in this block take the write lock at BEGIN.
+
+    For writers that read before they write, such as the ``Max('pk')`` that
+    import_catalog numbers its rows from, under the default profile too.
+    """
+    connection.ensure_connection()
+    original = connection.__dict__.get('_start_transaction_under_autocommit')
+    connection._start_transaction_under_autocommit = types.MethodType(_begin_immediate, connection)
+    try:
+        yield
+    finally:
+        if original is None:
+            del connection._start_transaction_under_autocommit
+        else:
+            connection._start_transaction_under_autocommit = original
+
+
+@contextlib.contextmanager
+def scratch_database(name='scratch'):
+    """Points the default connection at a new, migrated SQLite file, for benchmarks that fill their own data."""
+    original = connection.settings_dict['NAME']
+    with tempfile.TemporaryDirectory() as directory:
+        connections.close_all()
+        connection.settings_dict['NAME'] = os.path.join(directory, f'{name}.db')
+        try:
+            call_command('migrate', verbosity=0)
+            yield connection.settings_dict['NAME']
+        finally:
+            connections.close_all()
+            connection.settings_dict['NAME'] = original
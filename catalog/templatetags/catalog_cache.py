@@ -0,0 +1,58 @@
+from django import template
+from django.core.cache import cache
+from django.template.base import token_kwargs
+
+from catalog import caching, fragment_cache
+
+
+register = template.Library()
+
+
+class FragmentCacheNode(template.Node):
+    def __init__(self, nodelist, name, vary_on, tables):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary_on = vary_on
+        self.tables = tables
+
+    def render(self, context):
+        if not caching.shared():
+            # Other processes would keep serving this copy after a bump; see catalog.caching.
+            return self.nodelist.render(context)
+        name = self.name.resolve(context)
+        tables = self.tables.resolve(context).split(',') if self.tables else ()
+        key = fragment_cache.fragment_key(
+            name, [value.resolve(context) for value in self.vary_on], [label.strip() for label in tables if label])
+
+        content = cache.get(key)
+        fragment_cache.record(name, hit=content is not None)
+        if content is None:
+            content = self.nodelist.render(context)
+            cache.set(key, content, fragment_cache.timeout())
+        return content
+
+
+@register.tag
+def fragmentcache(parser, token):
+    """
+    Caches the enclosed output until any object or table it depends on changes::
+
+        {% fragmentcache 'book-detail' book book.author request.get_full_path tables='catalog.genre' %}
+            ...
+        {% endfragmentcache %}
+
+    Model instances among the arguments add their version stamps to the key,
+    other values are part of the key as they are. ``tables`` names models,
+    by lowercase label, whose every change invalidates the fragment.
+    With a per-process cache the content is rendered on every request.
+    """
+    nodelist = parser.parse(('endfragmentcache',))
+    parser.delete_first_token()
+
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires at least a fragment name.")
+    kwarg_bits = [bit for bit in bits[2:] if bit.startswith('tables=')]
+    vary_on = [parser.compile_filter(bit) for bit in bits[2:] if bit not in kwarg_bits]
+    options = token_kwargs(kwarg_bits, parser)
+    return FragmentCacheNode(nodelist, parser.compile_filter(bits[1]), vary_on, options.get('tables'))
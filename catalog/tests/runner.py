@@ -0,0 +1,16 @@
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+class CatalogTestRunner(DiscoverRunner):
+    """Runs the tests with plain static files storage, so templates render without a collectstatic manifest."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.static_storage = override_settings(
+            STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+        self.static_storage.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.static_storage.disable()
+        super().teardown_test_environment(**kwargs)
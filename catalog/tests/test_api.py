@@ -0,0 +1,70 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog import api
+from catalog.models import Author, Book, BookInstance
+
+
+class KioskApiTest(TestCase):
+
+    def setUp(self):
+        User.objects.create_user(username='kiosk', password='1X<ISRUkw+tuK')
+        self.client.login(username='kiosk', password='1X<ISRUkw+tuK')
+
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        self.books = []
+        for number in range(5):
+            book = Book.objects.create(title=f'Book {number}', summary='Summary', isbn=f'978000000000{number}',
+                                       author=author)
+            BookInstance.objects.bulk_create(
+                BookInstance(book=book, imprint='Imprint', status=status) for status in 'aao'[:number % 3 + 1])
+            self.books.append(book)
+
+    def get(self, **params):
+        return self.client.get(reverse('api-books'), params)
+
+    def test_batch_by_id_and_isbn(self):
+        response = self.get(id=f'{self.books[0].pk},{self.books[2].pk},999', isbn=['9780000000001', 'unknown'])
+        self.assertEqual(200, response.status_code)
+        data = response.json()
+        self.assertEqual(['Book 0', 'Book 1', 'Book 2'], [book['title'] for book in data['books']])
+        self.assertEqual({'a': 2, 'o': 1}, data['books'][2]['copies'])
+        self.assertEqual(2, data['books'][2]['available'])
+        self.assertEqual('Smith, John', data['books'][0]['author'])
+        self.assertEqual({'id': [999], 'isbn': ['unknown']}, data['missing'])
+        self.assertEqual('Available', data['statuses']['a'])
+
+    def test_query_count_constant(self):
+        # session, user, books, copy counts
+        with self.assertNumQueries(4):
+            self.get(id=self.books[0].pk)
+        with self.assertNumQueries(4):
+            self.get(id=','.join(str(book.pk) for book in self.books))
+
+    def test_etag_revalidation(self):
+        response = self.get(id=self.books[0].pk)
+        # session, user, books
+        with self.assertNumQueries(3):
+            not_modified = self.client.get(reverse('api-books'), {'id': self.books[0].pk},
+                                           HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(304, not_modified.status_code)
+
+        BookInstance.objects.create(book=self.books[0], imprint='Imprint', status='a')
+        changed = self.client.get(reverse('api-books'), {'id': self.books[0].pk}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(200, changed.status_code)
+        self.assertEqual(2, changed.json()['books'][0]['available'])
+
+    def test_invalid_batches(self):
+        self.assertEqual(400, self.get().status_code)
+        self.assertEqual(400, self.get(id='abc').status_code)
+        self.assertEqual(400, self.get(id=','.join(['1'] * (api.MAX_BATCH + 1))).status_code)
+
+    def test_single_book(self):
+        response = self.client.get(reverse('api-book', args=[self.books[1].pk]))
+        self.assertEqual({'a': 2}, response.json()['copies'])
+        self.assertEqual(404, self.client.get(reverse('api-book', args=[999])).status_code)
+
+    def test_requires_login(self):
+        self.client.logout()
+        self.assertEqual(302, self.get(id=self.books[0].pk).status_code)
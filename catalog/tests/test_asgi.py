@@ -0,0 +1,142 @@
+import asyncio
+import json
+from unittest import mock
+
+from django.contrib.auth.models import Permission, User
+from django.contrib.contenttypes.models import ContentType
+from django.test import TransactionTestCase
+from django.urls import reverse
+
+from catalog import asgi, prefix_index
+from catalog.models import Author, Book, BookInstance
+
+
+class ASGIClient:
+    """Calls an ASGI application in-process and collects the response."""
+
+    def __init__(self, application, cookies=''):
+        self.application = application
+        self.cookies = cookies
+
+    async def request(self, path, query='', with_headers=False):
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': path, 'root_path': '', 'scheme': 'http',
+            'query_string': query.encode(), 'server': ('testserver', 80), 'client': ('127.0.0.1', 5000),
+            'headers': [(b'host', b'testserver'), (b'cookie', self.cookies.encode())],
+        }
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        await self.application(scope, receive, send)
+        body = b''.join(message.get('body', b'') for message in messages[1:])
+        if with_headers:
+            return messages[0]['status'], {name.lower(): value for name, value in messages[0]['headers']}, body
+        return messages[0]['status'], body
+
+    def get(self, path, query=''):
+        return asyncio.run(self.request(path, query))
+
+
+class CatalogASGIHandlerTest(TransactionTestCase):
+    # Restores the CatalogStats row from migration 0014 that other tests' flushes delete.
+    serialized_rollback = True
+
+    def setUp(self):
+        for index in (prefix_index.authors, prefix_index.genres, prefix_index.usernames):
+            index.invalidate()
+        self.user = User.objects.create_user(username='librarian', password='1X<ISRUkw+tuK')
+        self.user.user_permissions.add(Permission.objects.create(
+            codename='can_maintain', name='Can edit book index', content_type=ContentType.objects.get_for_model(Book)))
+        for number in range(15):
+            Author.objects.create(first_name=f'John {number:02}', last_name='Smith')
+        self.client.login(username='librarian', password='1X<ISRUkw+tuK')
+        cookies = '; '.join(f'{name}={morsel.value}' for name, morsel in self.client.cookies.items())
+        self.asgi = ASGIClient(asgi.CatalogASGIHandler(), cookies)
+
+    def test_async_view_runs_on_loop_inside_middleware(self):
+        loops = []
+
+        async def view(request):
+            loops.append(asyncio.get_running_loop())
+            return await asgi.autocomplete(request, prefix_index.authors, 'catalog.can_maintain')
+
+        async def call():
+            response = await self.asgi.request(reverse('author-autocomplete'), 'q=smi', with_headers=True)
+            return asyncio.get_running_loop(), response
+
+        with mock.patch.dict(asgi.ASYNC_VIEWS, {'author-autocomplete': view}):
+            loop, (status, headers, body) = asyncio.run(call())
+        self.assertEqual([loop], loops)
+        self.assertEqual(200, status)
+        # Set by SecurityMiddleware and XFrameOptionsMiddleware around the async view.
+        self.assertEqual(b'DENY', headers[b'x-frame-options'])
+        self.assertEqual(b'nosniff', headers[b'x-content-type-options'])
+
+    def test_autocomplete_matches_wsgi_view(self):
+        url = reverse('author-autocomplete')
+        status, body = self.asgi.get(url, 'q=smi')
+        self.assertEqual(200, status)
+        self.assertEqual(self.client.get(url, {'q': 'smi'}).json(), json.loads(body))
+
+        status, body = self.asgi.get(url, 'q=smi&page=2')
+        self.assertEqual(5, len(json.loads(body)['results']))
+        self.assertFalse(json.loads(body)['pagination']['more'])
+
+    def test_autocomplete_access(self):
+        self.assertEqual(403, self.asgi.get(reverse('user_id-autocomplete'), 'q=lib')[0])
+        self.assertEqual(302, ASGIClient(self.asgi.application).get(reverse('author-autocomplete'))[0])
+
+    def test_api_view(self):
+        book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG')
+        status, body = self.asgi.get(reverse('api-books'), f'id={book.pk}')
+        self.assertEqual(200, status)
+        self.assertEqual('Book Title', json.loads(body)['books'][0]['title'])
+        self.assertEqual(404, self.asgi.get(reverse('api-book', args=[book.pk + 1]))[0])
+
+    def test_other_routes_served_by_django(self):
+        status, body = self.asgi.get(reverse('authors'))
+        self.assertEqual(200, status)
+        self.assertIn(b'Author List', body)
+
+    def test_export_streams_through_project_application(self):
+        from locallibrary.asgi import application
+
+        self.user.user_permissions.add(Permission.objects.create(
+            codename='can_mark_returned', name='Set book as returned',
+            content_type=ContentType.objects.get_for_model(BookInstance)))
+        book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG')
+        BookInstance.objects.create(book=book, imprint='Imprint 2020', status='a')
+        client = ASGIClient(application, self.asgi.cookies)
+        status, body = client.get(reverse('export-books'))
+        self.assertEqual(200, status)
+        self.assertIn(b'Book Title', body)
+        status, body = client.get(reverse('export-circulation'), 'format=jsonl')
+        self.assertEqual(200, status)
+        self.assertIn(b'Imprint 2020', body)
+
+    def test_home_page_runs_middleware_through_project_application(self):
+        from locallibrary.asgi import application
+
+        status, headers, body = asyncio.run(ASGIClient(application, self.asgi.cookies).request(
+            reverse('index'), with_headers=True))
+        self.assertEqual(200, status)
+        self.assertIn(b'You have visited this page 0 times', body)
+        # Set by SecurityMiddleware and XFrameOptionsMiddleware.
+        self.assertEqual(b'DENY', headers[b'x-frame-options'])
+        self.assertEqual(b'nosniff', headers[b'x-content-type-options'])
+
+    def test_concurrent_requests_share_bounded_pool(self):
+        async def burst():
+            requests = [self.asgi.request(reverse('author-autocomplete'), f'q=john {number:02}')
+                        for number in range(15)]
+            return await asyncio.gather(*requests)
+
+        responses = asyncio.run(burst())
+        self.assertEqual([200] * 15, [status for status, _ in responses])
+        self.assertEqual(['Smith, John 03'], [result['text'] for result in json.loads(responses[3][1])['results']])
+        self.assertLessEqual(asgi.get_executor()._max_workers, 8)
@@ -0,0 +1,149 @@
+import datetime
+import threading
+
+from django.contrib.auth.models import Permission, User
+from django.contrib.contenttypes.models import ContentType
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from catalog import circulation
+from catalog.models import Author, Book, BookInstance, CatalogStats
+
+
+DUE = datetime.date.today() + datetime.timedelta(weeks=3)
+
+
+class CirculationTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG', author=author)
+        cls.alice = User.objects.create_user(username='alice', password='1X<ISRUkw+tuK')
+        cls.bob = User.objects.create_user(username='bob', password='2HJ1vRV0Z&3iD')
+
+    def setUp(self):
+        self.copy = BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        CatalogStats.rebuild()
+
+    def load(self):
+        return BookInstance.objects.get(pk=self.copy.pk)
+
+    def assertStatsConsistent(self):
+        stats = CatalogStats.current()
+        self.assertEqual(CatalogStats.compute()['num_instances_available'], stats.num_instances_available)
+
+    def test_second_checkout_of_same_copy_conflicts(self):
+        desk1, desk2 = self.load(), self.load()
+        circulation.checkout(desk1, self.alice, DUE)
+        with self.assertRaises(circulation.CirculationConflict):
+            circulation.checkout(desk2, self.bob, DUE)
+        copy = self.load()
+        self.assertEqual(('o', self.alice.pk, DUE), (copy.status, copy.borrower_id, copy.due_back))
+        self.assertStatsConsistent()
+
+    def test_return_and_renew_after_return_conflict(self):
+        circulation.checkout(self.load(), self.alice, DUE)
+        desk1, desk2 = self.load(), self.load()
+        circulation.check_in(desk1)
+        with self.assertRaises(circulation.CirculationConflict):
+            circulation.check_in(desk2)
+        with self.assertRaises(circulation.CirculationConflict):
+            circulation.renew(desk2, DUE + datetime.timedelta(days=1))
+        copy = self.load()
+        self.assertEqual(('a', None, None), (copy.status, copy.borrower_id, copy.due_back))
+        self.assertStatsConsistent()
+
+    def test_renew_keeps_other_columns(self):
+        circulation.checkout(self.load(), self.alice, DUE)
+        desk = self.load()
+        BookInstance.objects.filter(pk=self.copy.pk).update(imprint='Corrected imprint')
+        circulation.renew(desk, DUE + datetime.timedelta(days=2))
+        copy = self.load()
+        self.assertEqual(('Corrected imprint', DUE + datetime.timedelta(days=2)), (copy.imprint, copy.due_back))
+
+    def test_set_status_refuses_loans(self):
+        with self.assertRaises(ValueError):
+            circulation.set_status(self.load(), 'o')
+        circulation.set_status(self.load(), 'm')
+        self.assertEqual('m', self.load().status)
+        self.assertStatsConsistent()
+
+
+# The manage page links static files, which have no manifest in tests.
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class ManageBookViewConflictTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG', author=author)
+        cls.copy = BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+        cls.patron = User.objects.create_user(username='patron', password='1X<ISRUkw+tuK')
+        librarian = User.objects.create_user(username='librarian', password='2HJ1vRV0Z&3iD')
+        librarian.user_permissions.add(Permission.objects.create(
+            codename='can_mark_returned', name='Set book as returned',
+            content_type=ContentType.objects.get_for_model(BookInstance)))
+
+    def setUp(self):
+        self.client.login(username='librarian', password='2HJ1vRV0Z&3iD')
+        self.url = reverse('manage-book-librarian', kwargs={'pk': self.copy.pk})
+
+    def lend(self, expected_status):
+        return self.client.post(self.url, {'status': 'o', 'borrower': self.patron.pk, 'due_back': DUE,
+                                           'expected_status': expected_status})
+
+    def test_form_carries_status_shown(self):
+        response = self.client.get(self.url)
+        self.assertEqual('a', response.context['form'].initial['expected_status'])
+
+    def test_stale_form_reports_conflict(self):
+        self.assertEqual(302, self.lend('a').status_code)
+        response = self.lend('a')
+        self.assertEqual(409, response.status_code)
+        self.assertIn('changed by someone else', str(response.context['form'].non_field_errors()))
+        self.assertEqual('o', response.context['form'].data['expected_status'])
+
+
+class ConcurrentCheckoutTest(TransactionTestCase):
+    # Desks racing for one copy in threads, each on its own database connection.
+
+    desks = 8
+
+    def test_exactly_one_checkout_wins(self):
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG', author=author)
+        copy = BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+        patrons = [User.objects.create_user(username=f'patron{number}') for number in range(self.desks)]
+        CatalogStats.rebuild()
+        barrier = threading.Barrier(self.desks)
+        won, lost = [], []
+
+        def desk(patron):
+            try:
+                loaded = BookInstance.objects.get(pk=copy.pk)
+                barrier.wait()
+                while True:
+                    try:
+                        circulation.checkout(loaded, patron, DUE)
+                        won.append(patron.pk)
+                        return
+                    except circulation.CirculationConflict:
+                        lost.append(patron.pk)
+                        return
+                    except OperationalError:
+                        # SQLite's shared-cache test database refuses concurrent writers outright.
+                        pass
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=desk, args=(patron,)) for patron in patrons]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual((1, self.desks - 1), (len(won), len(lost)))
+        self.assertEqual(won[0], BookInstance.objects.get(pk=copy.pk).borrower_id)
+        self.assertEqual(0, CatalogStats.current().num_instances_available)
@@ -0,0 +1,95 @@
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog.models import Author, Book, BookInstance, Genre
+
+
+class ConditionalGetTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+        self.client.login(username='reader', password='1X<ISRUkw+tuK')
+
+        self.author = Author.objects.create(first_name='John', last_name='Smith')
+        self.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG', author=self.author)
+        self.copy = BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        self.book_url = reverse('book-detail', kwargs={'pk': self.book.pk})
+
+    def revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_detail_not_modified_from_one_query(self):
+        response = self.client.get(self.book_url)
+        self.assertTrue(response.has_header('ETag'))
+        self.assertTrue(response.has_header('Last-Modified'))
+        # session, user, book
+        with self.assertNumQueries(3):
+            not_modified = self.revalidate(self.book_url, response)
+        self.assertEqual(304, not_modified.status_code)
+        self.assertFalse(not_modified.templates)
+
+        since = self.client.get(self.book_url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(304, since.status_code)
+
+    def test_copy_change_touches_book_and_author(self):
+        book_updated, author_updated = self.book.updated_at, Author.objects.get().updated_at
+        response = self.client.get(self.book_url)
+        author_url = reverse('author-detail', kwargs={'pk': self.author.pk})
+        author_response = self.client.get(author_url)
+
+        self.copy.status = 'o'
+        self.copy.save()
+        self.assertGreater(Book.objects.get().updated_at, book_updated)
+        self.assertGreater(Author.objects.get().updated_at, author_updated)
+        self.assertEqual(200, self.revalidate(self.book_url, response).status_code)
+        self.assertEqual(200, self.revalidate(author_url, author_response).status_code)
+
+    def test_related_changes_touch_book(self):
+        genre = Genre.objects.create(name='Fantasy')
+        for change in (lambda: self.book.genre.add(genre), lambda: genre.save(), lambda: self.author.save()):
+            response = self.client.get(self.book_url)
+            change()
+            self.assertEqual(200, self.revalidate(self.book_url, response).status_code)
+
+    def test_list_revalidation(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory.name}})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        url = reverse('books')
+        response = self.client.get(url)
+        self.assertFalse(response.has_header('Last-Modified'))
+        self.assertEqual(304, self.revalidate(url, response).status_code)
+
+        Book.objects.create(title='Another', summary='Summary', isbn='HIJKLMN', author=self.author)
+        response = self.revalidate(url, response)
+        self.assertEqual(200, response.status_code)
+        self.book.delete()
+        self.assertEqual(200, self.revalidate(url, response).status_code)
+
+    def test_list_unvalidated_with_per_process_cache(self):
+        response = self.client.get(reverse('books'))
+        self.assertEqual(200, response.status_code)
+        self.assertFalse(response.has_header('ETag'))
+        # Detail pages validate against their row, wherever the cache lives.
+        self.assertTrue(self.client.get(self.book_url).has_header('ETag'))
+
+    def test_etag_is_per_user(self):
+        response = self.client.get(self.book_url)
+        User.objects.create_user(username='other', password='1X<ISRUkw+tuK')
+        self.client.login(username='other', password='1X<ISRUkw+tuK')
+        self.assertEqual(200, self.revalidate(self.book_url, response).status_code)
+
+    def test_anonymous_and_missing_reach_the_view(self):
+        response = self.client.get(self.book_url)
+        self.client.logout()
+        self.assertEqual(302, self.revalidate(self.book_url, response).status_code)
+        self.client.login(username='reader', password='1X<ISRUkw+tuK')
+        self.assertEqual(404, self.client.get(reverse('book-detail', kwargs={'pk': 999})).status_code)
@@ -0,0 +1,105 @@
+import uuid
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog import circulation
+from catalog.models import Author, Book, BookInstance, Genre, Language
+
+
+class CopyCountersTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.book = Book.objects.create(title='First', summary='Summary', isbn='ABCDEFG', author=author)
+        cls.other = Book.objects.create(title='Second', summary='Summary', isbn='ABCDEFG', author=author)
+        cls.patron = User.objects.create_user(username='patron')
+
+    def counters(self, book):
+        book = Book.objects.get(pk=book.pk)
+        return tuple(getattr(book, name) for name in Book.COPY_COUNTERS)
+
+    def assertCounted(self):
+        for book in (self.book, self.other):
+            stored = self.counters(book)
+            computed = Book.count_copies([book.pk])[book.pk]
+            self.assertEqual(tuple(computed[name] for name in Book.COPY_COUNTERS), stored, book.title)
+
+    def test_saving_stale_book_keeps_counters(self):
+        stale = Book.objects.get(pk=self.book.pk)
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='o')
+        stale.title = 'Renamed'
+        stale.save()
+        self.assertEqual((2, 1, 1), self.counters(self.book))
+        self.assertEqual('Renamed', Book.objects.get(pk=self.book.pk).title)
+        self.assertEqual([], Book.recount_copies([self.book.pk], repair=False))
+
+    def test_save_and_delete(self):
+        copy = BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='o')
+        self.assertEqual((2, 1, 1), self.counters(self.book))
+        copy.status = 'm'
+        copy.save()
+        self.assertEqual((2, 0, 1), self.counters(self.book))
+        copy.book = self.other
+        copy.status = 'a'
+        copy.save()
+        self.assertEqual(((1, 0, 1), (1, 1, 0)), (self.counters(self.book), self.counters(self.other)))
+        BookInstance.objects.get(pk=copy.pk).delete()
+        self.assertCounted()
+
+    def test_circulation_counted_once(self):
+        copy = BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        circulation.checkout(copy, self.patron, None)
+        self.assertEqual((1, 0, 1), self.counters(self.book))
+        circulation.check_in(copy)
+        self.assertEqual((1, 1, 0), self.counters(self.book))
+
+    def test_bulk_operations_recounted(self):
+        copies = BookInstance.objects.bulk_create(
+            [BookInstance(book=self.book, imprint='Imprint', status='a') for _ in range(3)])
+        self.assertEqual((3, 3, 0), self.counters(self.book))
+        for copy in copies[:2]:
+            copy.book, copy.status = self.other, 'o'
+        BookInstance.objects.bulk_update(copies, ['book', 'status'])
+        self.assertEqual(((1, 1, 0), (2, 0, 2)), (self.counters(self.book), self.counters(self.other)))
+        BookInstance.objects.filter(book=self.other).update(status='a', book=self.book)
+        self.assertEqual(((3, 3, 0), (0, 0, 0)), (self.counters(self.book), self.counters(self.other)))
+
+    def test_reconcile_repairs_drift(self):
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        Book.objects.filter(pk=self.book.pk).update(available_count=7)
+        out = StringIO()
+        call_command('reconcile_copy_counts', '--dry-run', '--batch-size', '1', stdout=out)
+        self.assertIn('Checked 2 books, would repair 1', out.getvalue())
+        self.assertEqual(7, Book.objects.get(pk=self.book.pk).available_count)
+        call_command('reconcile_copy_counts', stdout=StringIO())
+        self.assertCounted()
+
+
+class AdminInlineCountersTest(TestCase):
+
+    def test_inline_copies_counted(self):
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        book = Book.objects.create(title='First', summary='Summary', isbn='ABCDEFG', author=author)
+        genre, language = Genre.objects.create(name='Novel'), Language.objects.create(name='English')
+        copy = BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+        User.objects.create_superuser(username='admin', password='1X<ISRUkw+tuK', email='')
+        self.client.login(username='admin', password='1X<ISRUkw+tuK')
+        prefix = 'bookinstance_set'
+        response = self.client.post(reverse('admin:catalog_book_change', args=[book.pk]), {
+            'title': book.title, 'summary': book.summary, 'isbn': book.isbn, 'author': author.pk, 'genre': genre.pk,
+            f'{prefix}-TOTAL_FORMS': 2, f'{prefix}-INITIAL_FORMS': 1,
+            f'{prefix}-0-id': copy.pk, f'{prefix}-0-book': book.pk, f'{prefix}-0-imprint': 'Imprint',
+            f'{prefix}-0-status': 'o', f'{prefix}-0-language': language.pk,
+            f'{prefix}-1-id': uuid.uuid4(), f'{prefix}-1-book': book.pk, f'{prefix}-1-imprint': 'Second imprint',
+            f'{prefix}-1-status': 'a', f'{prefix}-1-language': language.pk,
+        })
+        self.assertEqual(302, response.status_code)
+        book.refresh_from_db()
+        self.assertEqual((2, 1, 1), (book.total_copies, book.available_count, book.on_loan_count))
@@ -0,0 +1,71 @@
+import csv
+import datetime
+import json
+
+from django.contrib.auth.models import User, Permission
+from django.contrib.contenttypes.models import ContentType
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog import exports
+from catalog.models import Author, Book, BookInstance, Language
+
+
+class ExportViewTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.librarian = User.objects.create_user(username='librarian', password='1X<ISRUkw+tuK')
+        User.objects.create_user(username='patron', password='1X<ISRUkw+tuK')
+        for codename, name, model in (('can_mark_returned', 'Set book as returned', BookInstance),
+                                      ('can_maintain', 'Can edit book index', Book)):
+            cls.librarian.user_permissions.add(Permission.objects.create(
+                codename=codename, name=name, content_type=ContentType.objects.get_for_model(model)))
+
+        author = Author.objects.create(first_name='John', last_name='Steinbeck')
+        book = Book.objects.create(title='The Grapes of Wrath', summary='Summary', isbn='9780143039433',
+                                   author=author)
+        english, french = Language.objects.create(name='English'), Language.objects.create(name='French')
+        for number in range(5):
+            copy = BookInstance.objects.create(
+                book=book, imprint=f'Imprint {number}', status='o' if number % 2 else 'a',
+                borrower=cls.librarian if number % 2 else None,
+                due_back=datetime.date(2020, 1, 1) if number % 2 else None)
+            copy.language.set([english, french] if number == 1 else [english])
+
+    def content(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_requires_permission(self):
+        self.client.login(username='patron', password='1X<ISRUkw+tuK')
+        self.assertEqual(403, self.client.get(reverse('export-circulation')).status_code)
+        self.assertEqual(403, self.client.get(reverse('export-books')).status_code)
+
+    def test_circulation_csv(self):
+        self.client.login(username='librarian', password='1X<ISRUkw+tuK')
+        response = self.client.get(reverse('export-circulation'), {'status': 'o'})
+        self.assertTrue(response.streaming)
+        self.assertEqual('text/csv', response['Content-Type'])
+        rows = list(csv.DictReader(self.content(response).splitlines()))
+        self.assertEqual(2, len(rows))
+        self.assertEqual({'librarian'}, {row['borrower'] for row in rows})
+        self.assertIn('English;French', {row['languages'] for row in rows})
+        self.assertEqual('2020-01-01', rows[0]['due_back'])
+
+    def test_books_and_authors_jsonl(self):
+        self.client.login(username='librarian', password='1X<ISRUkw+tuK')
+        response = self.client.get(reverse('export-books'), {'format': 'jsonl'})
+        books = [json.loads(line) for line in self.content(response).splitlines()]
+        self.assertEqual('Steinbeck', books[0]['author_last_name'])
+
+        response = self.client.get(reverse('export-authors'), {'format': 'jsonl'})
+        self.assertEqual('John', json.loads(self.content(response))['first_name'])
+
+        self.assertEqual(404, self.client.get(reverse('export-books'), {'format': 'xml'}).status_code)
+
+    def test_chunked_walk_covers_every_copy(self):
+        # One query per chunk for the copies plus one for their languages.
+        with self.assertNumQueries(7):
+            rows = list(exports.bookinstance_rows(chunk_size=2))
+        self.assertEqual(5, len(rows) - 1)
+        self.assertEqual(5, len({row[0] for row in rows[1:]}))
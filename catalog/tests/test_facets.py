@@ -0,0 +1,79 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.http import QueryDict
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog import facets
+from catalog.models import Author, Book, BookInstance, Genre, Language
+
+
+class FacetTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.smith = Author.objects.create(first_name='John', last_name='Smith')
+        cls.jones = Author.objects.create(first_name='Jane', last_name='Jones')
+        cls.fantasy, cls.poetry = (Genre.objects.create(name=name) for name in ('Fantasy', 'Poetry'))
+        cls.english, cls.french = (Language.objects.create(name=name) for name in ('English', 'French'))
+        cls.dragons = Book.objects.create(title='Dragons', summary='', isbn='1', author=cls.smith)
+        cls.odes = Book.objects.create(title='Odes', summary='', isbn='2', author=cls.jones)
+        cls.sagas = Book.objects.create(title='Sagas', summary='', isbn='3', author=cls.smith)
+        cls.dragons.genre.add(cls.fantasy, cls.poetry)
+        cls.odes.genre.add(cls.poetry)
+        cls.sagas.genre.add(cls.fantasy)
+        for book, status, language in ((cls.dragons, 'a', cls.english), (cls.dragons, 'a', cls.french),
+                                       (cls.odes, 'o', cls.french), (cls.sagas, 'm', cls.english)):
+            BookInstance.objects.create(book=book, imprint='Imprint', status=status).language.add(language)
+        User.objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+
+    def setUp(self):
+        cache.clear()
+        self.client.login(username='reader', password='1X<ISRUkw+tuK')
+
+    def counts(self, **filters):
+        query = QueryDict(mutable=True)
+        for name, values in filters.items():
+            query.setlist(name, [str(value) for value in values])
+        return {facet['name']: {value['label']: value['count'] for value in facet['values']}
+                for facet in facets.facet_counts(facets.selected(query))}
+
+    def titles(self, query):
+        response = self.client.get(reverse('books') + '?' + query)
+        return [book.title for book in response.context['book_list']]
+
+    def test_filters_and_across_facets_or_within(self):
+        self.assertEqual(['Dragons', 'Odes', 'Sagas'], self.titles(f'genre={self.fantasy.pk}&genre={self.poetry.pk}'))
+        self.assertEqual(['Dragons', 'Sagas'], self.titles(f'genre={self.fantasy.pk}&language={self.english.pk}'))
+        self.assertEqual(['Dragons'], self.titles(f'genre={self.fantasy.pk}&status=a'))
+        self.assertEqual(['Odes'], self.titles(f'author={self.jones.pk}&status=o&status=m'))
+
+    def test_counts_ignore_own_facet(self):
+        self.assertEqual({'Fantasy': 2, 'Poetry': 2}, self.counts()['genre'])
+        counts = self.counts(genre=[self.poetry.pk])
+        self.assertEqual({'Fantasy': 2, 'Poetry': 2}, counts['genre'])
+        self.assertEqual({'English': 1, 'French': 2}, counts['language'])
+        self.assertEqual({'Available': 1, 'On loan': 1}, counts['status'])
+        self.assertEqual({'Smith, John': 1, 'Jones, Jane': 1}, counts['author'])
+
+    def test_one_query_per_facet_then_cached(self):
+        selection = {'genre': [self.fantasy.pk], 'status': ['a']}
+        with CaptureQueriesContext(connection) as queries:
+            facets.facet_counts(selection)
+        self.assertEqual(len(facets.FACETS), len(queries))
+        with CaptureQueriesContext(connection) as queries:
+            facets.facet_counts(selection)
+        self.assertEqual(0, len(queries))
+
+    def test_copy_change_updates_counts(self):
+        self.assertEqual({'Available': 1, 'On loan': 1, 'Maintenance': 1}, self.counts()['status'])
+        BookInstance.objects.filter(status='m').get().delete()
+        self.assertEqual({'Available': 1, 'On loan': 1}, self.counts()['status'])
+
+    def test_links_keep_filters(self):
+        response = self.client.get(reverse('books') + f'?genre={self.fantasy.pk}&genre=x')
+        self.assertEqual(f'genre={self.fantasy.pk}', response.context['filter_query'])
+        self.assertContains(response, f'?genre={self.fantasy.pk}&amp;language={self.english.pk}')
+        self.assertContains(response, 'Clear filters')
@@ -0,0 +1,147 @@
+import tempfile
+from io import StringIO
+
+from django.contrib.auth.models import Permission, User
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog import caching, fragment_cache
+from catalog.models import Author, Book, BookInstance, Genre
+
+
+class FragmentCacheTest(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory.name}})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = User.objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+        self.client.login(username='reader', password='1X<ISRUkw+tuK')
+
+        self.author = Author.objects.create(first_name='John', last_name='Smith')
+        self.genre = Genre.objects.create(name='Fantasy')
+        self.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG', author=self.author)
+        self.book.genre.add(self.genre)
+        self.copy = BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+
+    def get(self, name, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(name, kwargs=kwargs))
+        self.assertEqual(200, response.status_code)
+        return response, len(queries)
+
+    def test_hit_skips_fragment_queries(self):
+        _, cold = self.get('book-detail', pk=self.book.pk)
+        response, warm = self.get('book-detail', pk=self.book.pk)
+        self.assertLess(warm, cold)
+        self.assertContains(response, 'Fantasy')
+        self.assertEqual((1, 1, 0.5), fragment_cache.hit_ratios(['book-detail'])['book-detail'])
+
+    def test_book_save_invalidates_book_and_author_pages(self):
+        self.get('book-detail', pk=self.book.pk)
+        self.get('author-detail', pk=self.author.pk)
+        self.book.title = 'New Title'
+        self.book.save()
+        self.assertContains(self.get('book-detail', pk=self.book.pk)[0], 'New Title')
+        self.assertContains(self.get('author-detail', pk=self.author.pk)[0], 'New Title')
+        self.assertContains(self.client.get(reverse('books')), 'New Title')
+
+    def test_copy_change_invalidates_availability(self):
+        self.assertContains(self.get('author-detail', pk=self.author.pk)[0], '1 of 1 available')
+        self.copy.status = 'o'
+        self.copy.save()
+        self.assertContains(self.get('author-detail', pk=self.author.pk)[0], '0 of 1 available')
+        self.assertContains(self.get('book-detail', pk=self.book.pk)[0], 'On loan')
+
+    def test_copy_moved_invalidates_both_books(self):
+        other = Book.objects.create(title='Other', summary='Summary', isbn='HIJKLMN', author=self.author)
+        self.get('book-detail', pk=self.book.pk)
+        copy = BookInstance.objects.get(pk=self.copy.pk)
+        copy.book = other
+        copy.save()
+        self.assertNotContains(self.get('book-detail', pk=self.book.pk)[0], str(self.copy.pk))
+
+    def test_related_renames_invalidate(self):
+        self.get('book-detail', pk=self.book.pk)
+        self.genre.name = 'Science Fiction'
+        self.genre.save()
+        self.assertContains(self.get('book-detail', pk=self.book.pk)[0], 'Science Fiction')
+        self.author.last_name = 'Jones'
+        self.author.save()
+        self.assertContains(self.get('book-detail', pk=self.book.pk)[0], 'Jones')
+
+    def test_maintenance_links_kept_out_of_fragment(self):
+        self.assertNotContains(self.client.get(reverse('books')), 'Add book')
+        self.user.user_permissions.add(Permission.objects.create(
+            codename='can_maintain', name='Can edit book index', content_type=ContentType.objects.get_for_model(Book)))
+        response = self.client.get(reverse('books'))
+        self.assertContains(response, 'Add book')
+        self.assertContains(response, reverse('book_update', kwargs={'pk': self.book.pk}))
+
+        User.objects.create_user(username='other', password='1X<ISRUkw+tuK')
+        self.client.login(username='other', password='1X<ISRUkw+tuK')
+        response = self.client.get(reverse('books'))
+        self.assertNotContains(response, reverse('book_update', kwargs={'pk': self.book.pk}))
+        self.assertEqual((1, 1, 0.5), fragment_cache.hit_ratios(['book-list'])['book-list'])
+
+    def test_user_specific_output_not_cached(self):
+        self.client.get(reverse('books'))
+        User.objects.create_user(username='other', password='1X<ISRUkw+tuK')
+        self.client.login(username='other', password='1X<ISRUkw+tuK')
+        response = self.client.get(reverse('books'))
+        self.assertContains(response, 'other')
+        self.assertNotContains(response, 'reader')
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_per_process_cache_renders_uncached(self):
+        _, cold = self.get('book-detail', pk=self.book.pk)
+        self.assertEqual(cold, self.get('book-detail', pk=self.book.pk)[1])
+        self.assertEqual((0, 0, None), fragment_cache.hit_ratios(['book-detail'])['book-detail'])
+
+    def test_stats_command(self):
+        self.get('book-detail', pk=self.book.pk)
+        self.get('book-detail', pk=self.book.pk)
+        out = StringIO()
+        call_command('fragment_cache_stats', '--reset', stdout=out)
+        self.assertIn('50.0%', out.getvalue())
+        self.assertEqual((0, 0, None), fragment_cache.hit_ratios(['book-detail'])['book-detail'])
+
+
+class BumpOnCommitTest(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_stamps_bumped_again_on_commit(self):
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        with transaction.atomic():
+            author.last_name = 'Smyth'
+            author.save()
+            # What another process rendering now, before the commit, would cache under.
+            during = fragment_cache.fragment_key('author-detail', [author])
+        self.assertNotEqual(during, fragment_cache.fragment_key('author-detail', [author]))
+
+    def test_rolled_back_write_bumps_once(self):
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        with self.assertRaises(ZeroDivisionError), transaction.atomic():
+            author.save()
+            during = fragment_cache.fragment_key('author-detail', [author])
+            1 / 0
+        self.assertEqual(during, fragment_cache.fragment_key('author-detail', [author]))
+
+
+class SharedCacheCheckTest(SimpleTestCase):
+
+    def test_per_process_cache_reported_on_deploy(self):
+        self.assertEqual(['catalog.W001'], [message.id for message in caching.check_shared_cache(None)])
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+                                                   'LOCATION': 'catalog_cache'}}):
+            self.assertEqual([], caching.check_shared_cache(None))
@@ -0,0 +1,137 @@
+import datetime
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog import circulation
+from catalog.models import Author, Book, BookInstance, CatalogStats, Hold
+
+
+DUE = datetime.date.today() + datetime.timedelta(weeks=3)
+
+
+class HoldQueueTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG', author=author)
+        cls.alice, cls.bob, cls.carol = (
+            User.objects.create_user(username=name, password='1X<ISRUkw+tuK') for name in ('alice', 'bob', 'carol'))
+
+    def setUp(self):
+        self.copy = BookInstance.objects.create(book=self.book, imprint='Imprint', status='o', borrower=self.carol,
+                                                due_back=DUE)
+        CatalogStats.rebuild()
+
+    def load(self, copy=None):
+        return BookInstance.objects.get(pk=(copy or self.copy).pk)
+
+    def test_return_reserves_copy_for_first_in_queue(self):
+        circulation.place_hold(self.book, self.alice)
+        circulation.place_hold(self.book, self.bob, priority=1)
+        circulation.check_in(self.load())
+
+        copy = self.load()
+        self.assertEqual(('r', self.bob.pk), (copy.status, copy.borrower_id))
+        hold = Hold.objects.get(patron=self.bob)
+        self.assertEqual(('r', copy.pk), (hold.status, hold.copy_id))
+        self.assertEqual('w', Hold.objects.get(patron=self.alice).status)
+        self.assertEqual(CatalogStats.compute()['num_instances_available'],
+                         CatalogStats.current().num_instances_available)
+
+    def test_return_without_holds_makes_copy_available(self):
+        circulation.check_in(self.load())
+        self.assertEqual(('a', None), (self.load().status, self.load().borrower_id))
+
+    def test_collecting_fulfils_hold(self):
+        circulation.place_hold(self.book, self.alice)
+        circulation.check_in(self.load())
+        circulation.checkout(self.load(), self.alice, DUE)
+        self.assertEqual('f', Hold.objects.get(patron=self.alice).status)
+
+    def test_lending_reserved_copy_to_another_keeps_place(self):
+        circulation.place_hold(self.book, self.alice)
+        circulation.check_in(self.load())
+        circulation.checkout(self.load(), self.bob, DUE)
+        hold = circulation.with_queue_positions(Hold.objects.filter(patron=self.alice)).get()
+        self.assertEqual(('w', None, 1), (hold.status, hold.copy_id, hold.queue_position))
+
+    def test_cancelling_ready_hold_passes_copy_on(self):
+        circulation.place_hold(self.book, self.alice)
+        circulation.place_hold(self.book, self.bob)
+        circulation.check_in(self.load())
+        circulation.cancel_hold(Hold.objects.get(patron=self.alice))
+        self.assertEqual(('r', self.bob.pk), (self.load().status, self.load().borrower_id))
+        circulation.cancel_hold(Hold.objects.get(patron=self.bob))
+        self.assertEqual(('a', None), (self.load().status, self.load().borrower_id))
+        with self.assertRaises(circulation.CirculationConflict):
+            circulation.cancel_hold(Hold.objects.get(patron=self.bob))
+
+    def test_hold_on_book_with_available_copy_reserves_it(self):
+        circulation.check_in(self.load())
+        hold = circulation.place_hold(self.book, self.alice)
+        self.assertEqual(('r', self.copy.pk), (hold.status, hold.copy_id))
+        self.assertEqual(('r', self.alice.pk), (self.load().status, self.load().borrower_id))
+        self.assertEqual('w', circulation.place_hold(self.book, self.bob).status)
+        self.assertEqual(CatalogStats.compute()['num_instances_available'],
+                         CatalogStats.current().num_instances_available)
+
+    def test_one_open_hold_per_patron_and_book(self):
+        circulation.place_hold(self.book, self.alice)
+        with self.assertRaises(circulation.CirculationConflict):
+            circulation.place_hold(self.book, self.alice)
+        circulation.cancel_hold(Hold.objects.get(patron=self.alice))
+        circulation.place_hold(self.book, self.alice)
+
+    def test_queue_positions(self):
+        for patron in (self.alice, self.bob):
+            circulation.place_hold(self.book, patron)
+        circulation.place_hold(self.book, self.carol, priority=1)
+        positions = dict(circulation.with_queue_positions(Hold.objects.all())
+                         .values_list('patron__username', 'queue_position'))
+        self.assertEqual({'carol': 1, 'alice': 2, 'bob': 3}, positions)
+
+    def test_next_hold_read_from_queue_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Reads the SQLite query plan')
+        sql, params = circulation.waiting_holds(self.book.pk)[:1].query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('catalog_hold_queue_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+class HoldViewsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG', author=author)
+        cls.patron = User.objects.create_user(username='patron', password='1X<ISRUkw+tuK')
+        cls.other = User.objects.create_user(username='other', password='2HJ1vRV0Z&3iD')
+
+    def setUp(self):
+        self.client.login(username='patron', password='1X<ISRUkw+tuK')
+
+    def test_place_hold_and_list_position(self):
+        circulation.place_hold(self.book, self.other)
+        response = self.client.post(reverse('place-hold', args=[self.book.pk]))
+        self.assertRedirects(response, reverse('my-holds'))
+        response = self.client.get(reverse('my-holds'))
+        self.assertEqual([2], [hold.queue_position for hold in response.context['hold_list']])
+        self.assertContains(response, 'number 2 in the queue')
+        self.assertContains(response, '<ul class="catalog-list">', count=1)
+
+    def test_place_hold_requires_post(self):
+        self.assertEqual(405, self.client.get(reverse('place-hold', args=[self.book.pk])).status_code)
+
+    def test_cancel_only_own_hold(self):
+        own = circulation.place_hold(self.book, self.patron)
+        others = circulation.place_hold(self.book, self.other)
+        self.assertEqual(404, self.client.post(reverse('cancel-hold', args=[others.pk])).status_code)
+        self.assertRedirects(self.client.post(reverse('cancel-hold', args=[own.pk])), reverse('my-holds'))
+        self.assertEqual('c', Hold.objects.get(pk=own.pk).status)
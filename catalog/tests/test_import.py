@@ -0,0 +1,107 @@
+import csv
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command, CommandError
+from django.test import TestCase
+
+from catalog import search
+from catalog.models import Author, Book, BookInstance, CatalogStats, Genre, ImportCheckpoint, Language
+
+
+class ImportCatalogTest(TestCase):
+
+    fields = ['title', 'summary', 'isbn', 'author_first_name', 'author_last_name',
+              'genres', 'languages', 'copies', 'imprint', 'status']
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        Author.objects.create(first_name='John', last_name='Steinbeck')
+        Genre.objects.create(name='Novel')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def records(self, number):
+        for row in range(number):
+            yield {
+                'title': f'Book {row}',
+                'summary': 'Summary',
+                'isbn': f'{row:013}',
+                'author_first_name': 'John' if row % 2 else f'First {row % 5}',
+                'author_last_name': 'Steinbeck' if row % 2 else f'Last {row % 5}',
+                'genres': 'novel;Fantasy' if row % 3 == 0 else 'Novel',
+                'languages': 'English;French',
+                'copies': 2,
+                'imprint': 'Imprint',
+                'status': 'a' if row % 2 else 'm',
+            }
+
+    def write_csv(self, records):
+        path = os.path.join(self.directory.name, 'feed.csv')
+        with open(path, 'w', newline='') as stream:
+            writer = csv.DictWriter(stream, fieldnames=self.fields)
+            writer.writeheader()
+            writer.writerows(records)
+        return path
+
+    def run_import(self, path, *args):
+        out = StringIO()
+        call_command('import_catalog', path, *args, stdout=out)
+        return out.getvalue()
+
+    def test_csv_import(self):
+        output = self.run_import(self.write_csv(self.records(25)), '--batch-size', '10')
+        self.assertIn('Imported 25 records', output)
+        self.assertIn('rows/s', output)
+
+        self.assertEqual(25, Book.objects.count())
+        self.assertEqual(50, BookInstance.objects.count())
+        self.assertEqual(6, Author.objects.count())
+        self.assertEqual(['Fantasy', 'Novel'], sorted(Genre.objects.values_list('name', flat=True)))
+        self.assertEqual(2, Language.objects.count())
+        self.assertEqual(2, Book.objects.get(title='Book 0').genre.count())
+        self.assertEqual(2, BookInstance.objects.first().language.count())
+        self.assertEqual(12, Author.objects.get(last_name='Steinbeck').book_set.count())
+        self.assertEqual([], Book.recount_copies(Book.objects.values_list('pk', flat=True), repair=False))
+
+        stats = CatalogStats.current()
+        self.assertEqual(CatalogStats.compute(), {field: getattr(stats, field) for field in CatalogStats.compute()})
+        self.assertEqual(1, len(search.search_books('book 17')))
+
+    def test_jsonl_import(self):
+        path = os.path.join(self.directory.name, 'feed.jsonl')
+        with open(path, 'w') as stream:
+            for record in self.records(5):
+                record['genres'] = record['genres'].split(';')
+                stream.write(json.dumps(record) + '\n')
+        self.run_import(path)
+        self.assertEqual(5, Book.objects.count())
+
+    def test_resume_skips_committed_records(self):
+        path = self.write_csv(self.records(12))
+        ImportCheckpoint.objects.create(feed=path, rows=10)
+        self.run_import(path, '--resume')
+        self.assertEqual(['Book 10', 'Book 11'], sorted(Book.objects.values_list('title', flat=True)))
+        self.assertEqual(12, ImportCheckpoint.objects.get(feed=path).rows)
+
+    def test_checkpoint_committed_with_batch(self):
+        records = list(self.records(5))
+        records[4]['status'] = 'x'
+        path = self.write_csv(records)
+        with self.assertRaises(CommandError):
+            self.run_import(path, '--batch-size', '2')
+        self.assertEqual(4, ImportCheckpoint.objects.get(feed=path).rows)
+        records[4]['status'] = 'a'
+        self.write_csv(records)
+        self.run_import(path, '--resume', '--batch-size', '2')
+        self.assertEqual(5, Book.objects.count())
+
+    def test_invalid_status_rolls_back_batch(self):
+        records = list(self.records(3))
+        records[2]['status'] = 'x'
+        with self.assertRaisesMessage(CommandError, 'Record 3: unknown status'):
+            self.run_import(self.write_csv(records))
+        self.assertEqual(0, Book.objects.count())
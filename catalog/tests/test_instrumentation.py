@@ -0,0 +1,126 @@
+import datetime
+
+from django.contrib.auth.models import User, Permission
+from django.contrib.contenttypes.models import ContentType
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog import instrumentation, urls
+from catalog.models import Author, Book, BookInstance, CatalogStats, Genre, Hold, Language
+
+
+class QueryBudgetTest(instrumentation.QueryBudgetTestMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.librarian = User.objects.create_user(username='librarian', password='1X<ISRUkw+tuK')
+        for codename, name, model in (('can_mark_returned', 'Set book as returned', BookInstance),
+                                      ('can_maintain', 'Can edit book index', Book)):
+            cls.librarian.user_permissions.add(Permission.objects.create(
+                codename=codename, name=name, content_type=ContentType.objects.get_for_model(model)))
+
+        genre = Genre.objects.create(name='Novel')
+        language = Language.objects.create(name='English')
+        due_back = datetime.date.today() + datetime.timedelta(days=3)
+        for author_id in range(12):
+            author = Author.objects.create(first_name=f'First {author_id}', last_name=f'Last {author_id}')
+            book = Book.objects.create(title=f'Book {author_id}', summary='Summary', isbn='ABCDEFG', author=author)
+            book.genre.add(genre)
+            for _ in range(3):
+                copy = BookInstance.objects.create(book=book, imprint='Imprint', status='o',
+                                                   due_back=due_back, borrower=cls.librarian)
+                copy.language.add(language)
+
+        cls.author = author
+        cls.book = book
+        cls.copy = copy
+        cls.available = BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+        CatalogStats.rebuild()
+
+    def setUp(self):
+        self.client.login(username='librarian', password='1X<ISRUkw+tuK')
+
+    def urls(self):
+        yield reverse('index')
+        yield reverse('books')
+        yield reverse('search') + '?q=book'
+        yield reverse('book-detail', args=[self.book.pk])
+        yield reverse('authors')
+        yield reverse('author-detail', args=[self.author.pk])
+        yield reverse('my-borrowed')
+        yield reverse('all-borrowed')
+        yield reverse('my-holds')
+        yield reverse('renew-book-librarian', args=[self.copy.pk])
+        yield reverse('manage-book-librarian', args=[self.available.pk])
+        yield reverse('author_create')
+        yield reverse('author_update', args=[self.author.pk])
+        yield reverse('author_delete', args=[self.author.pk])
+        yield reverse('book_create')
+        yield reverse('book_update', args=[self.book.pk])
+        yield reverse('book_delete', args=[self.book.pk])
+        yield reverse('author-autocomplete') + '?q=last'
+        yield reverse('genre-autocomplete') + '?q=nov'
+        yield reverse('user_id-autocomplete') + '?q=lib'
+        yield reverse('api-books') + f'?id={self.book.pk}&isbn=ABCDEFG'
+        yield reverse('api-book', args=[self.book.pk])
+
+    def test_every_view_within_budget(self):
+        for url in self.urls():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(200, response.status_code)
+                self.assertWithinBudget(response)
+
+    def posts(self):
+        due_back = datetime.date.today() + datetime.timedelta(weeks=2)
+        yield reverse('renew-book-librarian', args=[self.copy.pk]), {'renewal_date': due_back}
+        yield reverse('manage-book-librarian', args=[self.available.pk]), {
+            'status': 'o', 'borrower': self.librarian.pk, 'due_back': due_back, 'expected_status': 'a'}
+        yield reverse('manage-book-librarian', args=[self.copy.pk]), {'status': 'a', 'expected_status': 'o'}
+        book = {'title': 'New book', 'author': self.author.pk, 'summary': 'Summary', 'isbn': '1234567890123',
+                'genre': [Genre.objects.get().pk]}
+        yield reverse('book_create'), book
+        yield reverse('book_update', args=[self.book.pk]), book
+        yield reverse('place-hold', args=[self.book.pk]), {}
+        # The copy on the shelf was set aside for the hold, so cancelling passes it on.
+        yield reverse('cancel-hold', args=[Hold.objects.get().pk]), {}
+
+    def test_every_form_submission_within_budget(self):
+        for url, data in self.posts():
+            with self.subTest(url=url):
+                response = self.client.post(url, data)
+                self.assertEqual(302, response.status_code)
+                self.assertWithinBudget(response)
+
+    def test_every_url_name_has_a_budget(self):
+        names = {pattern.name for pattern in urls.urlpatterns}
+        self.assertFalse(names - set(instrumentation.QUERY_BUDGETS))
+
+    def test_streamed_body_recorded(self):
+        response = self.client.get(reverse('export-circulation'))
+        before = response.query_recorder.count
+        instrumentation.stats.reset()
+        b''.join(response.streaming_content)
+        self.assertGreater(response.query_recorder.count, before)
+        self.assertEqual(1, instrumentation.stats.snapshot()['export-circulation']['requests'])
+        self.assertWithinBudget(response)
+
+    def test_stats_accumulate_per_url_name(self):
+        instrumentation.stats.reset()
+        self.client.get(reverse('books'))
+        self.client.get(reverse('books'))
+        totals = instrumentation.stats.snapshot()['books']
+        self.assertEqual(2, totals['requests'])
+        self.assertGreater(totals['queries'], 0)
+
+    @override_settings(CATALOG_QUERY_BUDGETS={'author-detail': {'queries': 1}})
+    def test_warning_logged_when_over_budget(self):
+        with self.assertLogs('catalog.queries', 'WARNING') as logs:
+            self.client.get(reverse('author-detail', args=[self.author.pk]))
+        self.assertIn('Query budget exceeded for author-detail', logs.output[0])
+
+    def test_duplicate_fingerprints(self):
+        with instrumentation.record_queries() as recorder:
+            for book in Book.objects.all()[:3]:
+                list(book.genre.all())
+        self.assertEqual([3], list(recorder.duplicates().values()))
@@ -0,0 +1,88 @@
+import datetime
+from io import StringIO
+from smtplib import SMTPException
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.test import TestCase
+
+from catalog.management.commands.send_overdue_notices import Command
+from catalog.models import Book, BookInstance, OverdueNotice
+
+
+class SendOverdueNoticesTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        today = datetime.date.today()
+        book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG')
+        for number in range(6):
+            borrower = User.objects.create_user(username=f'user{number}', email=f'user{number}@example.com')
+            for days in (-10, -3, 5):
+                BookInstance.objects.create(book=book, imprint='Imprint', status='o', borrower=borrower,
+                                            due_back=today + datetime.timedelta(days=days))
+        User.objects.filter(username='user5').update(email='')
+        User.objects.create_user(username='returned', email='returned@example.com')
+        BookInstance.objects.create(book=book, imprint='Imprint', status='a',
+                                    borrower=User.objects.get(username='returned'),
+                                    due_back=today - datetime.timedelta(days=3))
+
+    def run_command(self, *args):
+        out = StringIO()
+        call_command('send_overdue_notices', *args, stdout=out)
+        return out.getvalue()
+
+    def test_one_mail_per_borrower_with_overdue_loans(self):
+        output = self.run_command('--batch-size', '2')
+        self.assertIn('Sent 5 overdue notices', output)
+        self.assertEqual(5, len(mail.outbox))
+        self.assertEqual(['user0@example.com'], mail.outbox[0].to)
+        self.assertEqual(2, mail.outbox[0].body.count('  - Book Title'))
+        self.assertEqual(5, OverdueNotice.objects.count())
+
+    def test_not_mailed_twice_a_day(self):
+        self.run_command()
+        self.run_command()
+        self.assertEqual(5, len(mail.outbox))
+
+    def test_dry_run(self):
+        self.assertIn('5 borrowers would be notified', self.run_command('--dry-run'))
+        self.assertEqual(0, len(mail.outbox))
+        self.assertFalse(OverdueNotice.objects.exists())
+
+    def test_one_send_per_batch(self):
+        with mock.patch.object(locmem.EmailBackend, 'send_messages', autospec=True,
+                               side_effect=locmem.EmailBackend.send_messages) as send:
+            self.run_command('--batch-size', '2')
+        self.assertEqual([2, 2, 1], [len(call.args[1]) for call in send.call_args_list])
+
+    def test_failed_batch_forgotten_sent_batches_kept(self):
+        send = locmem.EmailBackend.send_messages
+
+        def fail_second_batch(backend, messages):
+            if mail.outbox:
+                raise SMTPException
+            return send(backend, messages)
+
+        with mock.patch.object(locmem.EmailBackend, 'send_messages', fail_second_batch):
+            with self.assertRaises(SMTPException):
+                self.run_command('--batch-size', '2')
+        self.assertEqual(['user0', 'user1'], sorted(OverdueNotice.objects.values_list('borrower__username', flat=True)))
+        self.run_command()
+        self.assertEqual(5, len(mail.outbox))
+
+    def test_borrowers_recorded_by_another_run_are_skipped(self):
+        # As if a concurrent run recorded user1 after this run read its work list.
+        claim = Command.claim
+
+        def claim_after_other_run(batch, today):
+            if not OverdueNotice.objects.exists():
+                OverdueNotice.objects.create(borrower=User.objects.get(username='user1'), sent_on=today, num_loans=2)
+            return claim(batch, today)
+
+        with mock.patch.object(Command, 'claim', staticmethod(claim_after_other_run)):
+            self.assertIn('Sent 4 overdue notices', self.run_command())
+        self.assertNotIn(['user1@example.com'], [message.to for message in mail.outbox])
@@ -0,0 +1,90 @@
+import datetime
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog.models import Author, Book, BookInstance
+from catalog.pagination import CursorPaginator
+
+
+class CursorPaginatorTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for author_id in range(23):
+            Author.objects.create(first_name=f'First {author_id % 3}', last_name=f'Surname {author_id % 7}')
+
+        book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG')
+        today = datetime.date.today()
+        for copy in range(17):
+            due_back = None if copy % 4 == 0 else today + datetime.timedelta(days=copy % 3)
+            BookInstance.objects.create(book=book, imprint='Imprint', due_back=due_back, status='o')
+
+    def walk(self, paginator):
+        """Pages forwards to the end and then backwards to the start."""
+        forwards, page = [], paginator.get_page()
+        self.assertFalse(page.has_previous())
+        while True:
+            forwards.append([obj.pk for obj in page])
+            if not page.has_next():
+                break
+            page = paginator.get_page(page.next_cursor)
+
+        backwards = [forwards[-1]]
+        while page.has_previous():
+            page = paginator.get_page(page.previous_cursor)
+            backwards.append([obj.pk for obj in page])
+        return forwards, list(reversed(backwards))
+
+    def test_authors_follow_meta_ordering(self):
+        paginator = CursorPaginator(Author.objects.all(), 5, ('last_name', 'first_name', 'id'))
+        forwards, backwards = self.walk(paginator)
+        expected = list(Author.objects.order_by('last_name', 'first_name', 'id').values_list('pk', flat=True))
+        self.assertEqual(expected, [pk for page in forwards for pk in page])
+        self.assertEqual(forwards, backwards)
+
+    def test_nullable_key_sorted_last(self):
+        paginator = CursorPaginator(BookInstance.objects.all(), 4, ('due_back', 'id'))
+        forwards, backwards = self.walk(paginator)
+        seen = [pk for page in forwards for pk in page]
+        self.assertEqual(17, len(set(seen)))
+        self.assertEqual(forwards, backwards)
+
+        due_dates = [BookInstance.objects.get(pk=pk).due_back for pk in seen]
+        dated = [due for due in due_dates if due is not None]
+        self.assertEqual(dated, sorted(dated))
+        self.assertTrue(all(due is None for due in due_dates[len(dated):]))
+
+    def test_tampered_cursor_falls_back_to_first_page(self):
+        paginator = CursorPaginator(Author.objects.all(), 5, ('last_name', 'first_name', 'id'))
+        first = paginator.get_page()
+        self.assertEqual(list(first), list(paginator.get_page(first.next_cursor + 'x')))
+
+
+@override_settings(CATALOG_CURSOR_PAGINATION=True)
+class CursorPaginatedListViewTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for author_id in range(13):
+            Author.objects.create(first_name=f'Christian {author_id}', last_name=f'Surname {author_id}')
+
+    def setUp(self):
+        User.objects.create_user(username='testuser1', password='u123456')
+        self.client.login(username='testuser1', password='u123456')
+
+    def test_cursor_pages_without_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('authors'))
+        self.assertTrue(response.context['is_paginated'])
+        self.assertEqual(10, len(response.context['author_list']))
+        self.assertNotContains(response, 'Page 1 of')
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries))
+
+        response = self.client.get(reverse('authors'), {'cursor': response.context['page_obj'].next_cursor})
+        self.assertEqual(3, len(response.context['author_list']))
+        self.assertTrue(response.context['page_obj'].has_previous())
+        self.assertFalse(response.context['page_obj'].has_next())
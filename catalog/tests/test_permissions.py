@@ -0,0 +1,88 @@
+import tempfile
+from io import StringIO
+
+from django.contrib.auth.models import Group, Permission, User
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog import permissions
+from catalog.models import BookInstance
+
+
+class CachedPermissionTest(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(
+            AUTHENTICATION_BACKENDS=['catalog.permissions.CachedPermissionBackend'],
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                                'LOCATION': directory.name}})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = User.objects.create_user(username='librarian', password='1X<ISRUkw+tuK')
+        self.client.login(username='librarian', password='1X<ISRUkw+tuK')
+
+    def status(self):
+        return self.client.get(reverse('all-borrowed')).status_code
+
+    def mark_returned(self):
+        permission, _ = Permission.objects.get_or_create(
+            codename='can_mark_returned', content_type=ContentType.objects.get_for_model(BookInstance),
+            defaults={'name': 'Set book as returned'})
+        return permission
+
+    def test_warm_requests_run_no_permission_queries(self):
+        self.user.user_permissions.add(self.mark_returned())
+        self.assertEqual(200, self.status())
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(200, self.status())
+        self.assertFalse([query['sql'] for query in queries if 'auth_permission' in query['sql']])
+
+    def test_user_permission_changes_apply_at_once(self):
+        self.assertEqual(403, self.status())
+        permission = self.mark_returned()
+        permission.user_set.add(self.user)
+        self.assertEqual(200, self.status())
+        self.user.user_permissions.remove(permission)
+        self.assertEqual(403, self.status())
+
+    def test_groups_command_updates_members(self):
+        Group.objects.create(name='Librarian').user_set.add(self.user)
+        self.assertEqual(403, self.status())
+        call_command('groups', stdout=StringIO())
+        self.assertEqual(200, self.status())
+        Group.objects.get(name='Librarian').permissions.clear()
+        self.assertEqual(403, self.status())
+
+    def test_deactivated_user_loses_permissions(self):
+        self.user.user_permissions.add(self.mark_returned())
+        self.assertEqual(200, self.status())
+        self.user.is_superuser = True
+        self.user.save()
+        self.assertTrue(User.objects.get(pk=self.user.pk).has_perm('catalog.can_maintain'))
+        self.user.is_active = False
+        self.user.save()
+        self.assertFalse(User.objects.get(pk=self.user.pk).has_perm('catalog.can_maintain'))
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_per_process_cache_refused(self):
+        with self.assertRaisesMessage(ImproperlyConfigured, 'needs a cache shared by all processes'):
+            self.user.has_perm('catalog.can_maintain')
+
+
+class PermissionInvalidationOnCommitTest(TransactionTestCase):
+
+    def test_entry_computed_before_commit_is_dropped(self):
+        user = User.objects.create_user(username='librarian')
+        with transaction.atomic():
+            user.user_permissions.add(Permission.objects.get(codename='add_book'))
+            # What another process checking permissions now, before the commit, would store.
+            permissions.cached_permissions(user.pk, set)
+        self.assertEqual({'catalog.add_book'}, permissions.cached_permissions(
+            user.pk, lambda: {'catalog.add_book'}))
@@ -0,0 +1,67 @@
+from django.contrib.auth.models import User, Permission
+from django.contrib.contenttypes.models import ContentType
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog import prefix_index
+from catalog.models import Author, Book, Genre
+
+
+class PrefixIndexTest(TestCase):
+
+    def setUp(self):
+        self.steinbeck = Author.objects.create(first_name='John', last_name='Steinbeck')
+        self.smith = Author.objects.create(first_name='Jane', last_name='Smith')
+        self.stout = Author.objects.create(first_name='Rex', last_name='Stout')
+
+    def labels(self, query):
+        return [entry.label for entry in prefix_index.authors.search(query)]
+
+    def test_single_word_matches_either_name(self):
+        self.assertEqual(['Smith, Jane', 'Steinbeck, John'], self.labels('j'))
+        self.assertEqual(['Steinbeck, John', 'Stout, Rex'], self.labels('St'))
+
+    def test_first_last_and_last_first(self):
+        self.assertEqual(['Steinbeck, John'], self.labels('John St'))
+        self.assertEqual(['Steinbeck, John'], self.labels('Steinbeck, J'))
+        self.assertEqual([], self.labels('Jane St'))
+
+    def test_lookup_without_queries(self):
+        prefix_index.authors.search('')
+        with self.assertNumQueries(0):
+            self.labels('ste')
+
+    def test_invalidated_on_save_and_delete(self):
+        self.assertEqual([], self.labels('Tolk'))
+        tolkien = Author.objects.create(first_name='John', last_name='Tolkien')
+        self.assertEqual(['Tolkien, John'], self.labels('Tolk'))
+        tolkien.delete()
+        self.assertEqual([], self.labels('Tolk'))
+
+    def test_login_does_not_invalidate_usernames(self):
+        User.objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+        prefix_index.usernames.search('')
+        self.client.login(username='reader', password='1X<ISRUkw+tuK')
+        with self.assertNumQueries(0):
+            self.assertEqual(['reader'], [entry.label for entry in prefix_index.usernames.search('rea')])
+
+
+class AutoCompleteViewTest(TestCase):
+
+    def setUp(self):
+        manager = User.objects.create_user(username='manager', password='123456')
+        perm = Permission.objects.create(codename='can_maintain', name='Can edit book index',
+                                         content_type=ContentType.objects.get_for_model(Book))
+        manager.user_permissions.add(perm)
+        self.client.login(username='manager', password='123456')
+        Author.objects.create(first_name='John', last_name='Steinbeck')
+        Genre.objects.create(name='Fantasy')
+
+    def test_author_autocomplete(self):
+        response = self.client.get(reverse('author-autocomplete'), {'q': 'Steinbeck, Jo'})
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(['Steinbeck, John'], [result['text'] for result in response.json()['results']])
+
+    def test_genre_autocomplete(self):
+        response = self.client.get(reverse('genre-autocomplete'), {'q': 'fan'})
+        self.assertEqual(['Fantasy'], [result['text'] for result in response.json()['results']])
@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog import profiling
+from catalog.models import Author
+
+
+def busy(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+class ProfilingTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Author.objects.create(first_name='John', last_name='Smith')
+        User.objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+        User.objects.create_user(username='staff', password='2HJ1vRV0Z&3iD', is_staff=True)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings = override_settings(CATALOG_PROFILE_DIR=self.directory, CATALOG_PROFILE_RATE=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def stored(self):
+        return {name: [os.path.basename(path) for path in paths]
+                for name, paths in profiling.stored_profiles().items()}
+
+    def test_header_profiles_staff_requests_only(self):
+        self.client.login(username='reader', password='1X<ISRUkw+tuK')
+        response = self.client.get(reverse('authors'), HTTP_X_PROFILE='1')
+        self.assertNotIn('X-Profile', response)
+        self.assertEqual({}, self.stored())
+
+        self.client.login(username='staff', password='2HJ1vRV0Z&3iD')
+        response = self.client.get(reverse('authors'), HTTP_X_PROFILE='1')
+        self.assertTrue(response['X-Profile'].startswith('authors' + os.sep))
+        self.assertEqual(['authors'], list(self.stored()))
+
+    @override_settings(CATALOG_PROFILE_RATE=1, CATALOG_PROFILE_KEEP=2)
+    def test_ring_keeps_newest_profiles(self):
+        self.client.login(username='reader', password='1X<ISRUkw+tuK')
+        for _ in range(3):
+            self.client.get(reverse('authors'))
+        names = self.stored()['authors']
+        self.assertEqual(2, len(names))
+        self.assertTrue(all(name.endswith('.pstats') for name in names))
+
+    @override_settings(CATALOG_PROFILE_RATE=1)
+    def test_report_lists_view_functions(self):
+        self.client.login(username='reader', password='1X<ISRUkw+tuK')
+        self.client.get(reverse('authors'))
+        out = StringIO()
+        call_command('profile_report', 'authors', '--top', '200', stdout=out)
+        self.assertIn('authors: 1 cProfile profiles', out.getvalue())
+        self.assertIn('get_queryset', out.getvalue())
+
+    def test_sampled_stacks_are_folded(self):
+        sampler = profiling.StackSampler(0.001)
+        sampler.start()
+        busy(0.05)
+        sampler.stop()
+        path = profiling.save(sampler, 'books')
+        with open(path) as stream:
+            lines = stream.read().splitlines()
+        # Most common stack first.
+        self.assertTrue(lines[0].rsplit(' ', 1)[0].endswith('test_profiling.test_sampled_stacks_are_folded;'
+                                                            'catalog.tests.test_profiling.busy'))
+
+        folded = os.path.join(self.directory, 'merged.folded')
+        out = StringIO()
+        call_command('profile_report', '--sort', 'own', '--folded', folded, stdout=out)
+        hotspot = out.getvalue().splitlines()[1]
+        self.assertTrue(hotspot.endswith('own  catalog.tests.test_profiling.busy'), hotspot)
+        with open(folded) as stream:
+            self.assertTrue(stream.readline().startswith('books;'))
@@ -0,0 +1,53 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command, CommandError
+from django.test import TestCase, override_settings
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ProvisionUsersTest(TestCase):
+
+    def write_csv(self, text):
+        handle, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(handle, 'w') as stream:
+            stream.write(text)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def provision(self, path, *args):
+        out = StringIO()
+        call_command('provision_users', path, *args, stdout=out)
+        return out.getvalue()
+
+    def test_creates_users_in_group_with_hashed_passwords(self):
+        User.objects.create_user(username='existing')
+        path = self.write_csv('username,password,email,first_name,last_name\n'
+                              'alice,1X<ISRUkw+tuK,alice@example.com,Alice,Smith\n'
+                              'bob,,,,\n'
+                              'existing,secret,,,\n'
+                              'alice,again,,,\n')
+        output = self.provision(path, '--processes', '2', '--batch-size', '2')
+        self.assertIn('Created 2 users in Patron', output)
+        self.assertIn('skipped 2 existing or repeated usernames', output)
+
+        alice = User.objects.get(username='alice')
+        self.assertTrue(alice.check_password('1X<ISRUkw+tuK'))
+        self.assertEqual(('alice@example.com', 'Alice', 'Smith'), (alice.email, alice.first_name, alice.last_name))
+        self.assertFalse(User.objects.get(username='bob').has_usable_password())
+        self.assertEqual({'alice': ['Patron'], 'bob': ['Patron'], 'existing': []},
+                         {user.username: [group.name for group in user.groups.all()] for user in User.objects.all()})
+
+    def test_librarians_get_librarian_permissions(self):
+        path = self.write_csv('username,password\ncarol,1X<ISRUkw+tuK\n')
+        self.provision(path, '--group', 'Librarian', '--processes', '1')
+        carol = User.objects.get(username='carol')
+        self.assertTrue(carol.has_perm('catalog.can_mark_returned'))
+        self.assertTrue(carol.has_perm('catalog.can_maintain'))
+
+    def test_missing_username_rejected(self):
+        path = self.write_csv('username,password\n,secret\n')
+        with self.assertRaisesMessage(CommandError, 'Row 2: missing username'):
+            self.provision(path, '--processes', '1')
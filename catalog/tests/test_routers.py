@@ -0,0 +1,109 @@
+import datetime
+import time
+from unittest import mock
+
+from django.contrib.auth.models import Permission, User
+from django.contrib.contenttypes.models import ContentType
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from catalog import routers
+from catalog.models import Author, Book, BookInstance
+
+
+@override_settings(CATALOG_REPLICAS=['replica1'])
+class PrimaryReplicaRouterTest(TestCase):
+
+    def setUp(self):
+        self.router = routers.PrimaryReplicaRouter()
+        routers.health.reset()
+        self.addCleanup(routers.health.reset)
+        self.addCleanup(routers.use_replicas, False)
+        patcher = mock.patch.object(routers.health, 'check', return_value=True)
+        self.check = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reads_use_replica_only_when_allowed(self):
+        self.assertEqual('default', self.router.db_for_read(Book))
+        routers.use_replicas(True)
+        self.assertEqual('replica1', self.router.db_for_read(Book))
+        self.assertIsNone(self.router.db_for_read(User))
+
+    def test_write_moves_remaining_reads_to_primary(self):
+        routers.use_replicas(True)
+        self.assertEqual('default', self.router.db_for_write(Author))
+        self.assertTrue(routers.wrote())
+        self.assertEqual('default', self.router.db_for_read(Book))
+
+    def test_unhealthy_replica_skipped_until_rechecked(self):
+        self.check.return_value = False
+        routers.use_replicas(True)
+        self.assertEqual('default', self.router.db_for_read(Book))
+        self.check.return_value = True
+        self.assertEqual('default', self.router.db_for_read(Book))
+        self.assertEqual(1, self.check.call_count)
+
+        with override_settings(CATALOG_REPLICA_CHECK_INTERVAL=0):
+            self.assertEqual('replica1', self.router.db_for_read(Book))
+
+    def test_unknown_alias_fails_check(self):
+        self.check.side_effect = routers.ReplicaHealth().check
+        self.assertFalse(routers.health.is_healthy('replica1'))
+
+    def test_no_migrations_on_replicas(self):
+        self.assertFalse(self.router.allow_migrate('replica1', 'catalog'))
+        self.assertIsNone(self.router.allow_migrate('default', 'catalog'))
+
+
+@override_settings(CATALOG_REPLICAS=['replica1'])
+class ReplicaRoutingMiddlewareTest(TestCase):
+
+    def setUp(self):
+        routers.health.reset()
+        self.addCleanup(routers.health.reset)
+        patcher = mock.patch.object(routers.health, 'check', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def route(self, request):
+        decisions = []
+
+        def get_response(request):
+            decisions.append(routers.PrimaryReplicaRouter().db_for_read(Book))
+            return HttpResponse()
+
+        routers.ReplicaRoutingMiddleware(get_response)(request)
+        return decisions[0]
+
+    def test_safe_requests_read_replica(self):
+        factory = RequestFactory()
+        self.assertEqual('replica1', self.route(factory.get('/')))
+        self.assertEqual('default', self.route(factory.post('/')))
+        self.assertEqual('default', routers.PrimaryReplicaRouter().db_for_read(Book))
+
+    def test_pinned_client_reads_primary(self):
+        request = RequestFactory().get('/')
+        request.COOKIES[routers.PIN_COOKIE] = str(time.time() + 5)
+        self.assertEqual('default', self.route(request))
+        request.COOKIES[routers.PIN_COOKIE] = str(time.time() - 1)
+        self.assertEqual('replica1', self.route(request))
+
+    def test_librarian_write_pins_client(self):
+        librarian = User.objects.create_user(username='librarian', password='1X<ISRUkw+tuK')
+        librarian.user_permissions.add(Permission.objects.create(
+            codename='can_mark_returned', name='Set book as returned',
+            content_type=ContentType.objects.get_for_model(BookInstance)))
+        book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG')
+        copy = BookInstance.objects.create(book=book, imprint='Imprint', status='o', borrower=librarian,
+                                           due_back=datetime.date.today())
+        self.client.login(username='librarian', password='1X<ISRUkw+tuK')
+
+        response = self.client.post(reverse('renew-book-librarian', kwargs={'pk': copy.pk}),
+                                    {'renewal_date': datetime.date.today() + datetime.timedelta(weeks=2)})
+        self.assertEqual(302, response.status_code)
+        self.assertIn(routers.PIN_COOKIE, response.cookies)
+        self.assertEqual(5, response.cookies[routers.PIN_COOKIE]['max-age'])
+
+        response = self.client.get(reverse('books'))
+        self.assertNotIn(routers.PIN_COOKIE, response.cookies)
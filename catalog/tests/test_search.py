@@ -0,0 +1,67 @@
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog import search
+from catalog.models import Author, Book, Genre
+
+
+class SearchIndexTest(TestCase):
+
+    def setUp(self):
+        self.steinbeck = Author.objects.create(first_name='John', last_name='Steinbeck')
+        self.tolkien = Author.objects.create(first_name='John', last_name='Tolkien')
+        self.novel = Genre.objects.create(name='Novel')
+        self.fantasy = Genre.objects.create(name='Fantasy')
+
+        self.grapes = Book.objects.create(title='The Grapes of Wrath', summary='Dust bowl migrants.',
+                                         isbn='9780143039433', author=self.steinbeck)
+        self.grapes.genre.add(self.novel)
+        self.hobbit = Book.objects.create(title='The Hobbit', summary='A hobbit goes there and back again.',
+                                         isbn='9780547928227', author=self.tolkien)
+        self.hobbit.genre.add(self.fantasy)
+
+    def test_prefix_match_across_fields(self):
+        self.assertEqual([self.grapes.pk], search.search_books('grap'))
+        self.assertEqual([self.hobbit.pk], search.search_books('tolk fant'))
+        self.assertEqual([self.grapes.pk], search.search_books('97801430'))
+        self.assertEqual([], search.search_books('hobbit novel'))
+
+    def test_title_ranks_above_summary(self):
+        Book.objects.create(title='Travel notes', summary='Mentions a hobbit once.', isbn='1', author=None)
+        self.assertEqual(self.hobbit.pk, search.search_books('hobbit')[0])
+
+    def test_incremental_updates(self):
+        self.hobbit.title = 'There and Back Again'
+        self.hobbit.save()
+        self.assertEqual([self.hobbit.pk], search.search_books('again'))
+
+        self.hobbit.genre.add(self.novel)
+        self.assertEqual(2, len(search.search_books('novel')))
+        self.novel.book_set.clear()
+        self.assertEqual([], search.search_books('novel'))
+
+        self.tolkien.last_name = 'Tolkien-Smith'
+        self.tolkien.save()
+        self.assertEqual([self.hobbit.pk], search.search_books('smith'))
+
+        self.grapes.delete()
+        self.assertEqual([], search.search_books('grapes'))
+
+    def test_rebuild_command(self):
+        with search.connection.cursor() as cursor:
+            search.get_backend().clear(cursor)
+        self.assertEqual([], search.search_books('hobbit'))
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual([self.hobbit.pk], search.search_books('hobbit'))
+
+    def test_search_view(self):
+        User.objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+        self.client.login(username='reader', password='1X<ISRUkw+tuK')
+        response = self.client.get(reverse('search'), {'q': 'steinb'})
+        self.assertEqual(200, response.status_code)
+        self.assertEqual([self.grapes], response.context['book_list'])
+        self.assertTemplateUsed(response, 'catalog/book_search.html')
@@ -0,0 +1,79 @@
+import os
+import tempfile
+
+from django.db import connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import SimpleTestCase, override_settings
+
+from catalog import sqlite
+
+
+class SQLiteProfileTest(SimpleTestCase):
+
+    def open(self, **options):
+        path = os.path.join(self.directory.name, 'catalog.db')
+        wrapper = DatabaseWrapper(dict(connection.settings_dict, NAME=path, TEST={}, OPTIONS=options),
+                                  alias='profile-test')
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    @override_settings(CATALOG_SQLITE_PROFILE='production')
+    def test_pragmas_applied_on_connect(self):
+        wrapper = self.open()
+        self.assertEqual('wal', self.pragma(wrapper, 'journal_mode'))
+        self.assertEqual(1, self.pragma(wrapper, 'synchronous'))
+        self.assertEqual(5000, self.pragma(wrapper, 'busy_timeout'))
+        self.assertEqual(-20000, self.pragma(wrapper, 'cache_size'))
+        self.assertEqual(2, self.pragma(wrapper, 'temp_store'))
+
+    @override_settings(CATALOG_SQLITE_PROFILE='production', CATALOG_SQLITE_PRAGMAS={'busy_timeout': 100})
+    def test_pragmas_overridable(self):
+        self.assertEqual(100, self.pragma(self.open(), 'busy_timeout'))
+
+    @override_settings(CATALOG_SQLITE_PROFILE='production')
+    def test_atomic_takes_write_lock_at_begin(self):
+        writer, other = self.open(), self.open()
+        with writer.cursor() as cursor:
+            cursor.execute('CREATE TABLE loans (id INTEGER PRIMARY KEY)')
+        with override_settings(CATALOG_SQLITE_PRAGMAS={'busy_timeout': 0}):
+            other.ensure_connection()
+        with _atomic(writer):
+            with self.assertRaisesMessage(Exception, 'locked'):
+                with _atomic(other):
+                    pass
+
+    def test_immediate_takes_write_lock_under_default_profile(self):
+        writer, other = self.open(), self.open(timeout=0)
+        with sqlite.immediate(writer), _atomic(writer):
+            with self.assertRaisesMessage(Exception, 'locked'):
+                with _atomic(other), other.cursor() as cursor:
+                    cursor.execute('CREATE TABLE loans (id INTEGER PRIMARY KEY)')
+        # Deferred again afterwards: BEGIN alone takes no lock.
+        with _atomic(writer), _atomic(other), other.cursor() as cursor:
+            cursor.execute('CREATE TABLE loans (id INTEGER PRIMARY KEY)')
+
+    def test_default_profile_untouched(self):
+        self.assertEqual('delete', self.pragma(self.open(), 'journal_mode'))
+
+
+class _atomic:
+    """Begins and rolls back a transaction on a DatabaseWrapper outside the connections registry."""
+
+    def __init__(self, wrapper):
+        self.wrapper = wrapper
+
+    def __enter__(self):
+        self.wrapper.ensure_connection()
+        self.wrapper._start_transaction_under_autocommit()
+
+    def __exit__(self, *exc_info):
+        self.wrapper.connection.rollback()
@@ -0,0 +1,81 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog.models import Author, Book, BookInstance, CatalogStats, Genre, Language
+
+
+class CatalogStatsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.novel = Genre.objects.create(name='Novel')
+        cls.poetry = Genre.objects.create(name='Poetry')
+        cls.author = Author.objects.create(first_name='John', last_name='Smith')
+        Language.objects.create(name='English')
+
+    def assertStatsConsistent(self):
+        stats = CatalogStats.current()
+        for field, expected in CatalogStats.compute().items():
+            self.assertEqual(expected, getattr(stats, field), field)
+
+    def create_book(self, title='Book Title'):
+        return Book.objects.create(title=title, summary='Summary', isbn='ABCDEFG', author=self.author)
+
+    def test_row_created_by_migration(self):
+        self.assertStatsConsistent()
+        CatalogStats.rebuild()
+        self.assertStatsConsistent()
+
+    def test_book_and_genre_changes(self):
+        book = self.create_book()
+        book.genre.add(self.novel, self.poetry)
+        self.assertEqual(1, CatalogStats.current().num_novels)
+        book.genre.remove(self.novel)
+        self.assertStatsConsistent()
+        book.genre.add(self.novel)
+        book.genre.clear()
+        self.assertStatsConsistent()
+        self.novel.book_set.add(book)
+        self.assertEqual(1, CatalogStats.current().num_novels)
+        book.delete()
+        self.assertStatsConsistent()
+
+    def test_genre_rename(self):
+        self.create_book().genre.add(self.poetry)
+        self.poetry.name = 'novel'
+        self.poetry.save()
+        self.assertEqual(1, CatalogStats.current().num_novels)
+
+    def test_bookinstance_status_changes(self):
+        book = self.create_book()
+        inst = BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+        self.assertEqual(1, CatalogStats.current().num_instances_available)
+
+        inst = BookInstance.objects.get(pk=inst.pk)
+        inst.status = 'o'
+        inst.save()
+        self.assertStatsConsistent()
+
+        inst.status = 'a'
+        inst.save()
+        inst.delete()
+        self.assertStatsConsistent()
+
+    def test_author_and_language_changes(self):
+        Author.objects.create(last_name='Doe')
+        Language.objects.create(name='French').delete()
+        self.assertStatsConsistent()
+
+    def test_rebuild_command_repairs_drift(self):
+        CatalogStats.objects.update(num_books=42, num_authors=0)
+        call_command('rebuild_stats', stdout=StringIO())
+        self.assertStatsConsistent()
+
+    def test_index_reads_stats_row(self):
+        # stats row, then the new session's key check and insert inside a savepoint
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('index'))
+        self.assertContains(response, '<strong>Authors:</strong> 1')
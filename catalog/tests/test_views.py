@@ -2,6 +2,9 @@ import datetime
 import uuid
 
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from django.test import TestCase
 from django.urls import reverse
@@ -334,3 +337,86 @@ class AuthorCreateTest(TestCase):
                                         'date_of_death': datetime.date(year=1968, month=12, day=20),
                                     })
         self.assertRedirects(response, reverse('authors'))
+
+
+class BookDetailViewTest(TestCase):
+
+    def setUp(self):
+        User.objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+        self.client.login(username='reader', password='1X<ISRUkw+tuK')
+
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        self.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG', author=author)
+        self.book.genre.set([Genre.objects.create(name='Fantasy'), Genre.objects.create(name='Novel')])
+
+    def add_copies(self, number, status='a'):
+        BookInstance.objects.bulk_create(
+            BookInstance(book=self.book, imprint='Unlikely Imprint, 2016', status=status) for _ in range(number)
+        )
+
+    def num_queries(self):
+        # bulk_create sends no signals, so render without the fragment cache.
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('book-detail', kwargs={'pk': self.book.pk}))
+        self.assertEqual(200, response.status_code)
+        return len(queries)
+
+    def test_query_count_independent_of_copies(self):
+        self.add_copies(2)
+        few = self.num_queries()
+        self.add_copies(60, status='o')
+        self.assertEqual(few, self.num_queries())
+
+    def test_status_counts_and_pagination(self):
+        self.add_copies(15)
+        self.add_copies(10, status='o')
+        response = self.client.get(reverse('book-detail', kwargs={'pk': self.book.pk}))
+        self.assertEqual([('Available', 15), ('On loan', 10)], response.context['copy_status_counts'])
+        self.assertTrue(response.context['is_paginated'])
+        self.assertEqual(20, len(response.context['copies']))
+
+        response = self.client.get(reverse('book-detail', kwargs={'pk': self.book.pk}), {'page': 2})
+        self.assertEqual(5, len(response.context['copies']))
+
+
+class AuthorDetailViewTest(TestCase):
+
+    def setUp(self):
+        User.objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+        self.client.login(username='reader', password='1X<ISRUkw+tuK')
+        self.author = Author.objects.create(first_name='John', last_name='Smith')
+
+    def add_books(self, number, copies=3):
+        for book_id in range(number):
+            book = Book.objects.create(title=f'Book {book_id:03}', summary='Summary', isbn='ABCDEFG',
+                                       author=self.author)
+            BookInstance.objects.bulk_create(
+                BookInstance(book=book, imprint='Imprint', status='a' if copy else 'o') for copy in range(copies)
+            )
+
+    def get(self, **params):
+        return self.client.get(reverse('author-detail', kwargs={'pk': self.author.pk}), params)
+
+    def test_copy_counts_annotated(self):
+        self.add_books(1)
+        response = self.get()
+        book = response.context['books'][0]
+        self.assertEqual(3, book.total_copies)
+        self.assertEqual(2, book.available_count)
+        self.assertContains(response, '2 of 3 available')
+
+    def test_query_count_fixed(self):
+        self.add_books(10)
+        self.get()
+        cache.clear()
+        # session, user, author, book count, two permission lookups, annotated book page
+        with self.assertNumQueries(7):
+            response = self.get()
+        self.assertEqual(10, len(response.context['books']))
+
+    def test_pagination(self):
+        self.add_books(13, copies=1)
+        response = self.get(page=2)
+        self.assertTrue(response.context['is_paginated'])
+        self.assertEqual(3, len(response.context['books']))
@@ -0,0 +1,82 @@
+import tempfile
+
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog import visits
+from catalog.models import VisitCount
+
+
+class BufferedVisitCounterTest(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(
+            CATALOG_VISIT_COUNTER='buffered',
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                                'LOCATION': directory.name}})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        visits.buffered_counter.reset()
+        self.addCleanup(visits.buffered_counter.reset)
+        self.user = User.objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+        self.client.login(username='reader', password='1X<ISRUkw+tuK')
+
+    def visit(self):
+        return self.client.get(reverse('index')).context['num_visits']
+
+    def test_counts_without_writing_the_session(self):
+        self.assertEqual([0, 1, 2], [self.visit() for _ in range(3)])
+        with CaptureQueriesContext(connection) as queries:
+            self.visit()
+        self.assertFalse(any(query['sql'].startswith(('UPDATE', 'INSERT')) for query in queries))
+
+    def test_flush_persists_counts(self):
+        for _ in range(3):
+            self.visit()
+        self.assertEqual(3, visits.buffered_counter.flush())
+        self.assertEqual(3, VisitCount.objects.get(key=f'user:{self.user.pk}').count)
+
+        visits.buffered_counter.reset()
+        empty = tempfile.TemporaryDirectory()
+        self.addCleanup(empty.cleanup)
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                                                   'LOCATION': empty.name}}):
+            # A cache that lost the total starts again from the stored count.
+            self.assertEqual(3, self.visit())
+
+    def test_flushed_in_request_when_threshold_reached(self):
+        visits.buffered_counter.flush_threshold = 2
+        self.addCleanup(delattr, visits.buffered_counter, 'flush_threshold')
+        self.visit()
+        self.visit()
+        self.assertEqual(2, VisitCount.objects.get().count)
+
+    def test_workers_share_the_total(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        workers = visits.BufferedVisitCounter(), visits.BufferedVisitCounter()
+        self.assertEqual([0, 1, 2, 3], [workers[number % 2].record(request) for number in range(4)])
+
+    def test_anonymous_visitors_keyed_by_cookie(self):
+        self.client.logout()
+        sessions = Session.objects.count()
+        self.assertEqual([0, 1], [self.visit() for _ in range(2)])
+        self.assertIn(visits.VISITOR_COOKIE, self.client.cookies)
+        self.assertEqual(sessions, Session.objects.count())
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_per_process_cache_refused(self):
+        with self.assertRaisesMessage(ImproperlyConfigured, 'needs a cache shared by all processes'):
+            visits.get_counter()
+
+    @override_settings(CATALOG_VISIT_COUNTER='session')
+    def test_session_counter(self):
+        self.assertEqual([0, 1], [self.visit() for _ in range(2)])
+        self.assertEqual(2, self.client.session['num_visits'])
@@ -4,11 +4,15 @@ from . import views
 urlpatterns = [
     path('', views.index, name='index'),
     path('books/', views.BookListView.as_view(), name='books'),
+    path('search/', views.BookSearchView.as_view(), name='search'),
     path('book/<int:pk>', views.BookDetailView.as_view(), name='book-detail'),
     path('authors/', views.AuthorListView.as_view(), name='authors'),
     path('author/<int:pk>', views.AuthorDetailView.as_view(), name='author-detail'),
     path('mybooks/', views.LoanedBooksByUserListView.as_view(), name='my-borrowed'),
     path('borrowed/', views.LoanedBooksListView.as_view(), name='all-borrowed'),
+    path('myholds/', views.HoldsByUserListView.as_view(), name='my-holds'),
+    path('book/<int:pk>/hold/', views.place_hold, name='place-hold'),
+    path('hold/<int:pk>/cancel/', views.cancel_hold, name='cancel-hold'),
     path('book/<uuid:pk>/renew/', views.renew_book_librarian, name='renew-book-librarian'),
     path('author/create/', views.AuthorCreate.as_view(), name='author_create'),
     path('author/<int:pk>/update/', views.AuthorUpdate.as_view(), name='author_update'),
@@ -17,6 +21,11 @@ urlpatterns = [
     path('book/<int:pk>/update/', views.BookUpdate.as_view(), name='book_update'),
     path('book/<int:pk>/delete/', views.BookDelete.as_view(), name='book_delete'),
     path('book/<uuid:pk>/manage/', views.manage_book_librarian, name='manage-book-librarian'),
+    path('export/books/', views.export_books, name='export-books'),
+    path('export/authors/', views.export_authors, name='export-authors'),
+    path('export/circulation/', views.export_bookinstances, name='export-circulation'),
+    path('api/books/', views.api_books, name='api-books'),
+    path('api/books/<int:pk>/', views.api_book, name='api-book'),
 ]
 
 urlpatterns += [
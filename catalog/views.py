@@ -1,73 +1,155 @@
 import datetime
 from django.contrib.auth.decorators import login_required, permission_required
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
-from django.contrib.auth.models import User
-from django.db.models import Q
-from django.http import HttpResponseRedirect
+from django.core.paginator import Paginator
+from django.db.models import Count
+from django.http import Http404, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404
 from django.urls import reverse, reverse_lazy
+from django.utils.functional import SimpleLazyObject
 from django.views import generic
+from django.views.decorators.http import condition, require_GET, require_POST
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 
 from dal import autocomplete
 
-from .models import Book, BookInstance, Author, Language, Genre
+from .models import Book, BookInstance, Author, CatalogStats, Hold
 from catalog.forms import RenewBookForm, ChangeBookStatusForm, BookForm
+from catalog import api, circulation, conditional, exports, facets, prefix_index, search, visits
+from catalog.pagination import CursorPaginationMixin
 
 
 # @login_required
 def index(request):
-    num_books = Book.objects.count()
-    num_instances = BookInstance.objects.count()
-    num_instances_avail = BookInstance.objects.filter(status__exact='a').count()
-    num_authors = Author.objects.count()
-    num_languages = Language.objects.count()
+    stats = CatalogStats.current()
 
-    num_novels = Book.objects.filter(genre__name__iexact='novel').count()
-
-    num_visits = request.session.get('num_visits', 0)
-    request.session['num_visits'] = num_visits + 1
+    num_visits = visits.record_visit(request)
 
     context = {
-        'num_books': num_books,
-        'num_instances': num_instances,
-        'num_instances_available': num_instances_avail,
-        'num_authors': num_authors,
-        'num_languages': num_languages,
-        'num_novels': num_novels,
+        'num_books': stats.num_books,
+        'num_instances': stats.num_instances,
+        'num_instances_available': stats.num_instances_available,
+        'num_authors': stats.num_authors,
+        'num_languages': stats.num_languages,
+        'num_novels': stats.num_novels,
         'num_visits': num_visits,
     }
 
-    return render(request, 'index.html', context=context)
+    return visits.set_visitor_cookie(request, render(request, 'index.html', context=context))
 
 
-class BookListView(LoginRequiredMixin, generic.ListView):
+@conditional.conditional_page(conditional.book_list)
+class BookListView(LoginRequiredMixin, CursorPaginationMixin, generic.ListView):
     model = Book
+    queryset = Book.objects.select_related('author')
+    paginate_by = 10
+    cursor_ordering = ('id',)
+
+    def get_queryset(self):
+        self.selection = facets.selected(self.request.GET)
+        return facets.filter_books(super(BookListView, self).get_queryset(), self.selection)
+
+    def get_context_data(self, **kwargs):
+        context = super(BookListView, self).get_context_data(**kwargs)
+        # Counted only when the book list fragment is rendered rather than served from the cache.
+        context['facets'] = SimpleLazyObject(lambda: facets.facet_counts(self.selection))
+        context['filter_query'] = facets.query_string(self.selection)
+        return context
+
+
+class BookSearchView(LoginRequiredMixin, generic.ListView):
+    """Ranked full-text search over titles, summaries, ISBNs, authors and genres."""
+    template_name = 'catalog/book_search.html'
+    context_object_name = 'book_list'
     paginate_by = 10
+    max_results = 500
 
+    def get_query(self):
+        return self.request.GET.get('q', '').strip()
 
-class AuthorListView(LoginRequiredMixin, generic.ListView):
+    def get_queryset(self):
+        # Ranked ids only; the books themselves are loaded for the current page.
+        return search.search_books(self.get_query(), limit=self.max_results)
+
+    def get_context_data(self, **kwargs):
+        context = super(BookSearchView, self).get_context_data(**kwargs)
+        ids = context['object_list']
+        books = Book.objects.select_related('author').in_bulk(ids)
+        context['book_list'] = context['object_list'] = [books[pk] for pk in ids if pk in books]
+        context['q'] = self.get_query()
+        return context
+
+
+@conditional.conditional_page(conditional.author_list)
+class AuthorListView(LoginRequiredMixin, CursorPaginationMixin, generic.ListView):
     model = Author
     paginate_by = 10
+    cursor_ordering = ('last_name', 'first_name', 'id')
 
 
-class BookDetailView(LoginRequiredMixin, generic.DetailView):
+@conditional.conditional_page(conditional.book_detail)
+class BookDetailView(LoginRequiredMixin, conditional.ValidatedObjectMixin, generic.DetailView):
     model = Book
+    # Genres are left to the template, so a cached fragment spares their query.
+    queryset = Book.objects.select_related('author')
+    copies_paginate_by = 20
+
+    def get_context_data(self, **kwargs):
+        context = super(BookDetailView, self).get_context_data(**kwargs)
+        copies = self.object.bookinstance_set.order_by('status', 'due_back', 'id')
+
+        status_counts = copies.order_by().values_list('status').annotate(Count('id'))
+        labels = dict(BookInstance.LOAN_STATUS)
+        context['copy_status_counts'] = [
+            (labels.get(status, status), count) for status, count in sorted(status_counts)
+        ]
+
+        paginator = Paginator(copies, self.copies_paginate_by)
+        # The per-status counts already add up to the total, so spare the paginator its COUNT query.
+        paginator.count = sum(count for _, count in context['copy_status_counts'])
+        page = paginator.get_page(self.request.GET.get('page'))
+        context.update({
+            'paginator': paginator,
+            'page_obj': page,
+            'is_paginated': page.has_other_pages(),
+            'copies': page.object_list,
+        })
+        return context
 
 
-class AuthorDetailView(LoginRequiredMixin, generic.DetailView):
+@conditional.conditional_page(conditional.author_detail)
+class AuthorDetailView(LoginRequiredMixin, conditional.ValidatedObjectMixin, generic.DetailView):
     model = Author
+    books_paginate_by = 10
+
+    def get_context_data(self, **kwargs):
+        context = super(AuthorDetailView, self).get_context_data(**kwargs)
+        # Availability comes from the books' copy counters, so no join or grouping is needed.
+        books = self.object.book_set.order_by('title', 'id')
+
+        paginator = Paginator(books, self.books_paginate_by)
+        page = paginator.get_page(self.request.GET.get('page'))
+        context.update({
+            'paginator': paginator,
+            'page_obj': page,
+            'is_paginated': page.has_other_pages(),
+            'books': page.object_list,
+        })
+        return context
 
 
-class LoanedBooksByUserListView(LoginRequiredMixin, generic.ListView):
+@conditional.conditional_page(conditional.borrowed_by_user)
+class LoanedBooksByUserListView(LoginRequiredMixin, CursorPaginationMixin, generic.ListView):
     model = BookInstance
     template_name = 'catalog/bookinstance_list_borrowed_user.html'
     paginate_by = 10
+    cursor_ordering = ('due_back', 'id')
 
     def get_queryset(self):
         return BookInstance.objects\
             .filter(borrower=self.request.user)\
             .filter(status__exact='o')\
+            .select_related('book')\
             .order_by('due_back')
 
     def get_context_data(self, *, object_list=None, **kwargs):
@@ -77,15 +159,53 @@ class LoanedBooksByUserListView(LoginRequiredMixin, generic.ListView):
         return context
 
 
-class LoanedBooksListView(PermissionRequiredMixin, generic.ListView):
+class HoldsByUserListView(LoginRequiredMixin, generic.ListView):
+    model = Hold
+    template_name = 'catalog/hold_list_patron.html'
+    paginate_by = 10
+
+    def get_queryset(self):
+        holds = Hold.objects\
+            .filter(patron=self.request.user, status__in=['w', 'r'])\
+            .select_related('book', 'copy')\
+            .order_by('-status', 'placed_at')
+        return circulation.with_queue_positions(holds)
+
+
+@login_required
+@require_POST
+def place_hold(request, pk):
+    book = get_object_or_404(Book, pk=pk)
+    try:
+        circulation.place_hold(book, request.user)
+    except circulation.CirculationConflict:
+        pass  # The existing hold is listed on the holds page.
+    return HttpResponseRedirect(reverse('my-holds'))
+
+
+@login_required
+@require_POST
+def cancel_hold(request, pk):
+    hold = get_object_or_404(Hold, pk=pk, patron=request.user)
+    try:
+        circulation.cancel_hold(hold)
+    except circulation.CirculationConflict:
+        pass  # Already collected or cancelled, and so no longer listed.
+    return HttpResponseRedirect(reverse('my-holds'))
+
+
+@conditional.conditional_page(conditional.all_borrowed, permission='catalog.can_mark_returned')
+class LoanedBooksListView(PermissionRequiredMixin, CursorPaginationMixin, generic.ListView):
     permission_required = 'catalog.can_mark_returned'
     model = BookInstance
     template_name = 'catalog/loaned_librarian.html'
     paginate_by = 10
+    cursor_ordering = ('due_back', 'id')
 
     def get_queryset(self):
         return BookInstance.objects\
             .filter(status__exact='o')\
+            .select_related('book', 'borrower')\
             .order_by('due_back')
 
 
@@ -93,15 +213,18 @@ class LoanedBooksListView(PermissionRequiredMixin, generic.ListView):
 @permission_required('catalog.can_mark_returned', raise_exception=True)
 def renew_book_librarian(request, pk):
     book_instance = get_object_or_404(BookInstance, pk=pk)
+    status = 200
 
     if request.method == 'POST':
         form = RenewBookForm(request.POST)
 
         if form.is_valid():
-            book_instance.due_back = form.cleaned_data['renewal_date']
-            book_instance.save()
-
-            return HttpResponseRedirect(reverse('all-borrowed'))
+            try:
+                circulation.renew(book_instance, form.cleaned_data['renewal_date'])
+                return HttpResponseRedirect(reverse('all-borrowed'))
+            except circulation.CirculationConflict as conflict:
+                form.add_error(None, str(conflict))
+                status = 409
     else:
         default_renewal_date = datetime.date.today() + datetime.timedelta(weeks=3)
         form = RenewBookForm(initial={'renewal_date': default_renewal_date})
@@ -111,35 +234,121 @@ def renew_book_librarian(request, pk):
      'book_instance': book_instance,
     }
 
-    return render(request, 'catalog/book_renew_librarian.html', context)
+    return render(request, 'catalog/book_renew_librarian.html', context, status=status)
 
 
 @login_required
 @permission_required('catalog.can_mark_returned', raise_exception=True)
 def manage_book_librarian(request, pk):
     book_instance = get_object_or_404(BookInstance, pk=pk)
+    status = 200
 
     if request.method == 'POST':
         form = ChangeBookStatusForm(request.POST)
 
         if form.is_valid():
-            status = form.cleaned_data['status']
-            book_instance.status = status
-            if book_instance.status == 'o':
-                book_instance.borrower = form.cleaned_data['borrower']
-                book_instance.due_back = form.cleaned_data['due_back']
-            book_instance.save()
-            return HttpResponseRedirect(reverse('book-detail', kwargs={'pk': book_instance.book.pk}))
+            try:
+                _change_status(book_instance, form.cleaned_data)
+                return HttpResponseRedirect(reverse('book-detail', kwargs={'pk': book_instance.book_id}))
+            except circulation.CirculationConflict as conflict:
+                # Show the current status and expect it on resubmission.
+                book_instance.refresh_from_db()
+                form = ChangeBookStatusForm(dict(request.POST.dict(), expected_status=book_instance.status))
+                form.is_valid()
+                form.add_error(None, str(conflict))
+                status = 409
 
     else:
-        form = ChangeBookStatusForm()
+        form = ChangeBookStatusForm(initial={'expected_status': book_instance.status})
 
     context = {
         'form': form,
         'book_instance': book_instance,
     }
 
-    return render(request, 'catalog/book_manage_librarian.html', context)
+    return render(request, 'catalog/book_manage_librarian.html', context, status=status)
+
+
+def _change_status(book_instance, data):
+    expected = data['expected_status'] or book_instance.status
+    if data['status'] == 'o':
+        circulation.checkout(book_instance, data['borrower'], data['due_back'], expected_status=expected)
+    elif expected == 'o':
+        circulation.check_in(book_instance, data['status'])
+    else:
+        circulation.set_status(book_instance, data['status'], expected_status=expected)
+
+
+def _export_response(rows, name, fmt):
+    if fmt not in exports.ENCODERS:
+        raise Http404(f'Unknown export format {fmt}')
+    encode, content_type = exports.ENCODERS[fmt]
+    response = StreamingHttpResponse(encode(rows), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{name}.{fmt}"'
+    return response
+
+
+@login_required
+@permission_required('catalog.can_maintain', raise_exception=True)
+def export_books(request):
+    return _export_response(exports.book_rows(), 'books', request.GET.get('format', 'csv'))
+
+
+@login_required
+@permission_required('catalog.can_maintain', raise_exception=True)
+def export_authors(request):
+    return _export_response(exports.author_rows(), 'authors', request.GET.get('format', 'csv'))
+
+
+@login_required
+@permission_required('catalog.can_mark_returned', raise_exception=True)
+def export_bookinstances(request):
+    """Exports every copy, or only those on loan with ``?status=o``."""
+    queryset = BookInstance.objects.all()
+    status = request.GET.get('status')
+    if status:
+        queryset = queryset.filter(status__exact=status)
+    return _export_response(exports.bookinstance_rows(queryset=queryset), 'circulation',
+                            request.GET.get('format', 'csv'))
+
+
+def _kiosk_request(request, pk=None):
+    """Parses the request and loads its books once, for both the ETag and the response."""
+    if not hasattr(request, 'kiosk_books'):
+        try:
+            ids, isbns = ([pk], []) if pk is not None else api.requested_keys(request.GET)
+            request.kiosk_books = (api.load_books(ids, isbns), ids, isbns)
+        except api.BatchError as error:
+            request.kiosk_books = error
+    return request.kiosk_books
+
+
+def _kiosk_etag(request, pk=None):
+    loaded = _kiosk_request(request, pk)
+    if isinstance(loaded, api.BatchError) or (pk is not None and not loaded[0]):
+        return None
+    return api.etag(*loaded)
+
+
+@login_required
+@require_GET
+@condition(etag_func=_kiosk_etag)
+def api_books(request):
+    """Availability of up to ``api.MAX_BATCH`` books by ``?id=`` or ``?isbn=``."""
+    loaded = _kiosk_request(request)
+    if isinstance(loaded, api.BatchError):
+        return JsonResponse({'error': str(loaded)}, status=400)
+    return JsonResponse(api.batch_payload(*loaded))
+
+
+@login_required
+@require_GET
+@condition(etag_func=_kiosk_etag)
+def api_book(request, pk):
+    books, _, _ = _kiosk_request(request, pk)
+    if not books:
+        raise Http404('No book found matching the query')
+    return JsonResponse(dict(api.serialize(books)[0], statuses=dict(BookInstance.LOAN_STATUS)))
 
 
 class AuthorCreate(PermissionRequiredMixin, CreateView):
@@ -192,20 +401,8 @@ class AuthorAutoComplete(PermissionRequiredMixin, autocomplete.Select2QuerySetVi
     permission_required = 'catalog.can_maintain'
 
     def get_queryset(self):
-
-        if self.q:
-            if ' ' not in self.q:
-                qs = Author.objects.all()\
-                    .filter(Q(first_name__istartswith=self.q) | Q(last_name__istartswith=self.q))
-            else:
-                names = self.q.split(' ')
-                qs = Author.objects.all() \
-                    .filter(Q(first_name__istartswith=names[0]) | Q(last_name__istartswith=names[1]))
-
-        else:
-            qs = Author.objects.all()
-
-        return qs
+        # Matches "First Last", "Last, First" and either name alone, from memory.
+        return prefix_index.authors.search(self.q)
 
 
 class GenreAutoComplete(PermissionRequiredMixin, autocomplete.Select2QuerySetView):
@@ -213,12 +410,7 @@ class GenreAutoComplete(PermissionRequiredMixin, autocomplete.Select2QuerySetVie
     permission_required = 'catalog.can_maintain'
 
     def get_queryset(self):
-        qs = Genre.objects.all()
-
-        if self.q:
-            qs = qs.filter(name__istartswith=self.q)
-
-        return qs
+        return prefix_index.genres.search(self.q)
 
 
 class UserIdAutoComplete(PermissionRequiredMixin, autocomplete.Select2QuerySetView):
@@ -226,9 +418,4 @@ class UserIdAutoComplete(PermissionRequiredMixin, autocomplete.Select2QuerySetVi
     permission_required = 'catalog.can_mark_returned'
 
     def get_queryset(self):
-        qs = User.objects.all()
-
-        if self.q:
-            qs = qs.filter(username__istartswith=self.q)
-
-        return qs
+        return prefix_index.usernames.search(self.q)
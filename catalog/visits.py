@@ -0,0 +1,165 @@
+"""
+Home page visit counters.
+
+Counting visits in the session meant an UPDATE of ``django_session`` on
+every home page view. ``BufferedVisitCounter`` instead keeps each visitor's
+running total in the shared cache, where every worker increments the same
+counter, and adds the increments to an in-process buffer. The buffer is
+written to ``VisitCount`` in one transaction by the ``record`` call that
+finds it past ``flush_threshold`` visits or ``flush_interval`` seconds
+old, so flushing needs no request signal and works the same under WSGI and
+ASGI. A total missing from the cache is read back from ``VisitCount``; it
+then misses the visits other processes have not flushed yet.
+
+Anonymous visitors are told apart by a long-lived cookie rather than a
+session key, which would mean saving a session on their first visit.
+
+The buffered counter needs a cache shared by all processes (see
+catalog.caching), so settings only select it when ``DJANGO_CACHE_BACKEND``
+is set. ``CATALOG_VISIT_COUNTER = 'session'``, the default otherwise,
+counts visits in each visitor's session as before.
+"""
+import atexit
+import logging
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import F
+
+from . import caching
+from .models import VisitCount
+
+
+logger = logging.getLogger('catalog.visits')
+
+VISITOR_COOKIE = 'catalog_visitor'
+VISITOR_COOKIE_AGE = 365 * 24 * 60 * 60
+
+_VISITOR_ID = re.compile(r'[0-9a-f]{32}')
+
+
+def visitor_key(request):
+    """Identifies the visitor: the user id when logged in, otherwise the session key or visitor cookie."""
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    if request.session.session_key:
+        return f'session:{request.session.session_key}'
+    visitor = request.COOKIES.get(VISITOR_COOKIE, '')
+    if not _VISITOR_ID.fullmatch(visitor):
+        visitor = request.new_visitor = uuid.uuid4().hex
+    return f'visitor:{visitor}'
+
+
+def set_visitor_cookie(request, response):
+    """Gives a visitor first identified in this request their cookie."""
+    visitor = getattr(request, 'new_visitor', None)
+    if visitor:
+        response.set_cookie(VISITOR_COOKIE, visitor, max_age=VISITOR_COOKIE_AGE, httponly=True, samesite='Lax')
+    return response
+
+
+class SessionVisitCounter:
+    """Counts visits in the session itself; every visit writes the session."""
+
+    def record(self, request):
+        num_visits = request.session.get('num_visits', 0)
+        request.session['num_visits'] = num_visits + 1
+        return num_visits
+
+
+class BufferedVisitCounter:
+    flush_threshold = 500
+    flush_interval = 10
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = Counter()
+        self._last_flush = time.monotonic()
+
+    def record(self, request):
+        """Counts a visit and returns the number of earlier visits, as the session counter did."""
+        key = visitor_key(request)
+        total_key = f'catalog:visits:{key}'
+        try:
+            total = cache.incr(total_key)
+        except ValueError:
+            stored = VisitCount.objects.filter(key=key).values_list('count', flat=True).first() or 0
+            with self._lock:
+                stored += self._pending[key]
+            # Another process may restore the total first; theirs wins.
+            cache.add(total_key, stored, None)
+            total = cache.incr(total_key)
+
+        with self._lock:
+            self._pending[key] += 1
+        if self.flush_due():
+            try:
+                self.flush()
+            except Exception:
+                # The increments stay buffered for the next attempt; the page is still served.
+                logger.exception('Flushing visit counts failed')
+        return total - 1
+
+    def flush_due(self):
+        with self._lock:
+            return bool(self._pending) and (
+                sum(self._pending.values()) >= self.flush_threshold
+                or time.monotonic() - self._last_flush >= self.flush_interval)
+
+    def flush(self):
+        """Writes the pending increments to the database in one transaction."""
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._last_flush = time.monotonic()
+        if not pending:
+            return 0
+
+        try:
+            with transaction.atomic():
+                VisitCount.objects.bulk_create(
+                    [VisitCount(key=key, count=0) for key in pending], ignore_conflicts=True)
+                for key, increment in pending.items():
+                    VisitCount.objects.filter(key=key).update(count=F('count') + increment)
+        except Exception:
+            with self._lock:
+                self._pending.update(pending)
+            raise
+        return sum(pending.values())
+
+    def reset(self):
+        with self._lock:
+            self._pending.clear()
+
+
+buffered_counter = BufferedVisitCounter()
+session_counter = SessionVisitCounter()
+
+
+def get_counter():
+    if getattr(settings, 'CATALOG_VISIT_COUNTER', 'session') == 'session':
+        return session_counter
+    if not caching.shared():
+        raise ImproperlyConfigured('The buffered visit counter needs a cache shared by all processes; '
+                                   "set DJANGO_CACHE_BACKEND or CATALOG_VISIT_COUNTER = 'session'.")
+    return buffered_counter
+
+
+def record_visit(request):
+    return get_counter().record(request)
+
+
+def _flush_at_exit():
+    try:
+        buffered_counter.flush()
+    except Exception:
+        pass
+
+
+atexit.register(_flush_at_exit)
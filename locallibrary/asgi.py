@@ -0,0 +1,21 @@
+"""
+ASGI config for locallibrary project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+The Procfile serves it with uvicorn workers.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
+"""
+
+import os
+
+import django
+
+from catalog.asgi import CatalogASGIHandler
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'locallibrary.settings')
+
+django.setup(set_prefix=False)
+
+application = CatalogASGIHandler()
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
 import dj_database_url
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
@@ -40,7 +41,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'catalog',
+    'catalog.apps.CatalogConfig',
     'dal',
     'dal_select2',
 ]
@@ -48,10 +49,13 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'catalog.instrumentation.QueryBudgetMiddleware',
+    'catalog.routers.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'catalog.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -91,6 +95,31 @@ DATABASES = {
 }
 
 
+# Sessions and cache
+# Set DJANGO_SESSION_ENGINE=django.contrib.sessions.backends.cached_db to read
+# sessions from the cache and only write through to the database on change.
+
+SESSION_ENGINE = os.environ.get('DJANGO_SESSION_ENGINE', 'django.contrib.sessions.backends.db')
+
+# LocMemCache is private to each process. With more than one worker, set
+# DJANGO_CACHE_BACKEND to a shared backend; see catalog.caching.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', 'locallibrary'),
+    }
+}
+
+
+# Caches each user's permissions in CACHES; see catalog.permissions. The
+# backend refuses a per-process cache, so it is only used when
+# DJANGO_CACHE_BACKEND names a shared one.
+AUTHENTICATION_BACKENDS = ['django.contrib.auth.backends.ModelBackend']
+if 'DJANGO_CACHE_BACKEND' in os.environ:
+    AUTHENTICATION_BACKENDS = ['catalog.permissions.CachedPermissionBackend']
+CATALOG_PERMISSION_CACHE_TIMEOUT = int(os.environ.get('CATALOG_PERMISSION_CACHE_TIMEOUT', 300))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -133,6 +162,24 @@ STATIC_URL = '/static/'
 
 LOGIN_REDIRECT_URL = '/'
 
+# Catalog settings
+
+# Keyset pagination for the list views: constant cost per page, but no page numbers.
+CATALOG_CURSOR_PAGINATION = os.environ.get('CATALOG_CURSOR_PAGINATION', 'False').lower() == 'true'
+
+# 'buffered' counts home page visits in the shared cache and writes them in
+# batches; 'session' writes the session on every visit. See catalog.visits.
+CATALOG_VISIT_COUNTER = os.environ.get(
+    'CATALOG_VISIT_COUNTER', 'buffered' if 'DJANGO_CACHE_BACKEND' in os.environ else 'session')
+
+# Threads running the blocking work under ASGI (locallibrary.asgi), and
+# threads running the middleware around the async views; see catalog.asgi.
+CATALOG_ASGI_THREADS = int(os.environ.get('CATALOG_ASGI_THREADS', 8))
+CATALOG_ASGI_REQUEST_THREADS = int(os.environ.get('CATALOG_ASGI_REQUEST_THREADS', 64))
+
+# Lifetime of cached list and detail page fragments; signals invalidate them sooner on change.
+CATALOG_FRAGMENT_CACHE_TIMEOUT = int(os.environ.get('CATALOG_FRAGMENT_CACHE_TIMEOUT', 3600))
+
 # Email settings
 
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -148,6 +195,31 @@ ADMINS = [('Andre', os.environ.get('ADMIN_EMAIL', 'andre@example.com'))]
 db_from_env = dj_database_url.config(conn_max_age=500)
 DATABASES['default'].update(db_from_env)
 
+# Read replicas for the catalog views, as comma separated database URLs; see catalog.routers.
+CATALOG_REPLICAS = []
+for number, url in enumerate(filter(None, os.environ.get('CATALOG_REPLICA_URLS', '').split(',')), start=1):
+    DATABASES[f'replica{number}'] = dict(dj_database_url.parse(url.strip(), conn_max_age=500),
+                                          TEST={'MIRROR': 'default'})
+    CATALOG_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['catalog.routers.PrimaryReplicaRouter']
+CATALOG_PRIMARY_PIN_SECONDS = int(os.environ.get('CATALOG_PRIMARY_PIN_SECONDS', 5))
+CATALOG_REPLICA_CHECK_INTERVAL = int(os.environ.get('CATALOG_REPLICA_CHECK_INTERVAL', 10))
+
+# 'production' applies WAL, tuned pragmas and immediate transactions to every SQLite connection; see catalog.sqlite.
+CATALOG_SQLITE_PROFILE = os.environ.get('CATALOG_SQLITE_PROFILE', 'default')
+
+# Share of requests profiled, 'cprofile' or 'sampling', and where the newest profiles per URL name are kept.
+# Staff requests with an X-Profile header are always profiled; see catalog.profiling.
+CATALOG_PROFILE_RATE = float(os.environ.get('CATALOG_PROFILE_RATE', 0))
+CATALOG_PROFILER = os.environ.get('CATALOG_PROFILER', 'cprofile')
+CATALOG_PROFILE_INTERVAL = float(os.environ.get('CATALOG_PROFILE_INTERVAL', 0.005))
+CATALOG_PROFILE_DIR = os.environ.get('CATALOG_PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'catalog-profiles'))
+CATALOG_PROFILE_KEEP = int(os.environ.get('CATALOG_PROFILE_KEEP', 20))
+
 # Simplified static file serving.
 # https://warehouse.python.org/project/whitenoise/
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+
+# The tests render templates without running collectstatic first.
+TEST_RUNNER = 'catalog.tests.runner.CatalogTestRunner'